@@ -0,0 +1,102 @@
+"""Per-row cost of cleaning source rows, the interpretive clean_row against the compiled row cleaner.
+
+    python -m benchmarks.bench_clean_row --rows 1000000
+"""
+import time
+import random
+import argparse
+import datetime
+
+from utils.RowCleaner import compile_cleaner, text_type, binary_type
+
+TARGET_FIELDS = {
+    "folionumber": {"type": "String", "length": 50},
+    "phasename": {"type": "String", "length": 50},
+    "phasestatus": {"type": "String", "length": 50},
+    "firstname": {"type": "String", "length": 50},
+    "lastname": {"type": "String", "length": 50},
+    "datestamp": {"type": "Date", "length": None},
+    "amount": {"type": "Double", "length": None}
+}
+FIELD_NAMES = ["FolioNumber", "PhaseName", "PhaseStatus", "FirstName", "LastName", "DateStamp", "Amount"]
+
+PHASES = [u"Group A", u"Group B", u"Group EFH Revised", u"Group L1", u"Group N2", u"Deemed Compatible"]
+STATUSES = [u"Completed Construction", u"Design in Process", u"Not Eligible", u"Pending Construction"]
+NAMES = [u"SMITH", u"Garcia, ", u" jones", u"O'NEIL", u"Lee & Lee", None, u""]
+
+
+def legacy_clean_row(target_fields, field_names, _row):
+    """the interpretive clean_row the compiled cleaner replaced"""
+    cleaned_row = []
+    for i in range(len(_row)):
+        _x = _row[i]
+        field_name = field_names[i]
+        target_type = target_fields[field_name.lower()]["type"]
+        target_length = target_fields[field_name.lower()]["length"]
+        try:
+            if target_type == "String":
+                if type(_x) is binary_type:
+                    _x = text_type(_x.strip(), encoding="utf8")
+                if type(_x) is text_type:
+                    for a in ["!", "@", "#", "$", "%", "^", "&", "*", ","]:
+                        _x = _x.replace(a, u"-")
+                        _x = _x.strip()
+                        if len(_x) > target_length:
+                            _x = u""
+                elif type(_x) is datetime.datetime:
+                    _x = u"{}".format(_x.date())
+                if not _x:
+                    _x = u""
+            elif target_type == "Date":
+                if type(_x) is datetime.datetime:
+                    _x = _x.date()
+                if not _x:
+                    _x = None
+            elif target_type == "Double":
+                if not _x:
+                    _x = 0.0
+            else:
+                if not _x:
+                    _x = None
+        except AttributeError:
+            pass
+        cleaned_row.append(_x)
+    return cleaned_row
+
+
+def synthetic_rows(n, seed=0):
+    rand = random.Random(seed)
+    start = datetime.datetime(2015, 1, 1)
+    rows = []
+    for i in range(n):
+        rows.append((u" {:012d} ".format(rand.randint(0, n // 3)), rand.choice(PHASES), rand.choice(STATUSES),
+                     rand.choice(NAMES), rand.choice(NAMES), start + datetime.timedelta(hours=rand.randint(0, 30000)),
+                     rand.choice([None, 0.0, 1.0, 2.5])))
+    return rows
+
+
+def timed(label, clean, rows):
+    start = time.time()
+    for row in rows:
+        clean(row)
+    elapsed = time.time() - start
+    print("{:<28} {:>8.3f}s {:>8.2f} us/row".format(label, elapsed, elapsed * 1e6 / len(rows)))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--memo", type=int, default=4096)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    print("{} synthetic rows, {} columns".format(len(rows), len(FIELD_NAMES)))
+    legacy = timed("interpretive clean_row", lambda row: legacy_clean_row(TARGET_FIELDS, FIELD_NAMES, row), rows)
+    compiled = timed("compiled cleaner", compile_cleaner(TARGET_FIELDS, FIELD_NAMES), rows)
+    memo = timed("compiled cleaner with memo", compile_cleaner(TARGET_FIELDS, FIELD_NAMES, args.memo), rows)
+    print("speedup :: compiled {:.1f}x, with memo {:.1f}x".format(legacy / compiled, legacy / memo))
+
+
+if __name__ == "__main__":
+    main()
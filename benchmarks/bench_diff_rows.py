@@ -0,0 +1,66 @@
+"""Cost of diffing the source rows against the gdb table, the list scan against the hashed diff_rows.
+
+Both tables hold the same number of rows with every folio twice, so every unmatched row has a partner.
+
+    python -m benchmarks.bench_diff_rows --rows 100000 --scan-rows 4000
+"""
+import time
+import random
+import argparse
+
+from benchmarks import fake_arcpy
+
+arcpy = fake_arcpy.install()
+
+from utils.UpdateNoiseMitSDE import diff_rows
+
+
+def list_scan_diff(add_rows, target_rows, clean):
+    """the list scan that compare_tables used before diff_rows"""
+    add_rows = list(add_rows)
+    rem_rows = []
+    for row in target_rows:
+        _row = clean(row)
+        if _row in add_rows:
+            add_rows.remove(_row)
+        else:
+            rem_rows.append(list(row))
+    return add_rows, rem_rows
+
+
+def synthetic_rows(n, seed):
+    rand = random.Random(seed)
+    rows = []
+    for i in range(n):
+        folio = u"{:012d}".format(i // 2)
+        rows.append([folio, u"group {}".format(rand.choice("abcdk")), float(rand.randint(0, 3))])
+    return rows
+
+
+def timed(label, diff, source, target):
+    start = time.time()
+    add_rows, rem_rows = diff(source, iter([tuple(row) for row in target]), list)
+    elapsed = time.time() - start
+    print("{:<24} {:>8} rows {:>8.3f}s, {} to add, {} to remove".format(label, len(source), elapsed, len(add_rows),
+                                                                        len(rem_rows)))
+    return elapsed, (add_rows, rem_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--scan-rows", type=int, default=4000, help="size of the quadratic list scan comparison")
+    args = parser.parse_args()
+
+    source = synthetic_rows(args.scan_rows, 1)
+    target = synthetic_rows(args.scan_rows, 2)
+    list_time, expected = timed("list scan", list_scan_diff, source, target)
+    hash_time, result = timed("diff_rows", diff_rows, source, target)
+    if expected != result:
+        print("diff_rows does not match the list scan")
+    print("speedup :: diff_rows {:.1f}x".format(list_time / hash_time))
+    timed("diff_rows", diff_rows, synthetic_rows(args.rows, 1), synthetic_rows(args.rows, 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Per-row cost of the one-to-one building mapping, the nested label lookups against the precomputed plan.
+
+The plan is timed resolving every building row and with the values memoized for each folio.
+
+    python -m benchmarks.bench_one2one --buildings 200000
+"""
+import time
+import random
+import argparse
+from collections import Counter
+
+from utils.BuildingPlan import OneToOnePlan, FolioMemo, concat_list
+
+BLDG_UPDATE_FIELDS = {"Project Name": "ProjectName", "Phase Name": "PhaseName", "Folio Number": "FolioID"}
+TABLE_UPDATE_FIELDS = {"Project Name": "ProjectStatus", "Phase Name": "Phase", "Folio Number": "FolioNumber"}
+BUILDING_FIELDS = ["FolioID", "ProjectName", "PhaseName"]
+LENGTH_LOOKUP = {"ProjectName": 50, "PhaseName": 50}
+DOMAINS = {
+    "Phase Name": ["deemed compatible", "group a", "group b", "group efh revised", "group l1", "group n2"],
+    "Project Name": ["completed construction", "design in process", "not eligible", "pending construction"]
+}
+
+PHASES = ["Group A", "Group B", "Group EFH Revised", "Group L1", "Group N2", "Deemed Compatible", "Unknown"]
+STATUSES = ["Completed Construction", "Design in Process", "Not Eligible", "Pending Construction", "Other"]
+
+
+def legacy_new_row(_row, table_values, building_fields, bldg_update_fields, table_update_fields, length_lookup,
+                   domain_set):
+    """the per-row field resolution perform_one2one used before the plan"""
+    new_row = [_row[0]]
+    _index = 1
+    for x in building_fields[1:]:
+        label = []
+        for k, v in bldg_update_fields.items():
+            if v == x:
+                label.append(k)
+                break
+        t_field = []
+        for k, v in table_update_fields.items():
+            if k == label[0]:
+                t_field.append(v)
+        try:
+            max_length = length_lookup[x]
+            values = table_values[t_field[0]]
+            cnt = Counter(values)
+
+            if label[0] in domain_set.keys():
+                value_list = domain_set[label[0]]
+                most_common = cnt.most_common(3)
+                for c in most_common:
+                    item = c[0]
+                    if type(item) is str:
+                        if item.lower().strip() in value_list:
+                            values = [item]
+                            break
+                        else:
+                            values = [v for v in values if v != item]
+                    else:
+                        pass
+            new_value = concat_list(max_length, values)
+        except KeyError:
+            new_value = _row[_index]
+
+        new_row.append(new_value)
+        _index += 1
+    return new_row
+
+
+def synthetic_buildings(n, seed=0):
+    """building rows and the folio dict built from the related table, several buildings share each folio"""
+    rand = random.Random(seed)
+    folios = {}
+    for i in range(n // 4 + 1):
+        folios["{:012d}".format(i)] = {
+            "ProjectStatus": [rand.choice(STATUSES) for _ in range(rand.randint(1, 4))],
+            "Phase": [rand.choice(PHASES) for _ in range(rand.randint(1, 4))]
+        }
+    keys = sorted(folios.keys())
+    rows = [[rand.choice(keys), rand.choice(STATUSES), rand.choice(PHASES)] for _ in range(n)]
+    return rows, folios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buildings", type=int, default=200000)
+    args = parser.parse_args()
+
+    rows, folios = synthetic_buildings(args.buildings)
+    print("{} synthetic buildings, {} folios".format(len(rows), len(folios)))
+
+    start = time.time()
+    expected = [legacy_new_row(row, folios[row[0]], BUILDING_FIELDS, BLDG_UPDATE_FIELDS, TABLE_UPDATE_FIELDS,
+                               LENGTH_LOOKUP, DOMAINS) for row in rows]
+    legacy = time.time() - start
+    print("{:<28} {:>8.3f}s {:>8.2f} us/row".format("nested lookups", legacy, legacy * 1e6 / len(rows)))
+
+    start = time.time()
+    plan = OneToOnePlan(BUILDING_FIELDS, BLDG_UPDATE_FIELDS, TABLE_UPDATE_FIELDS, LENGTH_LOOKUP, DOMAINS)
+    result = [plan.new_row(row, folios[row[0]]) for row in rows]
+    planned = time.time() - start
+    print("{:<28} {:>8.3f}s {:>8.2f} us/row".format("precomputed plan", planned, planned * 1e6 / len(rows)))
+
+    start = time.time()
+    plan = OneToOnePlan(BUILDING_FIELDS, BLDG_UPDATE_FIELDS, TABLE_UPDATE_FIELDS, LENGTH_LOOKUP, DOMAINS)
+    resolved = FolioMemo(lambda folio: plan.resolve(folios[folio]))
+    memo_result = [plan.apply(row, resolved.get(row[0])) for row in rows]
+    memoized = time.time() - start
+    print("{:<28} {:>8.3f}s {:>8.2f} us/row".format("plan with folio memo", memoized, memoized * 1e6 / len(rows)))
+
+    if result != expected or memo_result != expected:
+        raise Exception("the plan does not resolve the same values as the nested lookups")
+    print("speedup :: plan {:.1f}x, with folio memo {:.1f}x".format(legacy / planned, legacy / memoized))
+
+
+if __name__ == "__main__":
+    main()
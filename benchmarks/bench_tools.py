@@ -0,0 +1,324 @@
+"""Time compare_tables, the row cleaner, GDBTableUpdater and BuildingsUpdater on synthetic tables without SDE.
+
+The Weaver, CARs and Lease tables come from benchmarks.generators and live in the in-memory arcpy of
+benchmarks.fake_arcpy.  For each scenario and size, the gdb table holds the cleaned rows of one run and the
+source holds the next run with --change-ratio of its rows changed.  The gdb table is updated as execute_tool
+would, and then checked against the source.
+
+With --storage sqlite the tables are kept in a SQLite file through utils.Storage.SQLiteStorage rather than in
+the in-memory arcpy, which then only collects the messages.
+
+Each scenario and size runs in its own process so the peak memory of one does not carry into the next, use
+--inline to run them in this process.
+
+    python -m benchmarks.bench_tools --scenario weaver cars lease --rows 10000 100000 1000000 --change-ratio 0.01
+
+With --change-capture the source has a last_edited_date field that dates the changed rows after the last run,
+and compare_tables reads only the rows that share a key with them, with the key reconcile that finds the deleted
+rows.
+
+With --output the runs are appended to a JSON lines file that python -m utils.RunMetrics --history reads, to
+compare a run with the median of the earlier runs of the same scenario, size and change ratio.
+"""
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+import logging
+import platform
+import argparse
+import datetime
+import subprocess
+from collections import Counter
+
+from benchmarks import fake_arcpy
+
+arcpy = fake_arcpy.install()
+
+from utils import UpdateNoiseMitSDE
+from utils.Reporter import report_logger
+from utils.RowCleaner import compile_cleaner
+from utils.RunMetrics import RunMetrics
+from utils.Storage import ArcPyStorage, SQLiteStorage, CSVStorage
+from utils.CleanCSV import open_text, csv_value
+from benchmarks.generators import SCENARIOS, source_rows, change_source, building_rows
+
+WORKSPACE = "C:\\bench\\gis.sde"
+SOURCE_WORKSPACE = "C:\\bench\\source.sde"
+
+# the edit time of the source rows with --change-capture, the rows changed since the last run have the later one
+EDIT_FIELD = ("last_edited_date", "Date", None)
+LAST_RUN = datetime.datetime(2019, 5, 1, 6)
+THIS_RUN = datetime.datetime(2019, 5, 2, 6)
+
+
+def add_table(storage, path, fields, rows=()):
+    """create the table in the storage and insert the rows, rows hold the values of all of the fields"""
+    if isinstance(storage, SQLiteStorage):
+        storage.create_table(path, fields)
+        storage.load_rows(path, [x[0] for x in fields], rows)
+    else:
+        fake_arcpy.add_table(path, fields, rows)
+
+
+def write_csv(path, scenario, rows):
+    with open_text(path, "w", "utf8") as f:
+        writer = csv.writer(f)
+        writer.writerow(scenario.field_names)
+        for row in rows:
+            writer.writerow([csv_value(x) for x in row])
+
+
+def load_tables(storage, scenario, rows, change_ratio, seed, csv_folder=None, change_capture=False):
+    """add the source, gdb and buildings tables of the scenario to the storage, with a csv_folder the source is
+    written to a csv file in it.  With change_capture the source rows are dated by EDIT_FIELD"""
+    fake_arcpy.reset()
+    previous = source_rows(scenario, rows, seed)
+    current = change_source(scenario, previous, change_ratio, seed)
+
+    sql_table = "{}\\{}_source".format(SOURCE_WORKSPACE, scenario.name)
+    gdb_table = "{}\\{}".format(WORKSPACE, scenario.name)
+    if csv_folder:
+        sql_table = os.path.join(csv_folder, "{}_source.csv".format(scenario.name))
+        write_csv(sql_table, scenario, current)
+    elif change_capture:
+        # the rows from the last run were edited over the day before it
+        unchanged = set([tuple(x) for x in previous])
+        add_table(storage, sql_table, scenario.fields + [EDIT_FIELD],
+                  [x + [LAST_RUN - datetime.timedelta(seconds=i % 86400 + 1) if tuple(x) in unchanged else THIS_RUN]
+                   for i, x in enumerate(current)])
+    else:
+        add_table(storage, sql_table, scenario.fields, current)
+    add_table(storage, gdb_table, scenario.fields + scenario.target_only)
+
+    # the gdb table holds the rows written by the last run, cleaned as compare_tables cleans them
+    clean = compile_cleaner(UpdateNoiseMitSDE.field_catalog(gdb_table, storage), scenario.field_names)
+    cleaned = [x for x in (clean(row) for row in previous) if any(x)]
+    names = scenario.field_names
+    if scenario.join_field:
+        # the last run set the join field of its rows
+        names = names + [scenario.join_field]
+        cleaned = [x + [UpdateNoiseMitSDE.join_value(x[0], x[1])] for x in cleaned]
+    if isinstance(storage, SQLiteStorage):
+        storage.load_rows(gdb_table, names, cleaned)
+    else:
+        with storage.insert_cursor(gdb_table, names) as cursor:
+            for row in cleaned:
+                cursor.insertRow(row)
+
+    buildings = None
+    if scenario.buildings:
+        buildings = "{}\\{}Building".format(WORKSPACE, scenario.name)
+        add_table(storage, buildings, scenario.buildings, building_rows(scenario, current, seed=seed))
+    return sql_table, gdb_table, buildings
+
+
+def source_storage(storage, sql_table, gdb_table):
+    """the storage the source rows are read from, as compare_tables reads them"""
+    if sql_table.endswith(".csv"):
+        return CSVStorage(UpdateNoiseMitSDE.field_catalog(gdb_table, storage))
+    return storage
+
+
+def verify(storage, scenario, sql_table, gdb_table):
+    """True when the match fields of the gdb table hold the cleaned source rows, and the join field is set"""
+    clean = compile_cleaner(UpdateNoiseMitSDE.field_catalog(gdb_table, storage), scenario.field_names)
+    with source_storage(storage, sql_table, gdb_table).search_cursor(sql_table, scenario.field_names) as cursor:
+        expected = Counter([tuple(x) for x in (clean(row) for row in cursor) if any(x)])
+    with storage.search_cursor(gdb_table, scenario.field_names) as cursor:
+        found = Counter([tuple(clean(row)) for row in cursor])
+    if scenario.join_field:
+        # the join field holds the first two fields of each row
+        with storage.search_cursor(gdb_table, [scenario.join_field] + scenario.field_names[:2]) as cursor:
+            for row in cursor:
+                if row[0] != UpdateNoiseMitSDE.join_value(row[1], row[2]):
+                    return False
+    return expected == found
+
+
+def run_scenario(name, rows, change_ratio, seed=0, chunk_size=500, scan_threshold=20000, upsert=True,
+                 fused=True, storage_type="memory", bulk_insert=None, csv_source=False, change_capture=False):
+    """run one scenario in this process and return its metrics record"""
+    folder = tempfile.mkdtemp()
+    if storage_type == "sqlite":
+        storage = SQLiteStorage(os.path.join(folder, "bench.sqlite"))
+    else:
+        storage = ArcPyStorage()
+    try:
+        return run_storage(storage, storage_type, name, rows, change_ratio, seed, chunk_size, scan_threshold,
+                           upsert, fused, bulk_insert, folder if csv_source else None, change_capture)
+    finally:
+        if storage_type == "sqlite":
+            storage.close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_storage(storage, storage_type, name, rows, change_ratio, seed, chunk_size, scan_threshold, upsert,
+                fused, bulk_insert=None, csv_folder=None, change_capture=False):
+    scenario = SCENARIOS[name]()
+    source = "csv" if csv_folder else "table"
+    watermark = None
+    if change_capture and not csv_folder:
+        # the watermark of the last run, the key reconcile is due
+        source = "changes"
+        watermark = UpdateNoiseMitSDE.ChangeWatermark({"field": EDIT_FIELD[0], "watermark": LAST_RUN.isoformat(),
+                                                       "fields": sorted([x.lower() for x in scenario.field_names])})
+    metrics = RunMetrics("bench:{}:{}:{}".format(name, storage_type, source),
+                         "{} rows, {} changed".format(rows, change_ratio))
+
+    with metrics.span("generate") as span:
+        sql_table, gdb_table, buildings = load_tables(storage, scenario, rows, change_ratio, seed, csv_folder,
+                                                      watermark is not None)
+        span.rows = rows
+
+    catalog = UpdateNoiseMitSDE.field_catalog(gdb_table, storage)
+    with metrics.span("clean rows") as span:
+        clean = compile_cleaner(catalog, scenario.field_names, UpdateNoiseMitSDE.CLEAN_MEMO_SIZE)
+        span.rows = 0
+        with source_storage(storage, sql_table, gdb_table).search_cursor(sql_table, scenario.field_names) as cursor:
+            for row in cursor:
+                clean(row)
+                span.rows += 1
+
+    planner = UpdateNoiseMitSDE.QueryPlanner(chunk_size, scan_threshold)
+    with metrics.span("compare_tables"):
+        result = UpdateNoiseMitSDE.compare_tables(sql_table=sql_table, gdb_table=gdb_table, metrics=metrics,
+                                                  storage=storage, watermark=watermark, planner=planner)
+    editor = storage.editor(WORKSPACE)
+    editor.startEditing(False, True)
+    upsert_key = ["FolioNumber", "PhaseName"] if upsert else None
+    join_fields = None
+    if scenario.join_field:
+        join_fields = (scenario.join_field, "AGREEMENT_NUMBER", "LEASEHOLD_NUMBER")
+    updater = UpdateNoiseMitSDE.GDBTableUpdater(result["match_fields"], gdb_table, result["add_rows"],
+                                                result["exist_rows"], WORKSPACE, editor, scenario.table_attributes,
+                                                result["folioIds"], planner, None, upsert_key, metrics, storage,
+                                                bulk_insert, None, join_fields)
+    if result["compare_result"]:
+        updater.perform_update()
+    if scenario.join_field:
+        with metrics.span("concatenate") as span:
+            updater.concatenate(scenario.join_field, "AGREEMENT_NUMBER", "LEASEHOLD_NUMBER")
+            span.rows = rows
+
+    if buildings:
+        if not hasattr(dict, "iteritems"):
+            # BuildingsUpdater is written for the Python 2.7 of ArcMap
+            arcpy.AddWarning("The buildings update is only timed under Python 2")
+        else:
+            with metrics.span("buildings update") as span:
+                building_updater = UpdateNoiseMitSDE.BuildingsUpdater(
+                    scenario.domains, result["folioIds"], buildings, gdb_table, scenario.building_attributes,
+                    scenario.table_attributes, scenario.combination_attributes, WORKSPACE, editor, planner,
+                    fused, None, storage)
+                building_updater.update_buildings()
+                span.rows = len(building_updater.folios)
+    editor.stopEditing(True)
+
+    with metrics.span("verify"):
+        verified = verify(storage, scenario, sql_table, gdb_table)
+    metrics.result = "verified" if verified else "mismatch"
+
+    record = metrics.record()
+    record.update({"scenario": name, "storage": storage_type, "source": source, "rows": rows,
+                   "change_ratio": change_ratio, "seed": seed,
+                   "rows_to_add": len(result["add_rows"]), "rows_to_remove": len(result["exist_rows"]),
+                   "python": platform.python_version(), "errors": fake_arcpy.MESSAGE_COUNTS["error"],
+                   "warnings": fake_arcpy.MESSAGE_COUNTS["warning"]})
+    return record
+
+
+def format_record(record):
+    lines = ["{} :: {} storage, {} source, {} rows, {} changed, seed {}, python {} :: {} in {:.2f}s, peak rss {} MB"
+             .format(record["scenario"], record["storage"], record["source"], record["rows"], record["change_ratio"],
+                     record["seed"], record["python"], record["result"], record["seconds"], record["peak_rss_mb"])]
+    lines.append("  {} rows to add and {} rows to remove".format(record["rows_to_add"], record["rows_to_remove"]))
+    lines.append("  {:<24} {:>10} {:>10} {:>10} {:>10}".format("phase", "seconds", "rows", "us/row", "peak MB"))
+    for x in record["spans"]:
+        per_row = "-"
+        if x["rows"]:
+            per_row = "{:.2f}".format(x["seconds"] * 1e6 / x["rows"])
+        lines.append("  {:<24} {:>10.3f} {:>10} {:>10} {:>10}".format(
+            x["name"], x["seconds"], "-" if x["rows"] is None else x["rows"], per_row,
+            "-" if x["peak_rss_mb"] is None else x["peak_rss_mb"]))
+    if record["errors"] or record["warnings"]:
+        lines.append("  {} errors and {} warnings were added to the messages".format(record["errors"],
+                                                                                   record["warnings"]))
+    return "\n".join(lines)
+
+
+def run_isolated(args, name, rows):
+    command = [sys.executable, "-m", "benchmarks.bench_tools", "--inline", "--json", "--scenario", name,
+               "--rows", str(rows), "--change-ratio", str(args.change_ratio), "--seed", str(args.seed),
+               "--chunk-size", str(args.chunk_size), "--scan-threshold", str(args.scan_threshold),
+               "--storage", args.storage]
+    if args.no_upsert:
+        command.append("--no-upsert")
+    if args.no_fused:
+        command.append("--no-fused")
+    if args.bulk_insert:
+        command.extend(["--bulk-insert", args.bulk_insert])
+    if args.csv_source:
+        command.append("--csv-source")
+    if args.change_capture:
+        command.append("--change-capture")
+    output = subprocess.check_output(command)
+    if not isinstance(output, str):
+        output = output.decode("utf8")
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", default=sorted(SCENARIOS.keys()), choices=sorted(SCENARIOS.keys()))
+    parser.add_argument("--rows", nargs="+", type=int, default=[10000, 100000, 1000000])
+    parser.add_argument("--change-ratio", type=float, default=0.01, help="share of the source rows that changed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--scan-threshold", type=int, default=20000)
+    parser.add_argument("--no-upsert", action="store_true", help="delete and insert the changed rows")
+    parser.add_argument("--no-fused", action="store_true", help="update the buildings one mapping at a time")
+    parser.add_argument("--bulk-insert", choices=["empty", "always"],
+                        help="insert the rows with one bulk append, see GDBTableUpdater")
+    parser.add_argument("--storage", default="memory", choices=["memory", "sqlite"],
+                        help="keep the tables in the in-memory arcpy or in a SQLite file")
+    parser.add_argument("--csv-source", action="store_true", help="diff a csv export of the source, not a table")
+    parser.add_argument("--change-capture", action="store_true",
+                        help="read only the folios of the source rows edited since the last run")
+    parser.add_argument("--inline", action="store_true", help="run every scenario in this process")
+    parser.add_argument("--json", action="store_true", help="print each record as one line of JSON")
+    parser.add_argument("--output", help="append the records to this JSON lines file")
+    args = parser.parse_args()
+
+    # the row level events of the tools are not written anywhere
+    report_logger.addHandler(logging.NullHandler())
+    report_logger.propagate = False
+
+    records = []
+    for name in args.scenario:
+        for rows in args.rows:
+            if args.inline:
+                record = run_scenario(name, rows, args.change_ratio, args.seed, args.chunk_size,
+                                      args.scan_threshold, not args.no_upsert, not args.no_fused, args.storage,
+                                      args.bulk_insert, args.csv_source, args.change_capture)
+            else:
+                record = run_isolated(args, name, rows)
+            records.append(record)
+            if args.json:
+                print(json.dumps(record, sort_keys=True))
+            else:
+                print(format_record(record))
+                sys.stdout.flush()
+            if args.output:
+                with open(args.output, 'a') as f:
+                    f.write(json.dumps(record, sort_keys=True) + "\n")
+
+    if [x for x in records if x["result"] != "verified"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
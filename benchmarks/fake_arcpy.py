@@ -0,0 +1,403 @@
+"""In-memory stand-in for the parts of arcpy used by utils.UpdateNoiseMitSDE, for benchmarks off the SDE box.
+
+install() registers this module as arcpy and arcpy.da, so it has to be called before utils.UpdateNoiseMitSDE is
+imported.  Tables are added with add_table() and live in TABLES, keyed by their path.  The cursors read and
+write the rows in place and understand the where clauses the tools build, "field in (...)", "field = 'x'" and
+"field >= 'date'".
+An IN clause is answered from a hashed index of the field, the way SQL Server would use an index, so chunked
+queries are not charged for a scan of the whole table."""
+import re
+import sys
+import types
+import datetime
+from collections import deque
+
+# path -> FakeTable
+TABLES = {}
+
+# the last messages passed to AddMessage, AddWarning and AddError, and the count of each kind
+MESSAGES = deque(maxlen=200)
+MESSAGE_COUNTS = {"message": 0, "warning": 0, "error": 0}
+
+NUMPY_TYPES = {"Double": "<f8", "Single": "<f4", "Integer": "<i4", "SmallInteger": "<i2", "OID": "<i4",
+               "Date": "<M8[us]"}
+
+
+class Env(object):
+    def __init__(self):
+        self.workspace = None
+        self.overwriteOutput = 0
+
+
+env = Env()
+
+
+def reset():
+    TABLES.clear()
+    MESSAGES.clear()
+    for k in MESSAGE_COUNTS.keys():
+        MESSAGE_COUNTS[k] = 0
+    env.workspace = None
+
+
+def AddMessage(message):
+    MESSAGE_COUNTS["message"] += 1
+    MESSAGES.append(("message", message))
+
+
+def AddWarning(message):
+    MESSAGE_COUNTS["warning"] += 1
+    MESSAGES.append(("warning", message))
+
+
+def AddError(message):
+    MESSAGE_COUNTS["error"] += 1
+    MESSAGES.append(("error", message))
+
+
+class Field(object):
+    def __init__(self, name, type, length=None):
+        self.name = name
+        self.baseName = name
+        self.aliasName = name
+        self.type = type
+        if type == "String":
+            self.length = length or 255
+        elif type == "Date":
+            self.length = 8
+        else:
+            self.length = 4
+
+
+class FakeTable(object):
+    """The rows of a table as lists, keyed by OBJECTID, with the OBJECTID in the first position"""
+
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = [Field("OBJECTID", "OID")] + [Field(*x) for x in fields]
+        self.positions = dict([(f.name.lower(), i) for i, f in enumerate(self.fields)])
+        self.rows = {}
+        self.next_oid = 1
+        # field position -> {value as text: set of OBJECTIDs}, built on the first IN clause against the field
+        self.indexes = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def position(self, name):
+        if name == "OID@":
+            return 0
+        try:
+            return self.positions[name.lower()]
+        except KeyError:
+            raise RuntimeError("Cannot find field '{}'".format(name))
+
+    def positions_of(self, fields):
+        if fields == "*":
+            return list(range(len(self.fields)))
+        if isinstance(fields, (str, type(u""))):
+            fields = [fields]
+        return [self.position(x) for x in fields]
+
+    def insert(self, values, positions):
+        oid = self.next_oid
+        self.next_oid += 1
+        row = [None] * len(self.fields)
+        row[0] = oid
+        for i, v in zip(positions, values):
+            if i:
+                row[i] = v
+        self.rows[oid] = row
+        for i, index in self.indexes.items():
+            index.setdefault(key_text(row[i]), set()).add(oid)
+        return oid
+
+    def update(self, oid, values, positions):
+        row = self.rows[oid]
+        for i, v in zip(positions, values):
+            if not i or row[i] == v:
+                continue
+            index = self.indexes.get(i)
+            if index is not None:
+                index[key_text(row[i])].discard(oid)
+                index.setdefault(key_text(v), set()).add(oid)
+            row[i] = v
+
+    def delete(self, oid):
+        row = self.rows.pop(oid)
+        for i, index in self.indexes.items():
+            index[key_text(row[i])].discard(oid)
+
+    def index(self, position):
+        try:
+            return self.indexes[position]
+        except KeyError:
+            index = {}
+            for oid, row in self.rows.items():
+                index.setdefault(key_text(row[position]), set()).add(oid)
+            self.indexes[position] = index
+            return index
+
+    def select(self, where_clause):
+        """the OBJECTIDs selected by the where clause, in OBJECTID order"""
+        if not where_clause:
+            return sorted(self.rows.keys())
+        match = re.match(r"^\s*(\S+)\s+in\s+\((.*)\)\s*$", where_clause, re.I | re.S)
+        if match:
+            index = self.index(self.position(match.group(1)))
+            oids = set()
+            for x in split_values(match.group(2)):
+                oids.update(index.get(x, ()))
+            return sorted(oids)
+        match = re.match(r"^\s*(\S+)\s*>=\s*(?:date\s+)?'(.*)'\s*$", where_clause, re.I | re.S)
+        if match:
+            # the rows from a date on, found by a scan of the table
+            position = self.position(match.group(1))
+            since = datetime.datetime.strptime(match.group(2), "%Y-%m-%d %H:%M:%S")
+            return sorted([oid for oid, row in self.rows.items() if row[position] is not None and
+                           row[position] >= since])
+        match = re.match(r"^\s*(\S+)\s*=\s*(.*?)\s*$", where_clause, re.S)
+        if match:
+            index = self.index(self.position(match.group(1)))
+            return sorted(index.get(split_values(match.group(2))[0], ()))
+        raise RuntimeError("An invalid SQL statement was used :: {}".format(where_clause))
+
+
+def key_text(value):
+    return u"{}".format(value)
+
+
+def split_values(text):
+    """the values of an IN list as text, quoted values may hold commas and doubled quotes"""
+    values = []
+    for quoted, plain in re.findall(r"'((?:[^']|'')*)'|([^,\s][^,]*)", text):
+        if plain:
+            values.append(plain.strip())
+        else:
+            values.append(quoted.replace(u"''", u"'"))
+    return values
+
+
+def resolve(path):
+    if path in TABLES:
+        return TABLES[path]
+    if env.workspace and u"{}\\{}".format(env.workspace, path) in TABLES:
+        return TABLES[u"{}\\{}".format(env.workspace, path)]
+    name = path.split("\\")[-1].lower()
+    for k, v in TABLES.items():
+        if k.split("\\")[-1].lower() == name:
+            return v
+    return None
+
+
+def table(path):
+    t = resolve(path)
+    if t is None:
+        raise RuntimeError("Cannot open '{}'".format(path))
+    return t
+
+
+def add_table(path, fields, rows=()):
+    """add a table, fields are (name, type, length) and rows hold the values of those fields"""
+    t = FakeTable(path, fields)
+    positions = list(range(1, len(t.fields)))
+    for row in rows:
+        t.insert(row, positions)
+    TABLES[path] = t
+    return t
+
+
+def Exists(path):
+    return resolve(path) is not None
+
+
+def ListFields(path, wild_card=None):
+    fields = table(path).fields
+    if wild_card:
+        pattern = re.compile("^{}$".format(re.escape(wild_card).replace("\\*", ".*")), re.I)
+        fields = [f for f in fields if pattern.match(f.name)]
+    return list(fields)
+
+
+def ListTables(wild_card=None):
+    names = [k.split("\\")[-1] for k in TABLES.keys()
+             if not env.workspace or k.startswith(u"{}\\".format(env.workspace))]
+    if wild_card:
+        pattern = re.compile("^{}$".format(re.escape(wild_card).replace("\\*", ".*")), re.I)
+        names = [x for x in names if pattern.match(x)]
+    return names
+
+
+class Result(object):
+    def __init__(self, *outputs):
+        self.outputs = outputs
+
+    def getOutput(self, index):
+        return self.outputs[index]
+
+
+def GetCount_management(path):
+    return Result(u"{}".format(len(table(path))))
+
+
+class Description(object):
+    def __init__(self, t):
+        self.OIDFieldName = "OBJECTID"
+        self.name = t.path.split("\\")[-1]
+        self.fields = t.fields
+        self.dataType = "Table"
+
+
+def Describe(path):
+    return Description(table(path))
+
+
+class SearchCursor(object):
+    def __init__(self, in_table, field_names, where_clause=None, *args, **kwargs):
+        self.table = table(in_table)
+        self.positions = self.table.positions_of(field_names)
+        self.oids = self.table.select(where_clause)
+        self.current = None
+
+    def row(self, values):
+        return tuple([values[i] for i in self.positions])
+
+    def __iter__(self):
+        rows = self.table.rows
+        for oid in self.oids:
+            values = rows.get(oid)
+            if values is None:
+                continue
+            self.current = oid
+            yield self.row(values)
+
+    def next(self):
+        return next(iter(self))
+
+    __next__ = next
+
+    def reset(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.current = None
+        return False
+
+
+class UpdateCursor(SearchCursor):
+    def row(self, values):
+        return [values[i] for i in self.positions]
+
+    def updateRow(self, row):
+        self.table.update(self.current, row, self.positions)
+
+    def deleteRow(self):
+        self.table.delete(self.current)
+
+
+class InsertCursor(object):
+    def __init__(self, in_table, field_names):
+        self.table = table(in_table)
+        self.positions = self.table.positions_of(field_names)
+
+    def insertRow(self, row):
+        if len(row) != len(self.positions):
+            raise RuntimeError("sequence size must match size of the row")
+        return self.table.insert(row, self.positions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class Editor(object):
+    """counts the edit operations, edits are applied to the tables as they are made"""
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.isEditing = False
+        self.operations = 0
+
+    def startEditing(self, with_undo=True, multiuser_mode=True):
+        self.isEditing = True
+
+    def stopEditing(self, save_changes=True):
+        self.isEditing = False
+
+    def startOperation(self):
+        self.operations += 1
+
+    def stopOperation(self):
+        pass
+
+    def abortOperation(self):
+        pass
+
+
+def CreateTable_management(out_path, out_name, template=None):
+    fields = []
+    if template:
+        fields = [(f.name, f.type, f.length) for f in table(template).fields[1:]]
+    path = u"{}\\{}".format(out_path, out_name)
+    add_table(path, fields)
+    return Result(path)
+
+
+def Append_management(inputs, target, schema_type="TEST"):
+    t = table(target)
+    for x in inputs if isinstance(inputs, list) else [inputs]:
+        source = table(x)
+        names = [f.name for f in source.fields[1:]]
+        positions = t.positions_of(names)
+        for oid in sorted(source.rows.keys()):
+            t.insert(source.rows[oid][1:], positions)
+    return Result(target)
+
+
+def Delete_management(path):
+    TABLES.pop(table(path).path, None)
+    return Result(True)
+
+
+def TableToNumPyArray(in_table, field_names, where_clause=None, skip_nulls=False, null_value=None):
+    import numpy
+    t = table(in_table)
+    positions = t.positions_of(field_names)
+    dtype = []
+    for name, i in zip(field_names, positions):
+        f = t.fields[i]
+        if f.type == "String":
+            dtype.append((name, "<U{}".format(f.length)))
+        else:
+            dtype.append((name, NUMPY_TYPES.get(f.type, "O")))
+    rows = []
+    for oid in t.select(where_clause):
+        values = t.rows[oid]
+        row = []
+        for name, i in zip(field_names, positions):
+            v = values[i]
+            if v is None and null_value is not None:
+                v = null_value.get(name)
+            if isinstance(v, datetime.date) and not isinstance(v, datetime.datetime):
+                v = datetime.datetime(v.year, v.month, v.day)
+            row.append(v)
+        rows.append(tuple(row))
+    return numpy.array(rows, dtype=dtype)
+
+
+da = types.ModuleType("arcpy.da")
+for _x in [SearchCursor, UpdateCursor, InsertCursor, Editor, TableToNumPyArray]:
+    setattr(da, _x.__name__, _x)
+
+
+def install():
+    """register this module as arcpy, call before importing utils.UpdateNoiseMitSDE"""
+    module = sys.modules[__name__]
+    sys.modules["arcpy"] = module
+    sys.modules["arcpy.da"] = da
+    return module
@@ -0,0 +1,210 @@
+"""Seedable generators of Weaver, CARs and Lease tables for the benchmarks.
+
+The rows look like the exports the tools read: folios shared by several rows, names with the characters the
+cleaner replaces, strings longer than their field, nulls and empty strings, dates, and phase and project names
+taken from utils/domains.json with stray case, padding and values outside the domain.  change_source() turns
+the rows of one run into the rows of the next with a given share of updated, deleted and inserted rows."""
+import os
+import json
+import random
+import datetime
+
+DOMAIN_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "domains.json")
+
+CAR_PHASES = [u"CAR Phase 1", u"CAR Phase 2", u"CAR Phase 3", u"Wait List A", u"Wait List B"]
+CAR_STATUSES = [u"Active", u"Inactive", u"Pending Review", u"Withdrawn", u"Complete"]
+FIRST_NAMES = [u"JOHN", u"maria", u" Wei", u"O'Neil", u"Ana-Lucia", u"Lee & Lee", u"Bob!", u"", None]
+LAST_NAMES = [u"SMITH", u"Garcia, ", u" jones", u"Nguyen", u"Brown #2", u"Lee", u"", None]
+OUT_OF_DOMAIN = [u"Unknown", u"TBD", u"N/A"]
+
+
+class Scenario(object):
+    """The schema of the gdb table and the buildings of a tool, with the parameters execute_tool passes.
+
+    fields are (name, type, length) of the source table, target_only are the fields only the gdb table has.
+    folio_share is the number of distinct folios per row, lower values give more rows per folio."""
+
+    def __init__(self, name, fields, make_row, folio_share=0.6, target_only=(), buildings=None,
+                 building_attributes=None, table_attributes=None, combination_attributes=None, domains=None,
+                 join_field=None):
+        self.name = name
+        self.fields = list(fields)
+        self.make_row = make_row
+        self.folio_share = folio_share
+        self.target_only = list(target_only)
+        self.buildings = buildings
+        self.building_attributes = building_attributes
+        self.table_attributes = table_attributes
+        self.combination_attributes = combination_attributes
+        self.domains = domains
+        self.join_field = join_field
+
+    @property
+    def field_names(self):
+        return [x[0] for x in self.fields]
+
+
+def load_domains():
+    with open(DOMAIN_FILE, 'r') as f:
+        return json.loads(f.read())
+
+
+def folio_number(i):
+    return u"{:012d}".format(3000000000 + i * 7)
+
+
+def pick_folio(rand, n):
+    """a folio drawn with a skew, a few folios have many rows as in the exports"""
+    return folio_number(int(n * rand.random() ** 2))
+
+
+def domain_value(rand, values):
+    """a domain value as the source holds it, mostly title case, sometimes padded, lower case or outside the
+    domain"""
+    x = rand.random()
+    if x < 0.03:
+        return rand.choice(OUT_OF_DOMAIN)
+    if x < 0.05:
+        return None
+    value = rand.choice(values)
+    if x < 0.10:
+        return u" {} ".format(value)
+    if x < 0.15:
+        return value
+    return value.title()
+
+
+def maybe(rand, value, nulls=0.05):
+    return None if rand.random() < nulls else value
+
+
+def long_text(rand, length):
+    """notes text, about one in fifty is longer than the field"""
+    if rand.random() < 0.02:
+        size = length + rand.randint(1, 40)
+    else:
+        size = rand.randint(0, max(length // 3, 1))
+    return u"".join([rand.choice(u"abcdefghij klmnop,qrst!uvwxyz") for _ in range(size)])
+
+
+def some_date(rand, nulls=0.05):
+    if rand.random() < nulls:
+        return None
+    return datetime.datetime(2000, 1, 1) + datetime.timedelta(minutes=rand.randint(0, 20 * 365 * 24 * 60))
+
+
+def weaver_scenario():
+    domains = load_domains()["WeaverDataImport"]
+    phases = [x for x in domains["Phase Name"]]
+    projects = [x for x in domains["Project Name"]]
+
+    def make_row(rand, folios):
+        return [pick_folio(rand, folios), domain_value(rand, phases), domain_value(rand, projects),
+                maybe(rand, rand.choice(FIRST_NAMES)), maybe(rand, rand.choice(LAST_NAMES)),
+                some_date(rand), maybe(rand, round(rand.random() * 50000, 2), 0.2), maybe(rand, long_text(rand, 255))]
+
+    return Scenario(
+        "weaver",
+        [("FolioNumber", "String", 50), ("PhaseName", "String", 50), ("PhaseStatus", "String", 50),
+         ("FirstName", "String", 50), ("LastName", "String", 50), ("SignedDate", "Date", None),
+         ("Amount", "Double", None), ("Notes", "String", 255)],
+        make_row,
+        buildings=[("folioId", "String", 50), ("projectName", "String", 50), ("phaseName", "String", 50),
+                   ("SSACARPropContact", "String", 100)],
+        building_attributes={"Project Name": "projectName", "Phase Name": "phaseName", "Folio Number": "folioId"},
+        table_attributes={"Project Name": "PhaseStatus", "Phase Name": "PhaseName", "Folio Number": "FolioNumber"},
+        combination_attributes=[{"target": ["folioId", "SSACARPropContact"],
+                                 "source": ["FolioNumber", "LastName", "FirstName"]}],
+        domains=domains)
+
+
+def cars_scenario():
+    def make_row(rand, folios):
+        name = rand.choice(LAST_NAMES)
+        first = rand.choice(FIRST_NAMES)
+        contact = u"{}, {}".format(name, first) if name and first else (name or first)
+        return [pick_folio(rand, folios), maybe(rand, contact), rand.choice(CAR_PHASES),
+                maybe(rand, rand.choice(CAR_STATUSES)), some_date(rand), maybe(rand, long_text(rand, 255))]
+
+    return Scenario(
+        "cars",
+        [("FolioNumber", "String", 50), ("ContactName", "String", 100), ("WaitListName", "String", 50),
+         ("WaitListStatusTypeName", "String", 50), ("ApplicationDate", "Date", None), ("Notes", "String", 255)],
+        make_row,
+        folio_share=0.8,
+        buildings=[("folioId", "String", 50), ("SSACARPropContact", "String", 100), ("SSACARPHASE", "String", 50),
+                   ("SSACARSTATUS", "String", 50)],
+        building_attributes={"Contact Name": "SSACARPropContact", "Phase Name": "SSACARPHASE",
+                             "Status": "SSACARSTATUS", "Folio Number": "folioId"},
+        table_attributes={"Contact Name": "ContactName", "Phase Name": "WaitListName",
+                          "Status": "WaitListStatusTypeName", "Folio Number": "FolioNumber"},
+        domains=load_domains()["SSACAR"])
+
+
+def lease_scenario():
+    def make_row(rand, folios):
+        agreement = u"AG-{:06d}".format(int(folios * rand.random()))
+        leasehold = maybe(rand, u"LH-{:05d}".format(rand.randint(0, 99999)), 0.1)
+        start = some_date(rand, 0.02)
+        end = None
+        if start:
+            end = maybe(rand, start + datetime.timedelta(days=rand.randint(365, 30 * 365)), 0.2)
+        return [agreement, leasehold, maybe(rand, rand.choice(LAST_NAMES)), start, end,
+                maybe(rand, round(rand.random() * 250000, 2), 0.1)]
+
+    return Scenario(
+        "lease",
+        [("AGREEMENT_NUMBER", "String", 20), ("LEASEHOLD_NUMBER", "String", 20), ("LESSEE", "String", 100),
+         ("START_DATE", "Date", None), ("END_DATE", "Date", None), ("RENT", "Double", None)],
+        make_row,
+        folio_share=0.9,
+        target_only=[("AGREEMENT_LEASE", "String", 50)],
+        join_field="AGREEMENT_LEASE")
+
+
+SCENARIOS = {"weaver": weaver_scenario, "cars": cars_scenario, "lease": lease_scenario}
+
+
+def source_rows(scenario, n, seed=0):
+    """n rows of the source table"""
+    rand = random.Random(seed)
+    folios = max(int(n * scenario.folio_share), 1)
+    return [scenario.make_row(rand, folios) for _ in range(n)]
+
+
+def change_source(scenario, rows, change_ratio, seed=0):
+    """The source rows of the next run, change_ratio of the rows are changed.
+
+    Of the changed rows 60% keep their key and get new values, 20% are deleted and 20% are new rows."""
+    rand = random.Random(seed + 1)
+    rows = [list(x) for x in rows]
+    changes = int(len(rows) * change_ratio)
+    updates = int(changes * 0.6)
+    deletes = int(changes * 0.2)
+    inserts = changes - updates - deletes
+    positions = rand.sample(range(len(rows)), updates + deletes) if rows else []
+    folios = max(int(len(rows) * scenario.folio_share), 1)
+    for i in positions[:updates]:
+        new = scenario.make_row(rand, folios)
+        # keep the folio and the second key field so the row pairs with the one it replaces
+        rows[i] = rows[i][:2] + new[2:]
+    for i in sorted(positions[updates:], reverse=True):
+        del rows[i]
+    rows.extend([scenario.make_row(rand, folios) for _ in range(inserts)])
+    rand.shuffle(rows)
+    return rows
+
+
+def building_rows(scenario, rows, per_folio=1.5, seed=0):
+    """buildings for the folios of the rows, some folios have several buildings and some have none"""
+    rand = random.Random(seed + 2)
+    folios = sorted(set([x[0] for x in rows if x[0]]))
+    buildings = []
+    width = len(scenario.buildings) - 1
+    for folio in folios:
+        if rand.random() < 0.1:
+            continue
+        for _ in range(max(1, int(rand.expovariate(1.0 / per_folio)))):
+            buildings.append([folio] + [None] * width)
+    rand.shuffle(buildings)
+    return buildings
@@ -1,23 +1,59 @@
 import os
+import sys
 import logging
+import argparse
 import datetime
-from BCAD_NoiseMit_Tools import CARsGDBUpdate, WeaverGDBUpdate
-logfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs/task_log.txt")
-logging.basicConfig(filename=logfile, filemode='a', level=30)
+import BCAD_NoiseMit_Tools
+from BCAD_NoiseMit_Tools import CARsGDBUpdate, WeaverGDBUpdate, LeaseUpdate
+from utils.TaskRunner import LockFile, run_tasks, format_results
+from utils.Reporter import REPORT_LOG
 
-cars = CARsGDBUpdate()
-params = cars.getParameterInfo()
-result = cars.execute(params, "#")
-if not result:
-    logging.error("{} :: CARsGDBUpdate failed, run geoprocessing tool in ArcMap to debug".format(datetime.datetime.now()))
+home_dir = os.path.dirname(os.path.abspath(__file__))
+logfile = os.path.join(home_dir, "logs/task_log.txt")
+lockfile = os.path.join(home_dir, "logs/run_task.lock")
 
-weav = WeaverGDBUpdate()
-params = weav.getParameterInfo()
-result = weav.execute(params, "#")
-if not result:
-    logging.error("{} :: WeaverGDBUpdate failed, run geoprocessing tool in ArcMap to debug".format(datetime.datetime.now()))
+TOOLS = {"CARsGDBUpdate": CARsGDBUpdate, "WeaverGDBUpdate": WeaverGDBUpdate, "LeaseUpdate": LeaseUpdate}
 
 
+def run_tool(name):
+    """run one tool with the default parameters, in a worker process of run_tasks"""
+    # each tool writes its own report log, the rotating file handler can not be shared between processes
+    BCAD_NoiseMit_Tools.report_log = "{}_{}".format(name, REPORT_LOG)
+    tool = TOOLS[name]()
+    params = tool.getParameterInfo()
+    return tool.execute(params, "#")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="run the NoiseMit update tools, the tools post one at a time")
+    parser.add_argument("--tools", nargs="+", default=["CARsGDBUpdate", "WeaverGDBUpdate", "LeaseUpdate"],
+                        choices=sorted(TOOLS.keys()))
+    parser.add_argument("--processes", type=int, help="number of tools run at once, 1 runs them in turn")
+    args = parser.parse_args()
 
+    if not os.path.exists(os.path.dirname(logfile)):
+        os.makedirs(os.path.dirname(logfile))
+    logging.basicConfig(filename=logfile, filemode='a', level=logging.INFO)
+
+    lock = LockFile(lockfile)
+    if not lock.acquire():
+        logging.error("{} :: the tools are still running since {}, this run was skipped".format(
+            datetime.datetime.now(), lock.owner()))
+        return 1
+    with lock:
+        results, seconds = run_tasks(run_tool, args.tools, args.processes)
+
+    for x in results:
+        if x["error"]:
+            logging.error("{} :: {} raised an exception :: {}".format(datetime.datetime.now(), x["name"], x["error"]))
+        elif not x["result"]:
+            logging.error("{} :: {} failed, run geoprocessing tool in ArcMap to debug".format(datetime.datetime.now(),
+                                                                                             x["name"]))
+    report = format_results(results, seconds)
+    logging.info("{} :: run times\n{}".format(datetime.datetime.now(), report))
+    print(report)
+    return 0 if all([x["result"] and not x["error"] for x in results]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,33 @@
 import unittest
 
+from tests import test_arrayDiff
+from tests import test_buildingPlan
 from tests import test_buildingsUpdater
+from tests import test_cleanCSV
 from tests import test_functions
 from tests import test_gdbTableUpdater
+from tests import test_keyedUpsert
+from tests import test_queryPlanner
+from tests import test_reporter
+from tests import test_rowCleaner
+from tests import test_rowSnapshot
+from tests import test_runMetadata
+from tests import test_runMetrics
+from tests import test_scanStamp
 from tests import test_sdeConnector
+from tests import test_sortedMergeDiff
+from tests import test_storage
+from tests import test_taskRunner
 from tests import test_versionManager
 from tests import test_PythonToolbox
 
 
 functions_suite = test_functions.suite()
+unit_suites = unittest.TestSuite([test_sortedMergeDiff.suite(), test_rowSnapshot.suite(), test_runMetadata.suite(),
+                                 test_rowCleaner.suite(), test_arrayDiff.suite(), test_queryPlanner.suite(),
+                                 test_scanStamp.suite(), test_keyedUpsert.suite(), test_buildingPlan.suite(),
+                                 test_reporter.suite(), test_runMetrics.suite(), test_storage.suite(),
+                                 test_taskRunner.suite(), test_cleanCSV.suite()])
 
 suite1 = test_sdeConnector.suite()
 suite2 = test_versionManager.suite()
@@ -22,6 +41,7 @@ master_suites = unittest.TestSuite([suite5])
 
 runner = unittest.TextTestRunner()
 # runner.run(functions_suite)
+# runner.run(unit_suites)
 # runner.run(conn_suites)
 # runner.run(data_suites)
 runner.run(master_suites)
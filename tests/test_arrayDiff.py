@@ -0,0 +1,65 @@
+import datetime
+import random
+import unittest
+from unittest import TestCase
+
+import utils.UpdateNoiseMitSDE as Code
+from utils.RowCleaner import compile_cleaner
+try:
+    import numpy
+    from utils import ArrayDiff
+except ImportError:
+    ArrayDiff = None
+
+
+@unittest.skipIf(ArrayDiff is None, "NumPy is not installed")
+class TestArrayDiff(TestCase):
+    def test_matches_diff_rows(self):
+        target_fields = {
+            "folionumber": {"type": "String", "length": 12},
+            "phasename": {"type": "String", "length": 8},
+            "datestamp": {"type": "Date", "length": None},
+            "amount": {"type": "Double", "length": None}
+        }
+        field_names = ["FolioNumber", "PhaseName", "DateStamp", "Amount"]
+        dtype = [("FolioNumber", "<U20"), ("PhaseName", "<U20"), ("DateStamp", "<M8[us]"), ("Amount", "<f8")]
+        null_date = ArrayDiff.NULL_DATE
+        rand = random.Random(5)
+
+        def rows(n):
+            result = []
+            for i in range(n):
+                result.append((u"{:04d}".format(rand.randint(0, n // 4)), rand.choice([u"", u" group a", u"a!b",
+                                                                                       u"much too long"]),
+                               rand.choice([null_date, datetime.datetime(2018, 1, 1, 10)]),
+                               rand.choice([0.0, 1.0, 2.5])))
+            return result
+        source_rows = rows(3000)
+        target_rows = rows(3000)
+
+        clean = compile_cleaner(target_fields, field_names)
+
+        def python_row(row):
+            # the value read by a cursor for the null_value used by TableToNumPyArray
+            return [None if x == null_date else x for x in row]
+        expected_source = [x for x in [clean(python_row(row)) for row in source_rows] if any(x)]
+        expected = Code.diff_rows(expected_source, [python_row(row) for row in target_rows], clean)
+
+        source = ArrayDiff.clean_array(numpy.array(source_rows, dtype=dtype), target_fields, field_names)
+        source = source[ArrayDiff.nonempty(source)]
+        target = ArrayDiff.clean_array(numpy.array(target_rows, dtype=dtype), target_fields, field_names)
+        add_mask, rem_mask = ArrayDiff.diff_arrays(source, target)
+        add_rows = ArrayDiff.to_rows(source[add_mask], target_fields, field_names)
+        rem_rows = [python_row(row) for row in numpy.array(target_rows, dtype=object)[rem_mask].tolist()]
+
+        self.assertEqual(expected[0], add_rows)
+        self.assertEqual(sorted(map(repr, expected[1])), sorted(map(repr, rem_rows)))
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestArrayDiff)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from unittest import TestCase
+
+from utils.BuildingPlan import OneToOnePlan, FolioMemo, compile_domains, contact_name
+
+
+class TestOneToOnePlan(TestCase):
+    def test_new_row(self):
+        bldg_fields = {"Project Name": "ProjectName", "Phase Name": "PhaseName", "Year": "YearBuilt",
+                       "Folio Number": "FolioID"}
+        table_fields = {"Project Name": "ProjectStatus", "Phase Name": "Phase", "Year": "Year",
+                        "Folio Number": "FolioNumber"}
+        plan = OneToOnePlan(["FolioID", "ProjectName", "PhaseName", "YearBuilt"], bldg_fields, table_fields,
+                            {"ProjectName": 12, "PhaseName": 50}, {"Phase Name": ["group a", "group b"]})
+        table_values = {"ProjectStatus": ["Design in Process"], "Year": [1990],
+                        "Phase": ["Unknown", "Unknown", "Group B", "Group A", "Group B"]}
+        row = ["1", "", "", 1980]
+        # the most common phase in the domain is picked, the project is cut to its length and the year is kept
+        self.assertEqual(["1", "Design i ...", "Group B", 1980], plan.new_row(row, table_values))
+        self.assertEqual(row, plan.new_row(row, {}))
+
+    def test_folio_memo(self):
+        calls = []
+        memo = FolioMemo(lambda folio: calls.append(folio) or folio.upper())
+        self.assertEqual(["A", "A", "B"], [memo.get(x) for x in ["a", "a", "b"]])
+        self.assertEqual(["a", "b"], calls)
+        domains = compile_domains({"Phase Name": [" Group A", "group b"]})
+        self.assertEqual(frozenset(["group a", "group b"]), domains["Phase Name"])
+
+    def test_contact_name(self):
+        self.assertEqual(u"Smith, John", contact_name(u"SMITH", u"john"))
+        self.assertEqual(u"Lee", contact_name(u"lee", u"LEE"))
+        self.assertEqual(u"bob", contact_name(None, u"bob"))
+        self.assertEqual(u"", contact_name(None, u""))
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestOneToOnePlan)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import csv
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+from utils.RowCleaner import compile_cleaner
+from utils.CleanCSV import clean_file, load_schema
+
+
+def csv_rows(path):
+    """the rows of a csv file as text"""
+    with open(path, 'r') as f:
+        return [[x.decode("utf8") if isinstance(x, bytes) else x for x in row] for row in csv.reader(f)]
+
+
+class TestCleanCSV(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_clean_file(self):
+        schema = os.path.join(self.folder, "schema.json")
+        with open(schema, 'w') as f:
+            f.write('[["FolioNumber", "String", 12], ["LastName", "String", 8], ["Amount", "Double"]]')
+        target_fields = load_schema(schema)
+        source = os.path.join(self.folder, "weaver.csv")
+        rand = random.Random(3)
+        names = [u" Smith ", u"Lee, Ann", u"O'Neil#2", u"Featherstonehaugh", u""]
+        with open(source, 'w') as f:
+            f.write("folionumber,LastName,Amount,Notes\n")
+            for i in range(2500):
+                f.write('{},"{}",{},note {}\n'.format(3000 + i, rand.choice(names), rand.choice(["", "1.5"]), i))
+
+        clean = compile_cleaner(target_fields, ["FolioNumber", "LastName", "Amount"])
+        outputs = []
+        for processes in [1, 3]:
+            output = os.path.join(self.folder, "weaver_{}.csv".format(processes))
+            rows, seconds = clean_file(source, output, target_fields, processes, chunk_size=300)
+            self.assertEqual(2500, rows)
+            outputs.append(csv_rows(output))
+        # the chunks cleaned by the pool are written in the order they were read
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual([u"folionumber", u"LastName", u"Amount", u"Notes"], outputs[0][0])
+        for row, expected in zip(outputs[0][1:], csv_rows(source)[1:]):
+            self.assertEqual([u"{}".format(x) for x in clean(expected[:3])] + expected[3:], row)
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestCleanCSV)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
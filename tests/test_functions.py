@@ -1,6 +1,8 @@
 import os
+import random
 import unittest
 from unittest import TestCase
+from collections import Counter
 
 import arcpy
 
@@ -38,6 +40,86 @@ class TestClean_row(TestCase):
         self.assertListEqual(["", 0.0, "", "tree"], row)
 
 
+class FakeCursor(object):
+    """stands in for a da.SearchCursor over rows held in memory"""
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        for row in self.rows:
+            yield tuple(row)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+def list_scan_diff(add_rows, target_rows, clean):
+    """the list scan that compare_tables used before diff_rows, kept as the reference result"""
+    add_rows = list(add_rows)
+    rem_rows = []
+    for row in target_rows:
+        _row = clean(row)
+        if _row in add_rows:
+            add_rows.remove(_row)
+        else:
+            rem_rows.append(list(row))
+    return add_rows, rem_rows
+
+
+def synthetic_rows(n, seed):
+    rand = random.Random(seed)
+    rows = []
+    for i in range(n):
+        # every folio appears twice to exercise the duplicate handling
+        folio = u"{:012d}".format(i // 2)
+        rows.append([folio, u"group {}".format(rand.choice("abcdk")), float(rand.randint(0, 3))])
+    return rows
+
+
+class TestDiff_rows(TestCase):
+    def setUp(self):
+        self.clean = lambda row: list(row)
+
+    def test_duplicates(self):
+        add_rows = [["a", 1.0], ["b", 2.0], ["a", 1.0], ["c", 3.0]]
+        target = FakeCursor([["a", 1.0], ["d", 4.0], ["c", 3.0], ["c", 3.0]])
+        result = Code.diff_rows(add_rows, target, self.clean)
+        expected = list_scan_diff(add_rows, target, self.clean)
+        self.assertEqual(expected, result)
+        self.assertListEqual([["b", 2.0], ["a", 1.0]], result[0])
+        self.assertListEqual([["d", 4.0], ["c", 3.0]], result[1])
+
+    def test_object_ids(self):
+        add_rows = [["a", 1.0], ["b", 2.0], ["a", 1.0], ["c", 3.0]]
+        target = FakeCursor([["a", 1.0, 11], ["d", 4.0, 12], ["c", 3.0, 13], ["c", 3.0, 14]])
+        add, rem = Code.diff_rows(add_rows, target, self.clean, object_ids=True)
+        self.assertListEqual([["b", 2.0], ["a", 1.0]], add)
+        self.assertListEqual([["d", 4.0], ["c", 3.0]], rem)
+        self.assertListEqual([12, 14], rem.object_ids)
+        self.assertTrue(rem.keyed())
+        self.assertFalse(Code.RemoveRows([["d", 4.0]]).keyed())
+
+    def test_matches_list_scan(self):
+        source = synthetic_rows(4000, 1)
+        target = synthetic_rows(4000, 2)
+        expected = list_scan_diff(source, FakeCursor(target), self.clean)
+        self.assertEqual(expected, Code.diff_rows(source, FakeCursor(target), self.clean))
+
+    def test_100k_rows(self):
+        source = synthetic_rows(100000, 1)
+        target = synthetic_rows(100000, 2)
+        add_rows, rem_rows = Code.diff_rows(source, FakeCursor(target), self.clean)
+        # both tables hold the same number of rows so every unmatched row has a partner on the other side
+        self.assertEqual(len(add_rows), len(rem_rows))
+        source_counts = Counter(tuple(row) for row in source)
+        target_counts = Counter(tuple(row) for row in target)
+        self.assertEqual(source_counts - target_counts, Counter(tuple(row) for row in add_rows))
+        self.assertEqual(target_counts - source_counts, Counter(tuple(row) for row in rem_rows))
+
+
 class TestCompare_tables(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -124,9 +206,10 @@ class TestPrintConnection_info(TestCase):
 
 def suite():
     x = unittest.TestLoader().loadTestsFromTestCase(TestClean_row)
+    w = unittest.TestLoader().loadTestsFromTestCase(TestDiff_rows)
     y = unittest.TestLoader().loadTestsFromTestCase(TestCompare_tables)
     z = unittest.TestLoader().loadTestsFromTestCase(TestPrintConnection_info)
-    return unittest.TestSuite([x, y, z])
+    return unittest.TestSuite([x, w, y, z])
 
 
 if __name__ == '__main__':
@@ -1,4 +1,7 @@
 import os
+import datetime
+import shutil
+import tempfile
 import unittest
 from unittest import TestCase
 
@@ -10,6 +13,8 @@ from BCAD_NoiseMit_Tools import LeaseUpdate as LeaseUpdateTool
 from utils import UpdateNoiseMitSDE as Tool
 from utils.UpdateNoiseMitSDE import GDBTableUpdater as Updater
 from utils.UpdateNoiseMitSDE import VersionManager as Manager
+from utils.Storage import SQLiteStorage
+from utils.BulkAppend import compile_validator
 
 
 class TestGDBTableUpdater(TestCase):
@@ -187,10 +192,96 @@ class TestLeaseTableUpdater(TestCase):
         self.editor.stopEditing(False)
 
 
+class TestBulkAppend(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.storage = SQLiteStorage()
+        self.storage.create_table("C:\\test.sde\\bcad.DBO.Weaver", [
+            ("FolioNumber", "String", 12), ("Units", "SmallInteger", None), ("SignedDate", "Date", None)])
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_validator(self):
+        fields = ["FolioNumber", "Units", "SignedDate"]
+        validate = compile_validator(Tool.field_catalog("Weaver", self.storage), fields)
+        self.assertEqual(None, validate([u"3000", 4, datetime.datetime(2019, 5, 1)]))
+        self.assertEqual(None, validate([None, None, None]))
+        self.assertEqual(u"FolioNumber is 13 characters, the field holds 12; Units is not a whole number",
+                         validate([u"3000000000001", 2.5, None]))
+        self.assertEqual(u"Units is outside the range of a SmallInteger field; SignedDate is not a date",
+                         validate([u"1", 40000, u"2019-05-01"]))
+
+    def test_bulk_insert(self):
+        fields = ["FolioNumber", "Units", "SignedDate"]
+        day = datetime.datetime(2019, 5, 1)
+        rows = [[u"1", 1, day], [u"2", u"two", day], [u"3", 3, None]]
+        editor = self.storage.editor()
+        editor.startEditing(False, True)
+        updater = Updater(fields, "Weaver", rows, [], None, editor, storage=self.storage,
+                          bulk_insert="empty", reject_folder=self.folder)
+        self.assertTrue(updater.perform_update())
+        editor.stopEditing(True)
+        with self.storage.search_cursor("Weaver", fields) as cursor:
+            self.assertEqual([(u"1", 1, day), (u"3", 3, None)], list(cursor))
+        self.assertEqual(1, updater.insert_errors)
+        with open(os.path.join(self.folder, "Weaver_rejects.csv"), 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(["reason,FolioNumber,Units,SignedDate",
+                          "Units is not a whole number,2,two,2019-05-01T00:00:00"], lines)
+
+    def test_failed_append(self):
+        fields = ["FolioNumber", "Units", "SignedDate"]
+        rows = [[u"1", u"one", None], [u"2", 2, None], [u"3", 2.5, None], [u"4", 4, None]]
+
+        def failed_append(table, fields, rows, staging=None):
+            rows = iter(rows)
+            next(rows)
+            raise RuntimeError("ERROR 000732: in_memory does not exist")
+
+        self.storage.bulk_insert = failed_append
+        editor = self.storage.editor()
+        editor.startEditing(False, True)
+        updater = Updater(fields, "Weaver", None, [], None, editor, storage=self.storage,
+                          reject_folder=self.folder)
+        # the rows are read once, and the append fails after the first row
+        updater.insert_rows((x for x in rows), bulk=True)
+        editor.stopEditing(True)
+        with self.storage.search_cursor("Weaver", ["FolioNumber"]) as cursor:
+            self.assertEqual([(u"2",), (u"4",)], list(cursor))
+        # the row the append read and the row it did not reach are both rejected, once
+        self.assertEqual(2, updater.insert_errors)
+        with open(os.path.join(self.folder, "Weaver_rejects.csv"), 'r') as f:
+            self.assertEqual(3, len(f.read().splitlines()))
+
+
+class TestJoinField(TestCase):
+    def test_insert_and_concatenate(self):
+        storage = SQLiteStorage()
+        fields = ["AGREEMENT_NUMBER", "LEASEHOLD_NUMBER"]
+        storage.create_table("Lease", [("AGREEMENT_NUMBER", "String", 20), ("LEASEHOLD_NUMBER", "String", 20),
+                                       ("AGREEMENT_LEASE", "String", 50)])
+        storage.load_rows("Lease", fields + ["AGREEMENT_LEASE"], [
+            [u"AG-1", u"LH-1", u"AG-1-LH-1"], [u"AG-2", u"LH-2", None], [u"AG-3", None, u"kept"]])
+        editor = storage.editor()
+        editor.startEditing(False, True)
+        updater = Updater(fields, "Lease", [[u"AG-4", u"LH-4"], [u"AG-5", None]], [], None, editor,
+                          storage=storage, join_fields=("AGREEMENT_LEASE",) + tuple(fields))
+        self.assertEqual(2, updater.insert_rows())
+        self.assertTrue(updater.concatenate("AGREEMENT_LEASE", "AGREEMENT_NUMBER", "LEASEHOLD_NUMBER"))
+        editor.stopEditing(True)
+        with storage.search_cursor("Lease", ["AGREEMENT_LEASE"]) as cursor:
+            self.assertEqual([u"AG-1-LH-1", u"AG-2-LH-2", u"kept", u"AG-4-LH-4", None], [x[0] for x in cursor])
+        storage.close()
+
+
 def suite():
     x = unittest.TestLoader().loadTestsFromTestCase(TestGDBTableUpdater)
     y = unittest.TestLoader().loadTestsFromTestCase(TestLeaseTableUpdater)
-    return unittest.TestSuite((x, y))
+    z = unittest.TestLoader().loadTestsFromTestCase(TestBulkAppend)
+    w = unittest.TestLoader().loadTestsFromTestCase(TestJoinField)
+    return unittest.TestSuite((x, y, z, w))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+import unittest
+from unittest import TestCase
+
+from utils.KeyedUpsert import key_indexes, plan_upsert
+
+
+class TestKeyedUpsert(TestCase):
+    def test_key_indexes(self):
+        match_fields = ["projectname", "folionumber", "phasename"]
+        self.assertEqual([1, 2], key_indexes(match_fields, ["FolioNumber", "PhaseName"]))
+        self.assertEqual([1], key_indexes(match_fields[:2], ["FolioNumber", "PhaseName"]))
+        self.assertEqual([], key_indexes(["phasename"], ["FolioNumber", "PhaseName"]))
+
+    def test_plan(self):
+        clean = lambda row: [x.strip() for x in row]
+        add_rows = [[u"1", u"a", u"new"], [u"1", u"b", u"x"], [u"2", u"a", u"y"], [u"1", u"b", u"z"]]
+        rem_rows = [[u"1 ", u"a", u"old"], [u"1", u"b", u"z "], [u"3", u"a", u"gone"]]
+        plan = plan_upsert(add_rows, rem_rows, [10, 11, 12], clean, [0, 1])
+        self.assertEqual([12], plan.deletes)
+        self.assertEqual(sorted([10, 11]), sorted(plan.updates.keys()))
+        # only the changed column is written, the raw value of the key is kept
+        self.assertEqual([u"1 ", u"a", u"new"], plan.apply(rem_rows[0], 10))
+        # the duplicate key is paired with the closest row, which cleans to the same values
+        self.assertEqual([], plan.updates[11][1])
+        self.assertEqual(rem_rows[1], plan.apply(rem_rows[1], 11))
+        self.assertEqual([[u"1", u"b", u"x"], [u"2", u"a", u"y"]], plan.inserts)
+        self.assertEqual(5, len(plan))
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestKeyedUpsert)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
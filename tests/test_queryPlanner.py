@@ -0,0 +1,63 @@
+import unittest
+from unittest import TestCase
+
+from utils.QueryPlanner import ChunkedQuery
+from tests.test_functions import FakeCursor
+
+
+class FolioCursor(FakeCursor):
+    """a FakeCursor that applies a folio IN clause to the first column and records each clause"""
+    clauses = []
+
+    def __init__(self, table, fields, where_clause=None):
+        FakeCursor.__init__(self, table)
+        FolioCursor.clauses.append(where_clause)
+        if where_clause:
+            values = where_clause[where_clause.index("(") + 1:-1].split(",")
+            values = set([x.strip("'").replace("''", "'") for x in values])
+            self.rows = [x for x in table if x[0] in values]
+
+
+class TestChunkedQuery(TestCase):
+    def setUp(self):
+        FolioCursor.clauses = []
+        self.table = [[u"{:04d}".format(i % 50), i] for i in range(200)]
+        self.table.append([u"O'Hare", 200])
+
+    def test_clauses(self):
+        query = ChunkedQuery("FOLIONUMBER", [u"b", u"a", u"O'Hare", u"a", None], chunk_size=2)
+        self.assertEqual([u"FOLIONUMBER in ('O''Hare','a')", u"FOLIONUMBER in ('b')"], list(query.clauses()))
+        query = ChunkedQuery("OBJECTID", [3, 1, 2], chunk_size=10, quoted=False)
+        self.assertEqual([u"OBJECTID in (1,2,3)"], list(query.clauses()))
+
+    def test_chunks(self):
+        folios = [u"{:04d}".format(i) for i in range(0, 50, 2)] + [u"O'Hare"]
+        query = ChunkedQuery("FOLIONUMBER", folios, chunk_size=7)
+        rows = [row for cursor, row in query.rows(FolioCursor, self.table, ["FOLIONUMBER", "ID"], 0)]
+        self.assertEqual("chunks", query.strategy)
+        self.assertEqual(4, len(FolioCursor.clauses))
+        self.assertEqual(4, len(query.timings))
+        self.assertEqual(sorted([x for x in self.table if x[0] in folios]), sorted([list(x) for x in rows]))
+        self.assertEqual(len(rows), sum([x[1] for x in query.timings]))
+
+    def test_scan(self):
+        folios = [u"{:04d}".format(i) for i in range(0, 50, 2)] + [u"O'Hare"]
+        query = ChunkedQuery("FOLIONUMBER", folios, chunk_size=7, scan_threshold=10)
+        rows = [row for cursor, row in query.rows(FolioCursor, self.table, ["FOLIONUMBER", "ID"], 0)]
+        self.assertEqual("scan", query.strategy)
+        self.assertEqual([None], FolioCursor.clauses)
+        self.assertEqual(sorted([x for x in self.table if x[0] in folios]), sorted([list(x) for x in rows]))
+
+    def test_empty(self):
+        query = ChunkedQuery("FOLIONUMBER", [])
+        self.assertEqual([], list(query.rows(FolioCursor, self.table, ["FOLIONUMBER", "ID"], 0)))
+        self.assertEqual([], FolioCursor.clauses)
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestChunkedQuery)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+from utils.Reporter import Reporter, configure_log, report_logger, REPORT_LOG
+
+
+class TestReporter(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.handler = configure_log(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls):
+        report_logger.removeHandler(cls.handler)
+        cls.handler.close()
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def test_samples(self):
+        messages = []
+        warnings = []
+        report = Reporter("test", messages.append, warnings.append, samples=2)
+        for i in range(10):
+            report.warn("folios not found", "Folio {} not found".format(i))
+        report.info("buildings updated", "Good Row")
+        # the first two warnings and a notice that the rest are in the report log
+        self.assertEqual(3, len(warnings))
+        self.assertEqual(["Folio 0 not found", "Folio 1 not found"], warnings[:2])
+        self.assertEqual(["Good Row"], messages)
+        summary = report.summary()
+        self.assertEqual({"folios not found": 10, "buildings updated": 1}, summary)
+        self.assertEqual(u"test :: 10 folios not found", messages[1])
+        self.handler.flush()
+        with open(os.path.join(self.folder, REPORT_LOG)) as f:
+            log = f.read()
+        self.assertIn("Folio 9 not found", log)
+
+    def test_log_name(self):
+        # a log of another name replaces the last one, rather than being written along with it
+        handler = configure_log(self.folder, name="CARsGDBUpdate_" + REPORT_LOG)
+        try:
+            self.assertEqual([handler], report_logger.handlers)
+            Reporter("test", len, len).warn("folios not found", "Folio 1 not found")
+            handler.flush()
+            with open(os.path.join(self.folder, "CARsGDBUpdate_" + REPORT_LOG)) as f:
+                self.assertIn("Folio 1 not found", f.read())
+        finally:
+            TestReporter.handler = configure_log(self.folder)
+        self.assertEqual([self.handler], report_logger.handlers)
+
+    def test_progress(self):
+        messages = []
+        report = Reporter("test", messages.append, messages.append, interval=3600)
+        report.progress(100)
+        self.assertEqual([], messages)
+        report.interval = 0
+        report.progress(200)
+        self.assertEqual(1, len(messages))
+        self.assertIn("200 rows", messages[0])
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestReporter)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
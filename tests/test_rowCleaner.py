@@ -0,0 +1,90 @@
+import datetime
+import random
+import unittest
+from unittest import TestCase
+
+from utils.RowCleaner import compile_cleaner
+
+
+def legacy_clean_row(target_fields, field_names, _row):
+    """the interpretive clean_row that compile_cleaner replaced, kept as the reference result"""
+    cleaned_row = []
+    for i in range(len(_row)):
+        _x = _row[i]
+        field_name = field_names[i]
+        target_type = target_fields[field_name.lower()]["type"]
+        target_length = target_fields[field_name.lower()]["length"]
+
+        try:
+            if target_type == "String":
+                if type(_x) is str:
+                    _x = unicode(_x.strip(), encoding="utf8")
+                    for a in ["!", "@", "#", "$", "%", "^", "&", "*", ","]:
+                        _x = _x.replace(a, u"-")
+                        _x = _x.strip()
+                        if len(_x) > target_length:
+                            _x = u""
+                elif type(_x) is unicode:
+                    for a in ["!", "@", "#", "$", "%", "^", "&", "*", ","]:
+                        _x = _x.replace(a, u"-")
+                        _x = _x.strip()
+                        if len(_x) > target_length:
+                            _x = u""
+                elif type(_x) is datetime.datetime:
+                    _x = u"{}".format(_x.date())
+                if not _x:
+                    _x = u""
+
+            elif target_type == "Date":
+                if type(_x) is datetime.datetime:
+                    _x = _x.date()
+                if not _x:
+                    _x = None
+            elif target_type == "Double":
+                if not _x:
+                    _x = 0.0
+            else:
+                if not _x:
+                    _x = None
+
+        except AttributeError:
+            pass
+        cleaned_row.append(_x)
+    return cleaned_row
+
+
+class TestCompile_cleaner(TestCase):
+    def test_matches_legacy_clean_row(self):
+        target_fields = {
+            "folionumber": {"type": "String", "length": 12},
+            "phasename": {"type": "String", "length": 6},
+            "datestamp": {"type": "Date", "length": None},
+            "amount": {"type": "Double", "length": None},
+            "count": {"type": "Integer", "length": None}
+        }
+        field_names = ["FolioNumber", "PhaseName", "DateStamp", "Amount", "Count"]
+        strings = ["", "   ", " a!b ", u"group, a", u"  #$%  ", "too long for it", u"x*y", None, 0, 5,
+                   datetime.datetime(2018, 3, 1, 10, 30)]
+        others = [None, 0, 0.0, 1.5, "", u"a", datetime.datetime(2018, 3, 1, 10, 30), datetime.date(2018, 3, 1)]
+        rand = random.Random(3)
+        rows = []
+        for i in range(2000):
+            rows.append([rand.choice(strings), rand.choice(strings), rand.choice(others), rand.choice(others),
+                         rand.choice(others)])
+
+        for memo_size in [0, 4]:
+            clean = compile_cleaner(target_fields, field_names, memo_size)
+            for row in rows:
+                expected = legacy_clean_row(target_fields, field_names, row)
+                result = clean(row)
+                self.assertEqual(expected, result)
+                self.assertEqual([type(x) for x in expected], [type(x) for x in result])
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestCompile_cleaner)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+import utils.UpdateNoiseMitSDE as Code
+from utils.RowSnapshot import RowSnapshot, fingerprint
+from utils.RowCleaner import compile_cleaner
+from utils.QueryPlanner import QueryPlanner
+from utils.Storage import SQLiteStorage
+
+
+class TestRowSnapshot(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint([u"a", 1, None]), fingerprint([u"a", 1.0, None]))
+        self.assertNotEqual(fingerprint([u"a", 1.0, None]), fingerprint([u"a", 1.0, u""]))
+
+    def test_commit_load(self):
+        match_fields = ["folionumber", "phasename"]
+        snapshot = RowSnapshot(self.folder, "WeaverDataImport")
+        self.assertFalse(snapshot.load(match_fields))
+        for row in [[u"1", u"group a"], [u"1", u"group b"], [u"2", u"group a"], [u"2", u"group a"]]:
+            snapshot.record(row[0], fingerprint(row))
+        snapshot.commit(match_fields)
+
+        loaded = RowSnapshot(self.folder, "WeaverDataImport", sample_size=1)
+        self.assertFalse(loaded.load(["folionumber"]))
+        self.assertTrue(loaded.load(match_fields))
+        self.assertEqual(4, loaded.count)
+        self.assertEqual(1, len(loaded.sample()))
+        self.assertEqual(2, loaded.fingerprints([u"2"])[fingerprint([u"2", u"group a"])])
+
+    def test_snapshot_diff(self):
+        storage = SQLiteStorage()
+        fields = ["FolioNumber", "PhaseName"]
+        storage.create_table("Weaver", [("FolioNumber", "String", 12), ("PhaseName", "String", 20)])
+        storage.load_rows("Weaver", fields, [[u"1", u"group a"], [u"O'1", u"group b"], [u"2", u"group c"]])
+        clean = compile_cleaner(Code.field_catalog("Weaver", storage), fields)
+        snapshot = RowSnapshot(self.folder, "Weaver")
+        with storage.search_cursor("Weaver", fields) as cursor:
+            for row in cursor:
+                snapshot.record(row[0], fingerprint(clean(row)))
+        snapshot.commit(["folionumber", "phasename"])
+        snapshot.load(["folionumber", "phasename"])
+
+        add_rows = [clean(x) for x in [[u"1", u"group a"], [u"2", u"group c"], [u"3", u"group d"]]]
+        # a folio with a quote is selected, with one folio in each IN clause
+        new_rows, rem_rows = Code.snapshot_diff(snapshot, "Weaver", fields, clean, 0, add_rows,
+                                                [fingerprint(x) for x in add_rows], storage, QueryPlanner(1))
+        storage.close()
+        self.assertEqual([[u"3", u"group d"]], new_rows)
+        self.assertEqual([2], rem_rows.object_ids)
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestRowSnapshot)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
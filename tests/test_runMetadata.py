@@ -0,0 +1,134 @@
+import datetime
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+import utils.UpdateNoiseMitSDE as Code
+from utils.RunMetadata import RunMetadata, SourceDigest, FolioDigests, ChangeWatermark
+from utils.Storage import SQLiteStorage
+from tests.test_functions import synthetic_rows
+
+
+class TestSourceDigest(TestCase):
+    def test_unchanged(self):
+        rows = synthetic_rows(1000, 1)
+        first = SourceDigest()
+        for row in rows:
+            first.update(row)
+        # the order the rows are read in does not change the digest
+        second = SourceDigest(first.hexdigest())
+        for row in reversed(rows):
+            second.update(row)
+        self.assertTrue(second.unchanged())
+
+        third = SourceDigest(first.hexdigest())
+        for row in rows[1:]:
+            third.update(row)
+        self.assertFalse(third.unchanged())
+        self.assertFalse(SourceDigest().unchanged())
+
+    def test_run_metadata(self):
+        folder = tempfile.mkdtemp()
+        try:
+            RunMetadata(folder, "SSACAR").record_scan(source_digest="abc")
+            metadata = RunMetadata(folder, "SSACAR")
+            self.assertEqual("abc", metadata.get("source_digest"))
+            self.assertTrue(metadata.get("last_scanned"))
+        finally:
+            shutil.rmtree(folder)
+
+    def test_folio_digests(self):
+        folder = tempfile.mkdtemp()
+        fields = ["FolioID", "PhaseName", "ContactName"]
+        try:
+            digests = FolioDigests(folder, "NoiseBuilding")
+            self.assertFalse(digests.load(fields))
+            self.assertTrue(digests.changed(u"1", [u"Group A", u"Smith"]))
+            self.assertTrue(digests.changed(u"2", [u"Group B", None]))
+            self.assertTrue(digests.changed(u"3", [u"Group C", None]))
+            # the buildings of folio 3 failed to update, its digest is not saved
+            digests.failed(u"3")
+            digests.commit()
+
+            digests = FolioDigests(folder, "NoiseBuilding")
+            self.assertTrue(digests.load(fields))
+            self.assertFalse(digests.changed(u"1", [u"Group A", u"Smith"]))
+            self.assertTrue(digests.changed(u"2", [u"Group B", u"Jones"]))
+            self.assertTrue(digests.changed(u"3", [u"Group C", None]))
+            # the digests are dropped when the fields change
+            self.assertFalse(digests.load(fields[:2]))
+            self.assertTrue(digests.changed(u"1", [u"Group A", u"Smith"]))
+        finally:
+            shutil.rmtree(folder)
+
+
+class TestChangeWatermark(TestCase):
+    def setUp(self):
+        self.storage = SQLiteStorage()
+        fields = [("FolioNumber", "String", 12), ("PhaseName", "String", 20), ("Amount", "Double", None)]
+        self.storage.create_table("C:\\test.sde\\bcad.DBO.CARs", fields)
+        self.storage.create_table("C:\\source.sde\\CARsSource", fields + [("last_edited_date", "Date", None)])
+        day = datetime.datetime(2019, 5, 1, 8)
+        rows = [[u"1", u"Group A", 1.0], [u"1", u"Group B", 2.0], [u"2", u"Group A", 3.0], [u"3", u"Group C", 4.0]]
+        self.storage.load_rows("CARs", [x[0] for x in fields], rows)
+        self.storage.load_rows("CARsSource", [x[0] for x in fields] + ["last_edited_date"],
+                               [x + [day - datetime.timedelta(hours=3 - i)] for i, x in enumerate(rows)])
+
+    def tearDown(self):
+        self.storage.close()
+
+    def compare(self, watermark):
+        result = Code.compare_tables("C:\\source.sde\\CARsSource", "C:\\test.sde\\bcad.DBO.CARs",
+                                     storage=self.storage, watermark=watermark)
+        add_rows = sorted([[row[result["match_fields"].index(x)] for x in ["folionumber", "phasename", "amount"]]
+                           for row in result["add_rows"]])
+        return add_rows, sorted(result["exist_rows"].object_ids)
+
+    def test_changed_rows(self):
+        # the first run reads the whole source and keeps the latest edit time
+        watermark = ChangeWatermark()
+        self.assertEqual(([], []), self.compare(watermark))
+        self.assertFalse(watermark.incremental)
+        values = watermark.values()
+        self.assertEqual("last_edited_date", values["field"])
+        self.assertEqual("2019-05-01T08:00:00", values["watermark"])
+
+        # the row of folio 2 is edited and the second row of folio 1 is deleted
+        self.storage.connection.execute("UPDATE CARsSource SET Amount = 5.0, last_edited_date = '2019-05-02 09:30:00' "
+                                        "WHERE FolioNumber = '2'")
+        self.storage.connection.execute("DELETE FROM CARsSource WHERE PhaseName = 'Group B'")
+        watermark = ChangeWatermark(values)
+        # folio 3 was edited at the watermark and is read again, it has not changed
+        self.assertEqual(([[u"2", u"Group A", 5.0]], [3]), self.compare(watermark))
+        self.assertTrue(watermark.incremental)
+        self.assertFalse(watermark.reconciled)
+        self.assertEqual("2019-05-02T09:30:00", watermark.values()["watermark"])
+        self.assertEqual(values["reconciled"], watermark.values()["reconciled"])
+
+        # the deleted row is found by the key reconcile, the count of rows of folio 1 differs
+        values["reconciled"] = "2019-04-30T08:00:00"
+        watermark = ChangeWatermark(values)
+        self.assertEqual(([[u"2", u"Group A", 5.0]], [2, 3]), self.compare(watermark))
+        self.assertTrue(watermark.reconciled)
+        self.assertEqual(watermark.started.isoformat(), watermark.values()["reconciled"])
+
+        # without rows edited after the watermark it stays, and a change of the match fields drops it
+        values = watermark.values()
+        watermark = ChangeWatermark(values, reconcile_hours=1000000)
+        self.compare(watermark)
+        self.assertEqual("2019-05-02T09:30:00", watermark.values()["watermark"])
+        values["fields"] = ["folionumber"]
+        watermark = ChangeWatermark(values)
+        self.compare(watermark)
+        self.assertFalse(watermark.incremental)
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestSourceDigest)
+    y = unittest.TestLoader().loadTestsFromTestCase(TestChangeWatermark)
+    return unittest.TestSuite((x, y))
+
+
+if __name__ == "__main__":
+    unittest.main()
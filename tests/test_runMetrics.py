@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+from utils.RunMetrics import RunMetrics, load_history, compare_latest
+
+
+class TestRunMetrics(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_spans(self):
+        metrics = RunMetrics("CARsGDBUpdate", "CARs")
+        with metrics.span("insert") as span:
+            span.rows = 10
+        try:
+            with metrics.span("rec/post"):
+                raise ValueError("conflict")
+        except ValueError:
+            pass
+        record = metrics.save(self.folder)
+        self.assertEqual(["insert", "rec/post"], [x["name"] for x in record["spans"]])
+        self.assertEqual(10, record["spans"][0]["rows"])
+        self.assertTrue(record["spans"][1]["error"])
+        metrics.save(self.folder)
+        records = load_history(os.path.join(self.folder, "run_metrics.jsonl"))
+        self.assertEqual(2, len(records))
+        self.assertEqual("CARs", records[0]["table"])
+
+    def test_compare_latest(self):
+        def record(insert, total):
+            return {"tool": "t", "table": "a", "seconds": total,
+                    "spans": [{"name": "insert", "seconds": insert, "rows": 1}]}
+        records = [record(10.0, 20.0), record(12.0, 22.0), record(11.0, 21.0), record(30.0, 22.5)]
+        rows = compare_latest(records, window=10, threshold=1.5)[("t", "a")]
+        rows = dict([(x[0], x) for x in rows])
+        self.assertEqual(11.0, rows["insert"][2])
+        self.assertTrue(rows["insert"][4])
+        self.assertFalse(rows["total"][4])
+        # the first run of a table has no median to compare with
+        rows = compare_latest(records[:1])[("t", "a")]
+        self.assertEqual([None, None], [rows[0][2], rows[0][3]])
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestRunMetrics)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
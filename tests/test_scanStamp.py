@@ -0,0 +1,41 @@
+import os
+import datetime
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+import arcpy
+
+import utils.UpdateNoiseMitSDE as Code
+
+
+class TestScanStamp(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.gdb = arcpy.CreateFileGDB_management(self.folder, "Metadata.gdb").getOutput(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_stamp_read(self):
+        stamp = Code.ScanStamp(self.gdb)
+        self.assertIsNone(stamp.read("WeaverDataImport"))
+        first = datetime.datetime(2020, 1, 1, 6, 0)
+        stamp.stamp("WeaverDataImport", first)
+        stamp.stamp("SSACAR", first)
+        second = datetime.datetime(2020, 1, 2, 6, 0)
+        stamp.stamp("WeaverDataImport", second)
+        # each table keeps a single row
+        self.assertEqual(2, int(arcpy.GetCount_management(stamp.table).getOutput(0)))
+        self.assertEqual(second, stamp.read("WeaverDataImport"))
+        self.assertEqual(first, Code.read_last_scanned(os.path.join(self.gdb, "SSACAR"), stamp))
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestScanStamp)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from unittest import TestCase
+
+import utils.UpdateNoiseMitSDE as Code
+from utils.SortedMergeDiff import SortedMergeDiff
+from tests.test_functions import FakeCursor, synthetic_rows
+
+
+class TestSortedMergeDiff(TestCase):
+    def test_matches_diff_rows(self):
+        source = synthetic_rows(20000, 1)
+        target = synthetic_rows(20000, 2)
+        target.append([None, u"", 0.0])
+        expected = Code.diff_rows(source, FakeCursor(target), list)
+
+        # a small memory budget forces several sorted runs on each side
+        merge = SortedMergeDiff(folio_index=0, memory_budget=256 * 1024)
+        for row in source:
+            merge.add_source(row)
+        for row in FakeCursor(target):
+            merge.add_target(list(row), row)
+        self.assertGreater(len(merge.source.runs), 1)
+        add_rows, rem_rows = merge.run()
+        try:
+            self.assertEqual(len(expected[0]), len(add_rows))
+            self.assertEqual(len(expected[1]), len(rem_rows))
+            self.assertEqual(sorted(map(tuple, expected[0])), sorted(map(tuple, add_rows)))
+            self.assertEqual(sorted(map(tuple, expected[1]), key=repr), sorted(map(tuple, rem_rows), key=repr))
+            # the streams are grouped by folio
+            folios = [x[0] for x in add_rows]
+            self.assertEqual(sorted(folios), folios)
+        finally:
+            merge.remove()
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestSortedMergeDiff)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
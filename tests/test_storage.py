@@ -0,0 +1,102 @@
+import os
+import datetime
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+import utils.UpdateNoiseMitSDE as Code
+from utils.Storage import SQLiteStorage
+
+
+class TestSQLiteStorage(TestCase):
+    def setUp(self):
+        self.storage = SQLiteStorage()
+        fields = [("FolioNumber", "String", 12), ("PhaseName", "String", 20), ("Amount", "Double", None),
+                  ("SignedDate", "Date", None)]
+        self.storage.create_table("C:\\test.sde\\bcad.DBO.Weaver", fields)
+        self.storage.create_table("C:\\source.sde\\WeaverSource", fields)
+        day = datetime.datetime(2019, 5, 1)
+        self.storage.load_rows("Weaver", [x[0] for x in fields], [
+            [u"1", u"Group A", 1.0, day], [u"2", u"Group B", 2.0, None], [u"3", u"Group C", None, day]])
+        self.storage.load_rows("WeaverSource", [x[0] for x in fields], [
+            [u"1", u"Group A", 1.0, day], [u"2", u"Group B!", 2.0, None], [u"4", u"Group D", 0.0, None]])
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_cursors(self):
+        storage = self.storage
+        self.assertEqual(3, storage.count("Weaver"))
+        self.assertEqual(["OBJECTID", "FolioNumber", "Amount"], [f.name for f in storage.list_fields("Weaver", "*o*")])
+        self.assertEqual(12, storage.list_fields("Weaver", "folionumber")[0].length)
+        with storage.search_cursor("Weaver", ["FolioNumber", "SignedDate", "OID@"], "FolioNumber in ('1','3')") as c:
+            rows = [row for row in c]
+        self.assertEqual([(u"1", datetime.datetime(2019, 5, 1), 1), (u"3", datetime.datetime(2019, 5, 1), 3)], rows)
+
+        editor = storage.editor()
+        editor.startEditing(False, True)
+        editor.startOperation()
+        with storage.update_cursor("Weaver", ["FolioNumber", "PhaseName"]) as cursor:
+            for row in cursor:
+                if row[0] == u"1":
+                    cursor.updateRow([u"1", u"Group Z"])
+                elif row[0] == u"2":
+                    cursor.deleteRow()
+        with storage.insert_cursor("Weaver", ["FolioNumber", "PhaseName"]) as cursor:
+            self.assertEqual(4, cursor.insertRow([u"5", u"Group E"]))
+        editor.stopOperation()
+        editor.stopEditing(True)
+        with storage.search_cursor("Weaver", ["FolioNumber", "PhaseName"]) as cursor:
+            self.assertEqual([(u"1", u"Group Z"), (u"3", u"Group C"), (u"5", u"Group E")], list(cursor))
+
+        # the edits are rolled back when they are not saved
+        editor.startEditing(False, True)
+        with storage.update_cursor("Weaver", ["OID@"], "OBJECTID in (1,3)") as cursor:
+            for row in cursor:
+                cursor.deleteRow()
+        editor.stopEditing(False)
+        self.assertEqual(3, storage.count("Weaver"))
+
+        indexes = storage.connection.execute("PRAGMA index_list(Weaver)").fetchall()
+        self.assertEqual(1, len(indexes))
+
+    def test_compare_tables(self):
+        result = Code.compare_tables("C:\\source.sde\\WeaverSource", "C:\\test.sde\\bcad.DBO.Weaver",
+                                     storage=self.storage)
+        # the order of the match fields follows the field catalog
+        fields = ["folionumber", "phasename", "amount", "signeddate"]
+        index = [result["match_fields"].index(x) for x in fields]
+        add_rows = sorted([[row[i] for i in index] for row in result["add_rows"]])
+        self.assertEqual([[u"2", u"Group B-", 2.0, None], [u"4", u"Group D", 0.0, None]], add_rows)
+        self.assertEqual([2, 3], sorted(result["exist_rows"].object_ids))
+
+    def test_compare_csv(self):
+        folder = tempfile.mkdtemp()
+        try:
+            source = os.path.join(folder, "WeaverDataImport.csv")
+            with open(source, 'w') as f:
+                f.write("FolioNumber,PhaseName,Amount,SignedDate\n"
+                        "1,Group A,1.0,5/1/2019 12:00:00 AM\n"
+                        "2,Group B!,2,\n"
+                        "4,Group D,,\n"
+                        "5,Group E,lots,2019-05-01\n")
+            result = Code.compare_tables(source, "C:\\test.sde\\bcad.DBO.Weaver", storage=self.storage)
+            fields = ["folionumber", "phasename", "amount", "signeddate"]
+            index = [result["match_fields"].index(x) for x in fields]
+            add_rows = sorted([[row[i] for i in index] for row in result["add_rows"]])
+            # the values are parsed to the types of the gdb table, an amount that is not a number is read as null
+            self.assertEqual([[u"2", u"Group B-", 2.0, None], [u"4", u"Group D", 0.0, None],
+                              [u"5", u"Group E", 0.0, datetime.date(2019, 5, 1)]], add_rows)
+            self.assertEqual([2, 3], sorted(result["exist_rows"].object_ids))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestSQLiteStorage)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
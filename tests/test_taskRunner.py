@@ -0,0 +1,59 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import TestCase
+
+from utils.TaskRunner import LockFile, run_tasks, posting
+
+
+def task_worker(name):
+    """a tool for TestTaskRunner, it posts under the lock of run_tasks"""
+    if name == "bad":
+        raise ValueError("no version")
+    with posting():
+        time.sleep(0.05)
+    return name.upper()
+
+
+class TestTaskRunner(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_lock_file(self):
+        path = os.path.join(self.folder, "logs", "run_task.lock")
+        first = LockFile(path)
+        self.assertTrue(first.acquire())
+        self.assertEqual(os.getpid(), first.owner()["pid"])
+        # an overlapping run is refused until the first releases the lock
+        self.assertFalse(LockFile(path).acquire())
+        with first:
+            pass
+        self.assertFalse(os.path.exists(path))
+        # a lock left by a run that was killed is replaced once it is older than max_age
+        self.assertTrue(LockFile(path).acquire())
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        self.assertFalse(LockFile(path, max_age=7200).acquire())
+        self.assertTrue(LockFile(path, max_age=60).acquire())
+
+    def test_run_tasks(self):
+        for processes in [1, 3]:
+            results, seconds = run_tasks(task_worker, ["cars", "bad", "weaver"], processes)
+            self.assertEqual(["cars", "bad", "weaver"], [x["name"] for x in results])
+            self.assertEqual(["CARS", None, "WEAVER"], [x["result"] for x in results])
+            self.assertTrue("no version" in results[1]["error"])
+            self.assertTrue(seconds >= max([x["seconds"] for x in results]))
+
+
+def suite():
+    x = unittest.TestLoader().loadTestsFromTestCase(TestTaskRunner)
+    return unittest.TestSuite(x)
+
+
+if __name__ == "__main__":
+    unittest.main()
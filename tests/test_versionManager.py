@@ -1,9 +1,13 @@
 import os
+import shutil
+import tempfile
 import unittest
 from unittest import TestCase
 
 from BCAD_NoiseMit_Tools import WeaverGDBUpdate as PythonTool
 from utils.UpdateNoiseMitSDE import VersionManager as Manager
+from utils.RunMetadata import RunMetadata
+from utils import TaskRunner
 
 
 class TestVersionManager(TestCase):
@@ -63,9 +67,86 @@ class TestVersionManager(TestCase):
         self.assertTrue(result)
 
 
+class ReusedVersion(Manager):
+    """a VersionManager that records the calls that would reach the geodatabase"""
+
+    def __init__(self, version_cache, valid=True):
+        Manager.__init__(self, {"version": "dbo.DEFAULT"}, "C:\\DBConnections", "C:\\gis.sde",
+                         "NoiseMit", "NoiseMit.sde", "SQL_SERVER", "server", version_cache=version_cache)
+        self.valid = valid
+        self.calls = []
+
+    def clean_previous(self):
+        self.calls.append("clean")
+        self.forget_version()
+        return True
+
+    def connect_version(self):
+        self.calls.append("create")
+        self.edit_version = "DBO.NoiseMit"
+        self.version_sde = "C:\\DBConnections\\NoiseMit.sde"
+        return self.version_sde
+
+    def valid_connection(self, version_sde, edit_version):
+        return self.valid
+
+    def reconcile(self):
+        # the reconcile holds the post lock of run_tasks
+        self.calls.append("reconcile" if TaskRunner.post_lock.locked else "reconcile without the lock")
+
+
+class PostLock(object):
+    def __init__(self):
+        self.locked = False
+
+    def acquire(self):
+        self.locked = True
+
+    def release(self):
+        self.locked = False
+
+
+class TestVersionReuse(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        TaskRunner.set_post_lock(PostLock())
+
+    def tearDown(self):
+        TaskRunner.set_post_lock(None)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_open_version(self):
+        cache = RunMetadata(self.folder, "NoiseMit_version")
+        manager = ReusedVersion(cache)
+        self.assertEqual("C:\\DBConnections\\NoiseMit.sde", manager.open_version())
+        self.assertEqual(["clean", "create"], manager.calls)
+        # the edits of the first run were not posted, so the version is created again
+        manager = ReusedVersion(RunMetadata(self.folder, "NoiseMit_version"))
+        manager.open_version()
+        self.assertEqual(["clean", "create"], manager.calls)
+        manager.version_cache.update(posted=True)
+        # a posted version is reconciled and reused, until its connection file stops working
+        manager = ReusedVersion(RunMetadata(self.folder, "NoiseMit_version"))
+        self.assertEqual("C:\\DBConnections\\NoiseMit.sde", manager.open_version())
+        self.assertEqual(["reconcile"], manager.calls)
+        self.assertEqual("DBO.NoiseMit", manager.edit_version)
+        self.assertTrue(manager.close_version())
+        manager.version_cache.update(posted=True)
+        manager = ReusedVersion(RunMetadata(self.folder, "NoiseMit_version"), valid=False)
+        manager.open_version()
+        self.assertEqual(["clean", "create"], manager.calls)
+
+    def test_without_cache(self):
+        manager = ReusedVersion(None)
+        manager.open_version()
+        manager.close_version()
+        self.assertEqual(["clean", "create", "clean"], manager.calls)
+
+
 def suite():
     x = unittest.TestLoader().loadTestsFromTestCase(TestVersionManager)
-    return unittest.TestSuite(x)
+    y = unittest.TestLoader().loadTestsFromTestCase(TestVersionReuse)
+    return unittest.TestSuite((x, y))
 
 
 if __name__ == "__main__":
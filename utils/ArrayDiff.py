@@ -0,0 +1,153 @@
+"""Vectorized cleaning and diffing of tables read with da.TableToNumPyArray.
+
+The cleaned source and target arrays share one structured dtype, so each row can be viewed as a single void
+value and matched with sorted set operations."""
+import datetime
+import numpy as np
+
+# np.isin is missing from the NumPy shipped with ArcMap, and np.in1d is gone from NumPy 2
+isin = getattr(np, "isin", None) or np.in1d
+
+from utils.RowCleaner import TRANSLATE_TABLE
+
+# nulls in date fields are read as this date, and written back out as None
+NULL_DATE = datetime.datetime(1900, 1, 1)
+
+SUPPORTED_TYPES = ["String", "Date", "Double", "Single", "Integer", "SmallInteger"]
+
+
+def supported(target_fields, field_names):
+    """the array path handles the field types that have a fixed width NumPy dtype"""
+    return all([target_fields[x.lower()]["type"] in SUPPORTED_TYPES for x in field_names])
+
+
+def null_values(target_fields, field_names):
+    """the null_value for TableToNumPyArray, each null is read as the value the row cleaner would give it"""
+    values = {}
+    for x in field_names:
+        field_type = target_fields[x.lower()]["type"]
+        if field_type == "String":
+            values[x] = u""
+        elif field_type == "Date":
+            values[x] = NULL_DATE
+        elif field_type in ["Double", "Single"]:
+            values[x] = 0.0
+        else:
+            values[x] = 0
+    return values
+
+
+def column_dtype(field):
+    if field["type"] == "String":
+        return "<U{}".format(max(field["length"] or 1, 1))
+    elif field["type"] == "Date":
+        return "<M8[D]"
+    elif field["type"] in ["Double", "Single"]:
+        return "<f8"
+    return "<i8"
+
+
+def clean_array(array, target_fields, field_names):
+    """Clean the first len(field_names) columns of the array against the target schema.
+
+    Strings have the special characters replaced, are stripped and are blanked when longer than the target
+    field.  Dates are truncated to the day and numbers are cast to a common width.  The columns are named by
+    position so arrays read from the source and the target tables have the same dtype."""
+    dtype = [("f{}".format(i), column_dtype(target_fields[x.lower()])) for i, x in enumerate(field_names)]
+    cleaned = np.zeros(len(array), dtype=dtype)
+    for i, x in enumerate(field_names):
+        field = target_fields[x.lower()]
+        column = array[array.dtype.names[i]]
+        name = "f{}".format(i)
+        if field["type"] == "String":
+            if column.dtype.kind == "S":
+                column = np.char.decode(column, "utf8")
+            column = np.char.strip(np.char.translate(column, TRANSLATE_TABLE))
+            if field["length"] is None:
+                column = np.zeros(len(column), dtype="<U1")
+            else:
+                column = np.where(np.char.str_len(column) > field["length"], u"", column)
+            cleaned[name] = column
+        elif field["type"] == "Date":
+            cleaned[name] = column.astype("<M8[D]")
+        elif field["type"] in ["Double", "Single"]:
+            # adding 0.0 turns -0.0 into 0.0 so the bytes of equal values match
+            cleaned[name] = np.nan_to_num(column.astype("<f8")) + 0.0
+        else:
+            cleaned[name] = column.astype("<i8")
+    return cleaned
+
+
+def nonempty(cleaned):
+    """mask of the rows that have at least one value, the empty rows are dropped from the source"""
+    mask = np.zeros(len(cleaned), dtype=bool)
+    null_date = np.datetime64(NULL_DATE.date())
+    for name in cleaned.dtype.names:
+        column = cleaned[name]
+        if column.dtype.kind == "U":
+            mask |= column != u""
+        elif column.dtype.kind == "M":
+            mask |= column != null_date
+        else:
+            mask |= column != 0
+    return mask
+
+
+def row_keys(cleaned):
+    """view each row of the structured array as a single void value"""
+    cleaned = np.ascontiguousarray(cleaned)
+    return cleaned.view(np.dtype((np.void, cleaned.dtype.itemsize)))
+
+
+def occurrence(ids):
+    """number each row by how many identical rows came before it, 0 for the first"""
+    n = len(ids)
+    rank = np.zeros(n, dtype=np.int64)
+    if not n:
+        return rank
+    order = np.argsort(ids, kind="mergesort")
+    sorted_ids = ids[order]
+    positions = np.arange(n)
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+    group_start = np.maximum.accumulate(np.where(first, positions, 0))
+    rank[order] = positions - group_start
+    return rank
+
+
+def diff_arrays(source, target):
+    """Multiset diff of two cleaned arrays with the same dtype.
+
+    Each row gets the id of its distinct value and its occurrence number, so the n-th copy of a row in the
+    source matches the n-th copy in the target, like the Counter in diff_rows.  Returns the mask of the source
+    rows to add and the mask of the target rows to remove."""
+    keys = np.concatenate([row_keys(source), row_keys(target)])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    source_ids = inverse[:len(source)].astype(np.int64)
+    target_ids = inverse[len(source):].astype(np.int64)
+    source_rank = occurrence(source_ids)
+    target_rank = occurrence(target_ids)
+    width = max(source_rank.max() if len(source) else 0, target_rank.max() if len(target) else 0) + 1
+    source_pairs = source_ids * width + source_rank
+    target_pairs = target_ids * width + target_rank
+    add_mask = ~isin(source_pairs, target_pairs)
+    rem_mask = ~isin(target_pairs, source_pairs)
+    return add_mask, rem_mask
+
+
+def to_rows(cleaned, target_fields, field_names):
+    """convert the cleaned array to lists of python values, the same values that clean_row returns"""
+    converters = []
+    null_date = NULL_DATE.date()
+    for x in field_names:
+        field_type = target_fields[x.lower()]["type"]
+        if field_type == "String":
+            converters.append(lambda v: v)
+        elif field_type == "Date":
+            converters.append(lambda v: None if v == null_date else v)
+        elif field_type == "Double":
+            converters.append(lambda v: v)
+        else:
+            converters.append(lambda v: v if v else None)
+    return [[f(v) for f, v in zip(converters, row)] for row in cleaned.tolist()]
@@ -0,0 +1,153 @@
+"""The field mapping used by BuildingsUpdater.perform_one2one, resolved once per run.
+
+For each building field the plan holds the table field it is read from, the maximum string length and the
+domain values, so updating a building row is a flat loop over the slots.  Many buildings share a folio, so the
+values resolved for a folio are kept in a FolioMemo for the run."""
+from operator import itemgetter
+
+# marks a building field that keeps the value already on the row
+KEEP = object()
+
+
+def concat_list(_length, _input):
+    """take the input multivalue list and output a string no longer than the max string length parameter"""
+    max_length = _length
+    _ph = _input
+    if type(_ph) == list:
+        _ph = list(set(_ph))
+        _ph = ", ".join(_ph)
+
+    if len(_ph) > max_length:
+        _ph = _ph[:(max_length-4)] + " ..."
+    return _ph
+
+
+def compile_domains(domains):
+    """the domain value lists as lowercase frozensets, keyed by the field label"""
+    if not domains:
+        return {}
+    return dict([(k, frozenset([x.lower().strip() for x in v])) for k, v in domains.items()])
+
+
+def contact_name(f1, f2):
+    """the contact name of a related table row from its two name fields, capitalized and without a repeat"""
+    if f1 and f2:
+        f1 = f1.capitalize()
+        f2 = f2.capitalize()
+        if f1.upper() != f2.upper():
+            return u"{}, {}".format(f1, f2)
+        return u"{}".format(f1)
+    if f1:
+        return u"{}".format(f1)
+    elif f2:
+        return u"{}".format(f2)
+    return u""
+
+
+def contact_string(names, max_length):
+    """join the distinct contact names of a folio, cut to the length of the target field"""
+    contacts = list(set([x for x in names if x]))
+    contact_str = u"; ".join(contacts)
+    if len(contact_str) > max_length:
+        contact_str = contact_str[:max_length]
+    return contact_str
+
+
+class FolioMemo(object):
+    """the values resolved for each folio, resolve is called once for a folio and kept for the run"""
+
+    def __init__(self, resolve):
+        self.resolve = resolve
+        self.values = {}
+
+    def get(self, folio):
+        try:
+            return self.values[folio]
+        except KeyError:
+            result = self.values[folio] = self.resolve(folio)
+            return result
+
+
+def pick_domain_value(values, value_list):
+    """keep the most common value that is in the domain, dropping the more common values that are not"""
+    counts = {}
+    for v in values:
+        counts[v] = counts.get(v, 0) + 1
+    # get the three most common values from the table_values list, the stable sort breaks ties in the same
+    # order as Counter.most_common without building a Counter for each value list
+    most_common = sorted(counts.items(), key=itemgetter(1), reverse=True)[:3]
+    # starting with the most common value
+    for c in most_common:
+        item = c[0]
+        # if it is a string value
+        if type(item) is str:
+            # check if it exists in the pick list
+            if item.lower().strip() in value_list:
+                # set the final list of values to the single most common string
+                return [item]
+            else:
+                # remove all occurrences of this item from the value list
+                values = [v for v in values if v != item]
+    return values
+
+
+class FieldSlot(object):
+    __slots__ = ["index", "building_field", "table_field", "max_length", "domain"]
+
+    def __init__(self, index, building_field, table_field, max_length, domain):
+        self.index = index
+        self.building_field = building_field
+        self.table_field = table_field
+        self.max_length = max_length
+        self.domain = domain
+
+
+class OneToOnePlan(object):
+    """Building fields mapped one-to-one to the fields of the related table.
+
+    building_fields starts with the folio field, bldg_update_fields and table_update_fields map the field
+    labels to the field names, length_lookup holds the length of the string building fields and domains the
+    value lists by label.  A building field that is not a string or has no table field keeps its value.
+
+    resolve() depends only on the table values of a folio, so it can be memoized for the buildings sharing
+    the folio, see FolioMemo."""
+
+    def __init__(self, building_fields, bldg_update_fields, table_update_fields, length_lookup, domains=None):
+        self.slots = []
+        domains = compile_domains(domains)
+        for index, x in enumerate(building_fields[1:], 1):
+            label = None
+            for k, v in bldg_update_fields.items():
+                if v == x:
+                    label = k
+                    break
+            table_field = table_update_fields.get(label)
+            domain = domains.get(label)
+            self.slots.append(FieldSlot(index, x, table_field, length_lookup.get(x), domain))
+
+    def resolve(self, table_values):
+        """the value of each slot resolved from the table values of a folio, KEEP where the row keeps its value"""
+        resolved = []
+        for slot in self.slots:
+            values = table_values.get(slot.table_field)
+            if slot.max_length is None or values is None:
+                resolved.append(KEEP)
+                continue
+            if slot.domain is not None:
+                values = pick_domain_value(values, slot.domain)
+            resolved.append(concat_list(slot.max_length, values))
+        return resolved
+
+    def apply(self, row, resolved):
+        """the building row with the resolved values"""
+        new_row = [row[0]]
+        for slot, value in zip(self.slots, resolved):
+            if value is KEEP:
+                new_row.append(row[slot.index])
+            else:
+                new_row.append(value)
+        return new_row
+
+    def new_row(self, row, table_values):
+        """the building row with the values resolved from the table values of its folio"""
+        return self.apply(row, self.resolve(table_values))
@@ -0,0 +1,125 @@
+"""Validation of the rows loaded by a bulk append, and the file the rejected rows are written to.
+
+A bulk append loads the rows into a staging table and appends the staging table to the gdb table in one call,
+so a row the gdb table does not accept fails the whole append.  compile_validator() checks each row against the
+types and lengths of the gdb table first, and the rows that fail are written to a RejectFile with the reason,
+rather than passed on as a warning for each row."""
+import os
+import csv
+import datetime
+import decimal
+
+from utils.RowCleaner import text_type, binary_type
+
+try:
+    integer_types = (int, long)
+except NameError:
+    # python 3
+    integer_types = (int,)
+
+INTEGER_RANGES = {"SmallInteger": (-2 ** 15, 2 ** 15 - 1), "Integer": (-2 ** 31, 2 ** 31 - 1)}
+NUMBER_TYPES = integer_types + (float, decimal.Decimal)
+
+
+def check_value(field, value):
+    """the reason the value does not fit the field of the field_catalog, None when it fits"""
+    if value is None:
+        return None
+    kind = field["type"]
+    if kind == "String":
+        if not isinstance(value, (text_type, binary_type)):
+            return u"{} is not text".format(field["name"])
+        if field["length"] and len(value) > field["length"]:
+            return u"{} is {} characters, the field holds {}".format(field["name"], len(value), field["length"])
+    elif kind in INTEGER_RANGES:
+        try:
+            whole = not isinstance(value, bool) and isinstance(value, NUMBER_TYPES) and value == int(value)
+        except (ValueError, OverflowError):
+            # nan and infinity
+            whole = False
+        if not whole:
+            return u"{} is not a whole number".format(field["name"])
+        low, high = INTEGER_RANGES[kind]
+        if not low <= value <= high:
+            return u"{} is outside the range of a {} field".format(field["name"], kind)
+    elif kind in ("Double", "Single"):
+        if isinstance(value, bool) or not isinstance(value, NUMBER_TYPES):
+            return u"{} is not a number".format(field["name"])
+    elif kind == "Date":
+        if not isinstance(value, (datetime.datetime, datetime.date)):
+            return u"{} is not a date".format(field["name"])
+    return None
+
+
+def compile_validator(target_fields, field_names):
+    """Build validate(row) for rows of the field_names, against the field_catalog of the gdb table.
+
+    validate returns the reasons a row can not be appended joined with "; ", or None when the row fits."""
+    checks = []
+    for i, name in enumerate(field_names):
+        field = target_fields.get(name.lower())
+        if field is None or field["type"] in ("OID", "GlobalID", "GUID", "Geometry", "Blob", "Raster"):
+            continue
+        checks.append((i, field))
+
+    def validate(row):
+        reasons = []
+        for i, field in checks:
+            reason = check_value(field, row[i])
+            if reason:
+                reasons.append(reason)
+        if reasons:
+            return u"; ".join(reasons)
+        return None
+
+    return validate
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, text_type):
+        return value.encode("utf8") if text_type is not str else value
+    return "{}".format(value)
+
+
+class RejectFile(object):
+    """A csv file of the rows that were not appended, with the reason, one file per gdb table.
+
+    The file is only created when a row is rejected, and it is replaced by the next run that rejects a row."""
+
+    def __init__(self, folder, table_name, field_names):
+        self.folder = folder
+        self.path = os.path.join(folder, "{}_rejects.csv".format(table_name))
+        self.field_names = list(field_names)
+        self.count = 0
+        self.file = None
+        self.writer = None
+
+    def add(self, row, reason):
+        if self.writer is None:
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+            if text_type is str:
+                self.file = open(self.path, 'w', newline='', encoding='utf8')
+            else:
+                self.file = open(self.path, 'wb')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(["reason"] + self.field_names)
+        self.writer.writerow([csv_value(reason)] + [csv_value(x) for x in row])
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
@@ -1,34 +1,218 @@
-import os
+"""Clean a csv export with the rules compare_tables applies to the source rows, before it is imported.
+
+The columns are matched to the fields of the target schema by the header, case is ignored, and each value is
+cleaned by RowCleaner.compile_cleaner as compare_tables cleans it for that field: special characters replaced,
+strings stripped and blanked when longer than the field, empty numbers set to 0.0 and empty dates and others to
+null.  Columns that are not in the schema are written as they are read.
+
+The file is read in chunks of rows that are cleaned in a pool of processes and written in the order they were
+read, only two chunks for each process are held in memory.
+
+    python -m utils.CleanCSV weaverprmFLLGISdata.csv weaver_formatted.csv --schema weaver_schema.json
+
+The schema is a json list of [name, type, length] or the field catalog of UpdateNoiseMitSDE.field_catalog, or it
+is read from a gdb table with --table, which needs arcpy."""
+import io
+import sys
 import csv
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
 
-input_file = r"C:\Users\rhughes\Documents\ZZ_AroraDocuments\Projects\BCAD\ApplicationTesting\Noise Mitigation\weaverprmFLLGISdata.csv"
+from utils.RowCleaner import compile_cleaner, text_type
 
-output_file = r"C:\Users\rhughes\Documents\ZZ_AroraDocuments\Projects\BCAD\ApplicationTesting\Noise Mitigation\weaver_formatted.csv"
+# cleaned string values memoized for each column, as in compare_tables
+CLEAN_MEMO_SIZE = 4096
 
-csv.field_size_limit(1000)
-out = open(output_file, 'wb')
-out_writer = csv.writer(out)
+PY2 = text_type is not str
+
+# set in each process by init_cleaner
+row_cleaner = None
+
+
+def load_schema(path):
+    """the field catalog of a json schema file, keyed by the lowercase field name"""
+    with open(path, 'r') as f:
+        schema = json.loads(f.read())
+    if isinstance(schema, dict):
+        return dict([(k.lower(), v) for k, v in schema.items()])
+    catalog = {}
+    for x in schema:
+        name, kind = x[0], x[1]
+        length = x[2] if len(x) > 2 and kind == "String" else None
+        catalog[name.lower()] = {"type": kind, "name": name, "length": length}
+    return catalog
+
+
+def table_schema(table):
+    """the field catalog of a gdb table, read through arcpy"""
+    from utils.Storage import ArcPyStorage
+    catalog = {}
+    for x in ArcPyStorage().list_fields(table):
+        catalog[x.name.lower()] = {"type": x.type, "name": x.name, "length": x.length if x.type == "String" else None}
+    return catalog
+
+
+def compile_csv_cleaner(target_fields, header, memo_size=CLEAN_MEMO_SIZE):
+    """Build clean(row) for the rows of a csv with the header.
+
+    Rows shorter than the header are padded with empty values, the values past the header are kept."""
+    positions = [i for i, x in enumerate(header) if x.strip().lower() in target_fields]
+    clean = compile_cleaner(target_fields, [header[i].strip() for i in positions], memo_size)
+    width = len(header)
+
+    def clean_row(row):
+        if len(row) < width:
+            row = list(row) + [u""] * (width - len(row))
+        else:
+            row = list(row)
+        for i, value in zip(positions, clean([row[i] for i in positions])):
+            row[i] = value
+        return row
+    return clean_row
+
+
+def init_cleaner(target_fields, header, memo_size):
+    global row_cleaner
+    row_cleaner = compile_csv_cleaner(target_fields, header, memo_size)
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if PY2 and isinstance(value, text_type):
+        return value.encode("utf8")
+    if PY2:
+        return str(value)
+    return "{}".format(value)
 
-with open(input_file, 'rb') as f:
-    dialect = csv.Sniffer().sniff(f.read(1024))
-    f.seek(0)
 
-    reader = csv.reader(f, dialect)
+def clean_chunk(rows):
+    """clean a chunk of rows in a process of the pool, the rows are returned ready for csv.writer"""
+    return [[csv_value(x) for x in row_cleaner(row)] for row in rows]
+
+
+def decode_rows(reader, encoding):
+    """the rows of the reader as text, csv.reader on Python 2 returns bytes"""
+    if not PY2:
+        for row in reader:
+            yield row
+        return
     for row in reader:
-        new_row = []
-        for cell in row:
-            if len(cell) > 250:
-                # print len(cell)
-                pass
+        yield [x.decode(encoding, "replace") for x in row]
+
+
+def chunks(rows, size):
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def pooled_chunks(pool, rows, size, window):
+    """the cleaned chunks in the order they were read, with at most window chunks queued in the pool so the file
+    is not read ahead of the writer"""
+    pending = deque()
+    for chunk in chunks(rows, size):
+        pending.append(pool.apply_async(clean_chunk, (chunk,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def open_text(path, mode, encoding):
+    if PY2:
+        return open(path, mode + "b")
+    return io.open(path, mode, encoding=encoding, newline="")
+
+
+def read_csv(f, encoding):
+    """the header and the rows of an open csv file, the dialect is sniffed from the start of the file"""
+    # the notes fields of the exports are longer than the default limit of the csv module
+    csv.field_size_limit(2 ** 31 - 1)
+    sample = f.read(65536)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = decode_rows(csv.reader(f, dialect), encoding)
+    try:
+        header = next(rows)
+    except StopIteration:
+        return None, rows
+    if PY2 and header and header[0].startswith(u"\ufeff"):
+        header[0] = header[0][1:]
+    return [x.strip() for x in header], rows
+
+
+def clean_file(input_file, output_file, target_fields, processes=None, chunk_size=10000, encoding="utf-8-sig",
+               progress=None):
+    """Clean the csv input_file into output_file and return (rows, seconds).
+
+    progress is called with the rows written and the seconds so far after each chunk."""
+    start = time.time()
+    with open_text(input_file, "r", encoding) as f:
+        header, rows = read_csv(f, encoding)
+        if header is None:
+            return 0, time.time() - start
+
+        with open_text(output_file, "w", "utf8") as out:
+            writer = csv.writer(out)
+            writer.writerow([csv_value(x) for x in header])
+            n = 0
+            processes = processes or multiprocessing.cpu_count()
+            if processes <= 1:
+                init_cleaner(target_fields, header, CLEAN_MEMO_SIZE)
+                cleaned = (clean_chunk(x) for x in chunks(rows, chunk_size))
+                pool = None
+            else:
+                pool = multiprocessing.Pool(processes, init_cleaner, (target_fields, header, CLEAN_MEMO_SIZE))
+                cleaned = pooled_chunks(pool, rows, chunk_size, processes * 2)
+            try:
+                for chunk in cleaned:
+                    writer.writerows(chunk)
+                    n += len(chunk)
+                    if progress:
+                        progress(n, time.time() - start)
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+    return n, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clean a csv export with the rules of compare_tables")
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    schema = parser.add_mutually_exclusive_group(required=True)
+    schema.add_argument("--schema", help="json file of the target fields")
+    schema.add_argument("--table", help="gdb table that holds the target fields, needs arcpy")
+    parser.add_argument("--processes", type=int, help="processes that clean the chunks, the default is the cpus")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows sent to a process at a time")
+    parser.add_argument("--encoding", default="utf-8-sig", help="encoding of the input file")
+    args = parser.parse_args()
+
+    target_fields = load_schema(args.schema) if args.schema else table_schema(args.table)
+    state = {"last": 0.0}
 
-            cell = cell.strip()
-            cell = cell[:50]
-            cell = cell.replace(",", " ")
-            cell = cell.replace("/", "_")
+    def progress(rows, seconds):
+        if seconds - state["last"] >= 10:
+            state["last"] = seconds
+            sys.stderr.write("{} rows, {:.0f} rows/s\n".format(rows, rows / seconds))
 
-            new_row.append(cell)
+    rows, seconds = clean_file(args.input_file, args.output_file, target_fields, args.processes,
+                               args.chunk_size, args.encoding, progress)
+    print("{} rows were cleaned in {:.1f}s, {:.0f} rows/s :: {}".format(rows, seconds, rows / max(seconds, 1e-6),
+                                                                          args.output_file))
+    return 0
 
-        out_writer.writerow(new_row)
 
-del out_writer
-out.close()
+if __name__ == "__main__":
+    sys.exit(main())
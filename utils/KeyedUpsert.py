@@ -0,0 +1,76 @@
+"""Turn the rows to remove and the rows to add from compare_tables into keyed updates.
+
+A row that changed in the source shows up in the diff twice, as the old row to remove and the new row to add.
+Pairing those rows by a business key lets the gdb row be updated in place, keeping its OBJECTID, instead of
+being deleted and inserted again."""
+
+
+def key_indexes(match_fields, key_fields):
+    """positions of the key fields in the match_fields, the first key field is required and the others are
+    dropped when they are not matched"""
+    fields = [x.lower() for x in match_fields]
+    indexes = [fields.index(x.lower()) for x in key_fields if x.lower() in fields]
+    if not len(key_fields) or key_fields[0].lower() not in fields:
+        return []
+    return indexes
+
+
+def changed_columns(old, new):
+    return [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
+
+
+class UpsertPlan(object):
+    """updates maps an OBJECTID to (the new row, the positions of the changed columns), inserts holds the rows
+    that are new and deletes the OBJECTIDs of the rows that are gone"""
+
+    def __init__(self):
+        self.updates = {}
+        self.inserts = []
+        self.deletes = []
+
+    def __len__(self):
+        return len(self.updates) + len(self.inserts) + len(self.deletes)
+
+    def apply(self, row, object_id):
+        """the raw row with the changed columns set to their new values"""
+        new_row, changed = self.updates[object_id]
+        row = list(row)
+        for i in changed:
+            row[i] = new_row[i]
+        return row
+
+
+def plan_upsert(add_rows, rem_rows, object_ids, clean, key_index):
+    """Pair the rows to remove with the rows to add that have the same key.
+
+    add_rows are cleaned, rem_rows hold the raw values of the gdb rows and object_ids their OBJECTIDs.  When
+    several rows share a key, each removed row is paired with the added row that differs from it in the
+    fewest columns."""
+    plan = UpsertPlan()
+    groups = {}
+    for i, row in enumerate(add_rows):
+        key = tuple([row[x] for x in key_index])
+        try:
+            groups[key].append(i)
+        except KeyError:
+            groups[key] = [i]
+
+    paired = set()
+    for row, object_id in zip(rem_rows, object_ids):
+        old = clean(row)
+        key = tuple([old[x] for x in key_index])
+        candidates = groups.get(key)
+        if not candidates:
+            plan.deletes.append(object_id)
+            continue
+        best = None
+        for i in candidates:
+            changed = changed_columns(old, add_rows[i])
+            if best is None or len(changed) < len(best[1]):
+                best = (i, changed)
+        candidates.remove(best[0])
+        paired.add(best[0])
+        plan.updates[object_id] = (add_rows[best[0]], best[1])
+
+    plan.inserts = [row for i, row in enumerate(add_rows) if i not in paired]
+    return plan
@@ -0,0 +1,99 @@
+import time
+import logging
+
+logger = logging.getLogger(__package__)
+
+
+def quote(value):
+    return u"'{}'".format(u"{}".format(value).replace(u"'", u"''"))
+
+
+class ChunkedQuery(object):
+    """Select the rows of a table whose key field is in a set of values.
+
+    A single IN clause holding thousands of folios is planned badly by SQL Server and can reach the statement
+    length limit, so the values are split into IN clauses of chunk_size and one cursor is opened for each
+    chunk.  Above scan_threshold values the table is read once without a where clause and the rows are
+    matched against a hashed set of the values instead, the client side form of a join against a temp table.
+
+    rows() yields (cursor, row) pairs so an UpdateCursor can update or delete the current row."""
+
+    def __init__(self, field, values, chunk_size=500, scan_threshold=20000, quoted=True):
+        self.field = field
+        self.values = sorted(set([x for x in values if x is not None]))
+        self.chunk_size = max(int(chunk_size), 1)
+        self.quoted = quoted
+        if len(self.values) > scan_threshold:
+            self.strategy = "scan"
+        else:
+            self.strategy = "chunks"
+        # (values in the chunk, rows read, seconds) for each cursor opened by the last call to rows()
+        self.timings = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def chunks(self):
+        for i in range(0, len(self.values), self.chunk_size):
+            yield self.values[i:i + self.chunk_size]
+
+    def clause(self, values):
+        if self.quoted:
+            items = u",".join([quote(x) for x in values])
+        else:
+            items = u",".join([u"{}".format(x) for x in values])
+        return u"{} in ({})".format(self.field, items)
+
+    def clauses(self):
+        """the where clause for each chunk"""
+        for chunk in self.chunks():
+            yield self.clause(chunk)
+
+    def rows(self, cursor_type, table, fields, key_index=None):
+        """yield (cursor, row) for the rows selected by the values, key_index is the position of the key field
+        in fields and is needed to match the rows when the table is scanned"""
+        self.timings = []
+        if not len(self.values):
+            return
+        if self.strategy == "scan" and key_index is not None:
+            lookup = set(self.values)
+            start = time.time()
+            n = 0
+            with cursor_type(table, fields) as cursor:
+                for row in cursor:
+                    if row[key_index] in lookup:
+                        n += 1
+                        yield cursor, row
+            self.timings.append((len(self.values), n, time.time() - start))
+        else:
+            for chunk in self.chunks():
+                start = time.time()
+                n = 0
+                with cursor_type(table, fields, self.clause(chunk)) as cursor:
+                    for row in cursor:
+                        n += 1
+                        yield cursor, row
+                self.timings.append((len(chunk), n, time.time() - start))
+                logger.debug("{} :: chunk of {} values, {} rows in {:.3f}s".format(self.field, len(chunk), n,
+                                                                                  self.timings[-1][2]))
+
+    def report(self):
+        """one line summary of the cursors opened by rows()"""
+        if not self.timings:
+            return u"{} :: no rows were selected".format(self.field)
+        rows = sum([x[1] for x in self.timings])
+        seconds = sum([x[2] for x in self.timings])
+        slowest = max([x[2] for x in self.timings])
+        return u"{} :: {} values, {} cursor(s) by {}, {} rows in {:.2f}s, slowest cursor {:.2f}s".format(
+            self.field, len(self.values), len(self.timings), self.strategy, rows, seconds, slowest)
+
+
+class QueryPlanner(object):
+    """Holds the chunk size and scan threshold and builds a ChunkedQuery for each set of values"""
+
+    def __init__(self, chunk_size=500, scan_threshold=20000):
+        self.chunk_size = chunk_size
+        self.scan_threshold = scan_threshold
+
+    def query(self, field, values, quoted=True):
+        return ChunkedQuery(field, values, self.chunk_size, self.scan_threshold, quoted)
@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+from logging.handlers import RotatingFileHandler
+
+# every event counted by a Reporter is written to this logger, configure_log adds the rotating log file
+report_logger = logging.getLogger("{}.report".format(__package__))
+
+REPORT_LOG = "NoiseMit_report.log"
+
+
+def configure_log(folder, max_bytes=5 * 1024 * 1024, backups=5, samples=None, interval=None, name=REPORT_LOG):
+    """write the report log to a rotating file in the folder, and set the defaults of the Reporter
+
+    The file of an earlier call with another name is closed, so the tools run in turn by one process each write
+    only their own report log."""
+    if samples is not None:
+        Reporter.samples = samples
+    if interval is not None:
+        Reporter.interval = interval
+    path = os.path.abspath(os.path.join(folder, name))
+    for x in list(report_logger.handlers):
+        if getattr(x, "baseFilename", None) == path:
+            return x
+        if isinstance(x, RotatingFileHandler):
+            report_logger.removeHandler(x)
+            x.close()
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    report_logger.addHandler(handler)
+    report_logger.setLevel(logging.DEBUG)
+    # the row level detail is kept out of the logs of the scheduled task
+    report_logger.propagate = False
+    return handler
+
+
+class Reporter(object):
+    """Counts the events of a loop over rows and limits what reaches the geoprocessing messages.
+
+    Each event is written to the report log.  Only the first `samples` events of a category are passed on to the
+    message or warning function, the rest are counted and listed by summary().  progress() passes on a line at
+    most once every `interval` seconds."""
+
+    samples = 5
+    interval = 30.0
+
+    def __init__(self, name, message, warning, samples=None, interval=None):
+        self.name = name
+        self.message = message
+        self.warning = warning
+        if samples is not None:
+            self.samples = samples
+        if interval is not None:
+            self.interval = interval
+        self.counts = {}
+        self.categories = []
+        self.start = time.time()
+        self.last = self.start
+
+    def count(self, category, n=1):
+        """add to the count of a category without writing an event"""
+        try:
+            self.counts[category] += n
+        except KeyError:
+            self.counts[category] = n
+            self.categories.append(category)
+        return self.counts[category]
+
+    def info(self, category, text):
+        self.event(category, text, logging.INFO, self.message)
+
+    def warn(self, category, text):
+        self.event(category, text, logging.WARNING, self.warning)
+
+    def event(self, category, text, level, send):
+        n = self.count(category)
+        report_logger.log(level, u"{} :: {} :: {}".format(self.name, category, text))
+        if n <= self.samples:
+            send(text)
+        elif n == self.samples + 1:
+            send(u"{} :: more '{}' messages are written to the report log".format(self.name, category))
+
+    def progress(self, rows):
+        """pass on the number of rows done, at most once per interval"""
+        now = time.time()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.message(u"{} :: {} rows in {:.0f}s".format(self.name, rows, now - self.start))
+
+    def summary(self):
+        """pass on the count of each category"""
+        for category in self.categories:
+            text = u"{} :: {} {}".format(self.name, self.counts[category], category)
+            report_logger.info(text)
+            self.message(text)
+        return dict(self.counts)
@@ -0,0 +1,119 @@
+import datetime
+
+try:
+    text_type = unicode
+    binary_type = str
+except NameError:
+    # python 3
+    text_type = str
+    binary_type = bytes
+
+# characters that are replaced with a dash in string values
+SPECIAL_CHARACTERS = [u"!", u"@", u"#", u"$", u"%", u"^", u"&", u"*", u","]
+TRANSLATE_TABLE = dict([(ord(x), u"-") for x in SPECIAL_CHARACTERS])
+
+
+class ValueMemo(object):
+    """Bounded memo of cleaned string values.
+
+    Values are kept in two generations, when the newer one is full the older one is dropped, so the values that
+    have not been used recently are the first to go.  This is cheaper per lookup than moving keys in an
+    OrderedDict, and phase and project names repeat on most rows."""
+
+    def __init__(self, size):
+        self.size = size
+        self.current = {}
+        self.previous = {}
+
+    def get(self, value, clean):
+        try:
+            return self.current[value]
+        except KeyError:
+            pass
+        try:
+            result = self.previous[value]
+        except KeyError:
+            result = clean(value)
+        if len(self.current) >= self.size:
+            self.previous = self.current
+            self.current = {}
+        self.current[value] = result
+        return result
+
+
+def string_cleaner(length):
+    """strip and replace the special characters, blank strings longer than the target field"""
+    def clean_text(_x):
+        _x = _x.translate(TRANSLATE_TABLE).strip()
+        if length is None or len(_x) > length:
+            _x = u""
+        return _x
+
+    def clean(_x):
+        if type(_x) is binary_type:
+            _x = clean_text(text_type(_x.strip(), encoding="utf8"))
+        elif type(_x) is text_type:
+            _x = clean_text(_x)
+        elif type(_x) is datetime.datetime:
+            _x = u"{}".format(_x.date())
+        if not _x:
+            _x = u""
+        return _x
+    return clean
+
+
+def memo_cleaner(clean, memo):
+    """look up string values in the memo, other values are cleaned every time"""
+    def clean_value(_x):
+        if type(_x) is text_type or type(_x) is binary_type:
+            return memo.get(_x, clean)
+        return clean(_x)
+    return clean_value
+
+
+def clean_date(_x):
+    if type(_x) is datetime.datetime:
+        _x = _x.date()
+    if not _x:
+        _x = None
+    return _x
+
+
+def clean_double(_x):
+    if not _x:
+        _x = 0.0
+    return _x
+
+
+def clean_other(_x):
+    if not _x:
+        _x = None
+    return _x
+
+
+def column_cleaner(field, memo_size=0):
+    """return the function that cleans the values of one column for the target field"""
+    if field["type"] == "String":
+        clean = string_cleaner(field["length"])
+        if memo_size:
+            # each column has its own memo because the cleaned value depends on the field length
+            clean = memo_cleaner(clean, ValueMemo(memo_size))
+        return clean
+    elif field["type"] == "Date":
+        return clean_date
+    elif field["type"] == "Double":
+        return clean_double
+    return clean_other
+
+
+def compile_cleaner(target_fields, field_names, memo_size=0):
+    """Build the row cleaner for a target schema.
+
+    The target field catalog is looked up once for each column instead of once for each value, and the row
+    cleaner only applies the list of column functions.  With a memo_size, up to that many cleaned string values
+    are memoized for each column.  The output is the same as UpdateNoiseMitSDE.clean_row."""
+    cleaners = [column_cleaner(target_fields[x.lower()], memo_size) for x in field_names]
+
+    def clean(_row):
+        return [f(_x) for f, _x in zip(cleaners, _row)]
+    return clean
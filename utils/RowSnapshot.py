@@ -0,0 +1,103 @@
+import os
+import json
+import random
+import hashlib
+import logging
+from collections import Counter
+
+from utils.SortedMergeDiff import value_key
+
+logger = logging.getLogger(__package__)
+
+
+def fingerprint(row):
+    """short digest of a cleaned row, numbers are compared as floats the same way they are matched in the diff"""
+    data = json.dumps([value_key(v) for v in row])
+    return hashlib.md5(data.encode("utf8")).hexdigest()[:16]
+
+
+def folio_key(folio):
+    if folio is None:
+        return u""
+    return u"{}".format(folio)
+
+
+class RowSnapshot(object):
+    """Fingerprints of the rows in a gdb table, grouped by folio number and stored in a json file.
+
+    The fingerprints of the cleaned source rows are recorded while compare_tables reads the source.  Once the
+    edits are posted the gdb table holds exactly those rows, so commit() saves them as the snapshot that the
+    next run diffs against instead of reading the whole gdb table."""
+
+    def __init__(self, folder, table_name, sample_size=25):
+        self.folder = folder
+        self.path = os.path.join(folder, "{}.json".format(table_name))
+        self.sample_size = sample_size
+        self.match_fields = None
+        self.count = 0
+        self.folios = {}
+        self.pending = {}
+        self.pending_count = 0
+
+    def load(self, match_fields):
+        """read the snapshot from disk, returns False if there is none or it was taken with other match fields"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.loads(f.read())
+        except ValueError as e:
+            logger.warning("unable to read the row snapshot {} :: {}".format(self.path, e))
+            return False
+        if data["match_fields"] != list(match_fields):
+            return False
+        self.match_fields = data["match_fields"]
+        self.count = data["count"]
+        self.folios = data["folios"]
+        return True
+
+    def sample(self):
+        """a repeatable sample of the folios in the snapshot used to validate it against the gdb table"""
+        keys = sorted([x for x in self.folios.keys() if x])
+        rand = random.Random(self.count)
+        return rand.sample(keys, min(self.sample_size, len(keys)))
+
+    def fingerprints(self, folios=None):
+        """Counter of the fingerprints in the snapshot, for all folios or only the folios given"""
+        if folios is None:
+            folios = self.folios.keys()
+        result = Counter()
+        for x in folios:
+            result.update(self.folios.get(x, []))
+        return result
+
+    def record(self, folio, row_fingerprint):
+        """record a cleaned source row for the snapshot saved by commit()"""
+        try:
+            self.pending[folio_key(folio)].append(row_fingerprint)
+        except KeyError:
+            self.pending[folio_key(folio)] = [row_fingerprint]
+        self.pending_count += 1
+
+    def commit(self, match_fields):
+        """save the recorded source rows as the snapshot, call this once the edits have been posted"""
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        data = {
+            "match_fields": list(match_fields),
+            "count": self.pending_count,
+            "folios": self.pending
+        }
+        temp = "{}.tmp".format(self.path)
+        with open(temp, 'w') as f:
+            f.write(json.dumps(data, separators=(",", ":")))
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp, self.path)
+        logger.info("row snapshot saved :: {} rows in {}".format(self.pending_count, self.path))
+        return True
+
+    def discard(self):
+        """remove the snapshot so the next run reads the whole gdb table"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,217 @@
+import os
+import json
+import hashlib
+import logging
+import datetime
+
+from utils.SortedMergeDiff import value_key
+
+logger = logging.getLogger(__package__)
+
+DIGEST_MODULUS = 2 ** 128
+
+
+class RunMetadata(object):
+    """Values kept between the runs of a tool, stored in a small json file for each gdb table"""
+
+    def __init__(self, folder, table_name):
+        self.folder = folder
+        self.path = os.path.join(folder, "{}.json".format(table_name))
+        self.values = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.values = json.loads(f.read())
+            except ValueError as e:
+                logger.warning("unable to read the run metadata {} :: {}".format(self.path, e))
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def update(self, **values):
+        self.values.update(values)
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        temp = "{}.tmp".format(self.path)
+        with open(temp, 'w') as f:
+            f.write(json.dumps(self.values, indent=2, sort_keys=True))
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp, self.path)
+
+    def record_scan(self, **values):
+        """store the time of this run as the last scanned date along with any other values"""
+        values["last_scanned"] = datetime.datetime.now().isoformat()
+        self.update(**values)
+
+
+class SourceDigest(object):
+    """Digest of the cleaned source rows that does not depend on the order the rows are read in.
+
+    The md5 of each row is added to a running total, so the rows are never held in memory.  The digest also
+    covers the count of rows and the matched field names, to catch a schema change."""
+
+    def __init__(self, previous=None):
+        self.previous = previous
+        self.fields = []
+        self.count = 0
+        self.total = 0
+
+    def update(self, row):
+        data = json.dumps([value_key(v) for v in row])
+        self.total = (self.total + int(hashlib.md5(data.encode("utf8")).hexdigest(), 16)) % DIGEST_MODULUS
+        self.count += 1
+
+    def hexdigest(self):
+        fields = hashlib.md5(json.dumps(list(self.fields)).encode("utf8")).hexdigest()[:8]
+        return "{}-{}-{:032x}".format(fields, self.count, self.total)
+
+    def unchanged(self):
+        """True when the source rows are the same as those digested on the last successful run"""
+        return self.previous is not None and self.previous == self.hexdigest()
+
+
+class FolioDigests(object):
+    """Digest of the building values resolved for each folio, from the last successful run.
+
+    The buildings of a folio whose digest has not changed already hold its values and are not opened.  The
+    digests are only saved by commit(), once the edits are posted, and not for the folios passed to failed().
+    They are dropped when the fields they were taken over change."""
+
+    def __init__(self, folder, name):
+        self.folder = folder
+        self.path = os.path.join(folder, "{}_folios.json".format(name))
+        self.fields = None
+        self.digests = {}
+        self.pending = {}
+
+    def load(self, fields):
+        self.fields = list(fields)
+        self.digests = {}
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                data = json.loads(f.read())
+        except ValueError as e:
+            logger.warning("unable to read the folio digests {} :: {}".format(self.path, e))
+            return False
+        if data["fields"] != self.fields:
+            return False
+        self.digests = data["digests"]
+        return True
+
+    def changed(self, folio, values):
+        """True when the values resolved for the folio differ from the last successful run"""
+        data = json.dumps([value_key(v) for v in values])
+        digest = hashlib.md5(data.encode("utf8")).hexdigest()[:16]
+        key = u"{}".format(folio)
+        self.pending[key] = digest
+        return self.digests.get(key) != digest
+
+    def failed(self, folio):
+        """drop the digest of a folio whose buildings were not all updated, so the next run opens them again"""
+        self.pending.pop(u"{}".format(folio), None)
+        self.digests.pop(u"{}".format(folio), None)
+
+    def commit(self):
+        """save the digests of this run, call this once the edits have been posted"""
+        if self.fields is None or not len(self.pending):
+            return False
+        self.digests.update(self.pending)
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        temp = "{}.tmp".format(self.path)
+        with open(temp, 'w') as f:
+            f.write(json.dumps({"fields": self.fields, "digests": self.digests}, separators=(",", ":")))
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp, self.path)
+        self.pending = {}
+        return True
+
+
+def parse_timestamp(text):
+    if not text:
+        return None
+    for x in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(text, x)
+        except ValueError:
+            pass
+    logger.warning("unable to read the timestamp {}".format(text))
+    return None
+
+
+class ChangeWatermark(object):
+    """The latest edit time of the source rows read by the last successful run, the high watermark of the changes
+    already in the gdb table.
+
+    With a watermark compare_tables only reads the rows that share a key with the source rows edited since the
+    last run.  The edit time is the first of timestamp_fields that is a date field of the source, the key is the
+    first of key_fields that is a match field.  The rows edited at the watermark itself are read again, so a row
+    saved late in the same second is not missed.  A deleted row leaves no timestamp behind, so every
+    reconcile_hours the key field alone is read from both tables and the keys found in only one of them are
+    diffed as well.  The watermark is dropped when the timestamp field or the match fields change, and the whole
+    source is read again.  values() is saved in the run metadata once the edits are posted."""
+
+    def __init__(self, previous=None, reconcile_hours=24, timestamp_fields=("last_edited_date", "DateStamp"),
+                 key_fields=("FolioNumber", "AGREEMENT_NUMBER")):
+        self.previous = previous or {}
+        self.reconcile_hours = reconcile_hours
+        self.timestamp_fields = list(timestamp_fields)
+        self.key_fields = list(key_fields)
+        self.started = datetime.datetime.now()
+        self.field = None
+        self.fields = None
+        self.latest = None
+        # set by compare_tables when only the changed rows were read, and when the folio numbers were compared
+        self.incremental = False
+        self.reconciled = False
+
+    def find_field(self, source_fields):
+        """the name of the timestamp field in the field catalog of the source, None when it has none"""
+        self.field = None
+        for x in self.timestamp_fields:
+            field = source_fields.get(x.lower())
+            if field is not None and field["type"] == "Date":
+                self.field = field["name"]
+                break
+        return self.field
+
+    def find_key(self, match_fields):
+        """the position of the key field in the match fields, None when it has none"""
+        for x in self.key_fields:
+            if x.lower() in match_fields:
+                return match_fields.index(x.lower())
+        return None
+
+    def since(self, fields):
+        """the watermark of the last run, None when it was taken on another timestamp field or match fields"""
+        self.fields = sorted(fields)
+        if self.previous.get("field") != self.field or self.previous.get("fields") != self.fields:
+            return None
+        return parse_timestamp(self.previous.get("watermark"))
+
+    def reconcile_due(self):
+        reconciled = parse_timestamp(self.previous.get("reconciled"))
+        return reconciled is None or self.started - reconciled >= datetime.timedelta(hours=self.reconcile_hours)
+
+    def observe(self, value):
+        if isinstance(value, datetime.datetime) and (self.latest is None or value > self.latest):
+            self.latest = value
+
+    def values(self):
+        """the watermark and the time of the last full compare or key reconcile, None without a timestamp field"""
+        if self.field is None:
+            return None
+        watermark = self.latest
+        reconciled = self.started.isoformat()
+        if self.incremental:
+            previous = parse_timestamp(self.previous.get("watermark"))
+            if watermark is None or (previous is not None and previous > watermark):
+                watermark = previous
+            if not self.reconciled:
+                reconciled = self.previous.get("reconciled")
+        return {"field": self.field, "fields": self.fields, "reconciled": reconciled,
+                "watermark": watermark.isoformat() if watermark else None}
@@ -0,0 +1,228 @@
+"""Timing spans for the phases of a tool run, kept in a JSON lines history file.
+
+Each span records the wall time of a phase, the rows it handled and the peak resident set size of the process
+when the phase ended.  The peak only grows over a run, so the phase where it jumps is the one that used the
+memory.
+
+    python -m utils.RunMetrics --history metadata/run_metrics.jsonl --window 10
+
+compares the latest run of each tool and table with the median of the runs before it."""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+from contextlib import contextmanager
+
+logger = logging.getLogger(__package__)
+
+METRICS_HISTORY = "run_metrics.jsonl"
+
+
+def peak_rss():
+    """the peak resident set size of the process in MB, None where it can not be read"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        if sys.platform == "darwin":
+            return round(peak / 1048576.0, 1)
+        return round(peak / 1024.0, 1)
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        psapi = ctypes.windll.psapi
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters),
+                                               wintypes.DWORD]
+        if psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return round(counters.PeakWorkingSetSize / 1048576.0, 1)
+    except (ImportError, AttributeError, OSError, ValueError):
+        pass
+    return None
+
+
+class Span(object):
+    """one timed phase of a run, set rows to the number of rows the phase handled"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.seconds = None
+        self.peak_rss_mb = None
+        self.error = False
+
+    def as_dict(self):
+        values = {"name": self.name, "seconds": self.seconds, "rows": self.rows, "peak_rss_mb": self.peak_rss_mb}
+        if self.error:
+            values["error"] = True
+        return values
+
+
+class RunMetrics(object):
+    """The spans of one tool run.
+
+        with metrics.span("insert") as span:
+            span.rows = updater.insert_rows()
+
+    A span that raises is recorded with error set and the exception is raised again.  save() appends the run
+    to the history file as one line of JSON."""
+
+    def __init__(self, tool=None, table=None):
+        self.tool = tool
+        self.table = table
+        self.started = datetime.datetime.now()
+        self.start = time.time()
+        self.spans = []
+        self.result = None
+
+    @contextmanager
+    def span(self, name):
+        span = Span(name)
+        start = time.time()
+        try:
+            yield span
+        except BaseException:
+            span.error = True
+            raise
+        finally:
+            span.seconds = round(time.time() - start, 3)
+            span.peak_rss_mb = peak_rss()
+            self.spans.append(span)
+            logger.debug("{} :: {}s, {} rows, peak rss {} MB".format(name, span.seconds, span.rows,
+                                                                     span.peak_rss_mb))
+
+    def record(self):
+        return {
+            "tool": self.tool,
+            "table": self.table,
+            "started": self.started.isoformat(),
+            "seconds": round(time.time() - self.start, 3),
+            "result": self.result,
+            "peak_rss_mb": peak_rss(),
+            "spans": [x.as_dict() for x in self.spans]
+        }
+
+    def save(self, folder, name=METRICS_HISTORY):
+        """append the run to the history file in the folder, return the record"""
+        record = self.record()
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, name), 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+        return record
+
+
+def load_history(path):
+    """the records of the history file in the order they were written, lines that do not parse are skipped"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                logger.warning("skipped a line of the metrics history {} :: {}".format(path, e))
+    return records
+
+
+def median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def phase_totals(record):
+    """the seconds of each phase of a run, the spans of a phase that ran more than once are added"""
+    totals = {}
+    for x in record["spans"]:
+        totals[x["name"]] = totals.get(x["name"], 0.0) + (x["seconds"] or 0.0)
+    totals["total"] = record["seconds"]
+    return totals
+
+
+def compare_latest(records, window=10, threshold=1.5, min_seconds=1.0):
+    """Compare the latest record of each tool and table with the median of up to window records before it.
+
+    Returns a dict keyed by (tool, table) of rows (phase, latest seconds, median seconds, ratio, regressed).
+    A phase regressed when it took more than threshold times the median and at least min_seconds longer."""
+    runs = {}
+    for record in records:
+        runs.setdefault((record.get("tool"), record.get("table")), []).append(record)
+    result = {}
+    for key, items in runs.items():
+        latest = phase_totals(items[-1])
+        previous = [phase_totals(x) for x in items[:-1][-window:]]
+        rows = []
+        for phase in sorted(latest.keys()):
+            past = median([x[phase] for x in previous if phase in x])
+            ratio = None
+            regressed = False
+            if past:
+                ratio = latest[phase] / past
+                regressed = ratio > threshold and latest[phase] - past >= min_seconds
+            rows.append((phase, latest[phase], past, ratio, regressed))
+        result[key] = rows
+    return result
+
+
+def format_report(comparison):
+    lines = []
+    for (tool, table) in sorted(comparison.keys(), key=lambda x: ("{}".format(x[0]), "{}".format(x[1]))):
+        lines.append("{} :: {}".format(tool, table))
+        lines.append("  {:<28} {:>10} {:>10} {:>7}".format("phase", "latest s", "median s", "ratio"))
+        for phase, latest, past, ratio, regressed in comparison[(tool, table)]:
+            lines.append("  {:<28} {:>10.2f} {:>10} {:>7} {}".format(
+                phase, latest, "-" if past is None else "{:.2f}".format(past),
+                "-" if ratio is None else "{:.2f}".format(ratio), "SLOWER" if regressed else ""))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the latest tool run with the rolling median")
+    parser.add_argument("--history", default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "metadata", METRICS_HISTORY))
+    parser.add_argument("--window", type=int, default=10, help="number of earlier runs in the median")
+    parser.add_argument("--threshold", type=float, default=1.5, help="ratio to the median that is a regression")
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="smallest slowdown that is a regression")
+    args = parser.parse_args()
+
+    records = load_history(args.history)
+    if not records:
+        print("No runs were found in {}".format(args.history))
+        return 0
+    comparison = compare_latest(records, args.window, args.threshold, args.min_seconds)
+    print(format_report(comparison))
+    regressed = [x[0] for rows in comparison.values() for x in rows if x[4]]
+    if regressed:
+        print("These phases are slower than the median :: {}".format(sorted(set(regressed))))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
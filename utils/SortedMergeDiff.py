@@ -0,0 +1,194 @@
+import os
+import sys
+import heapq
+import shutil
+import logging
+import datetime
+import tempfile
+from numbers import Number
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+logger = logging.getLogger(__package__)
+
+# the size of a row in memory is estimated from its values, this covers the sort key built for each row
+ROW_OVERHEAD = 3
+
+
+def value_key(value):
+    """return a key for a single value that sorts the same way in python 2 and 3, and keeps None, numbers,
+    dates and strings apart"""
+    if value is None:
+        return 0, u""
+    if isinstance(value, Number):
+        return 1, float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return 3, value.isoformat()
+    return 2, value
+
+
+def row_key(row, folio_index):
+    """rows are sorted by their folio number first so the merged output is grouped by folio"""
+    if folio_index is None:
+        folio = None
+    else:
+        folio = row[folio_index]
+    return value_key(folio), tuple([value_key(v) for v in row])
+
+
+def row_size(row):
+    return ROW_OVERHEAD * (sys.getsizeof(row) + sum([sys.getsizeof(v) for v in row]))
+
+
+def read_records(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                break
+
+
+class DiffStream(object):
+    """rows written to a file by SortedMergeDiff.  The stream has a length and can be iterated more than once,
+    so it can be passed to GDBTableUpdater in place of the add_rows or exist_rows list"""
+
+    def __init__(self, path, count):
+        self.path = path
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return read_records(self.path)
+
+    def batches(self, size):
+        """yield lists of at most size rows"""
+        batch = []
+        for row in self:
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        folder = os.path.dirname(self.path)
+        if os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+
+
+class SortedRuns(object):
+    """hold records in memory up to the memory budget, then sort them and spill them to a file on disk"""
+
+    def __init__(self, folder, prefix, folio_index, memory_budget):
+        self.folder = folder
+        self.prefix = prefix
+        self.folio_index = folio_index
+        self.memory_budget = memory_budget
+        self.records = []
+        self.size = 0
+        self.runs = []
+        self.count = 0
+
+    def add(self, key_row, payload):
+        self.records.append((row_key(key_row, self.folio_index), self.count, payload))
+        self.count += 1
+        self.size += row_size(key_row)
+        if self.size >= self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        if not self.records:
+            return
+        self.records.sort()
+        path = os.path.join(self.folder, "{}_{}.run".format(self.prefix, len(self.runs)))
+        with open(path, 'wb') as f:
+            for record in self.records:
+                pickle.dump(record, f, 2)
+        self.runs.append(path)
+        self.records = []
+        self.size = 0
+
+    def merged(self):
+        """k-way merge of the sorted runs on disk, the sequence number breaks ties so rows are never compared"""
+        self.spill()
+        return heapq.merge(*[read_records(x) for x in self.runs])
+
+    def remove(self):
+        for x in self.runs:
+            if os.path.exists(x):
+                os.remove(x)
+        self.runs = []
+
+
+class SortedMergeDiff(object):
+    """Diff the source and target tables without holding either of them in memory.
+
+    The cleaned source rows and the target rows are spilled to sorted runs keyed by folio number and row values.
+    A k-way merge of each side is then walked in step, a source row with no partner in the target is written to
+    the add stream and a target row with no partner in the source to the remove stream.  Duplicate rows are
+    matched one for one.  Memory is bounded by memory_budget (bytes) for each side."""
+
+    def __init__(self, folio_index=None, memory_budget=64 * 1024 * 1024, folder=None):
+        self.folio_index = folio_index
+        self.memory_budget = memory_budget
+        self.folder = tempfile.mkdtemp(prefix="noisemit_diff_", dir=folder)
+        self.source = SortedRuns(self.folder, "source", folio_index, memory_budget)
+        self.target = SortedRuns(self.folder, "target", folio_index, memory_budget)
+
+    def add_source(self, row):
+        """add a cleaned row from the source table"""
+        self.source.add(row, row)
+
+    def add_target(self, cleaned_row, row):
+        """add a row from the gdb table, the cleaned row is matched and the raw row is kept for the delete"""
+        self.target.add(cleaned_row, list(row))
+
+    def merge(self):
+        """generator of ("add", row) and ("rem", row) records in folio order"""
+        sentinel = object()
+        source = self.source.merged()
+        target = self.target.merged()
+        s = next(source, sentinel)
+        t = next(target, sentinel)
+        while s is not sentinel or t is not sentinel:
+            if t is sentinel or (s is not sentinel and s[0] < t[0]):
+                yield "add", s[2]
+                s = next(source, sentinel)
+            elif s is sentinel or t[0] < s[0]:
+                yield "rem", t[2]
+                t = next(target, sentinel)
+            else:
+                # identical rows in both tables
+                s = next(source, sentinel)
+                t = next(target, sentinel)
+
+    def run(self):
+        """write the merge to an add stream and a remove stream, returns the two DiffStream objects"""
+        add_path = os.path.join(self.folder, "add_rows.rows")
+        rem_path = os.path.join(self.folder, "rem_rows.rows")
+        n_add, n_rem = 0, 0
+        with open(add_path, 'wb') as add_file:
+            with open(rem_path, 'wb') as rem_file:
+                for action, row in self.merge():
+                    if action == "add":
+                        pickle.dump(row, add_file, 2)
+                        n_add += 1
+                    else:
+                        pickle.dump(row, rem_file, 2)
+                        n_rem += 1
+        self.source.remove()
+        self.target.remove()
+        logger.info("sorted merge diff :: {} rows to add, {} rows to remove".format(n_add, n_rem))
+        return DiffStream(add_path, n_add), DiffStream(rem_path, n_rem)
+
+    def remove(self):
+        """remove the runs and streams written by this diff"""
+        shutil.rmtree(self.folder, ignore_errors=True)
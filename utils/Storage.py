@@ -0,0 +1,578 @@
+"""The tables read and written by compare_tables, GDBTableUpdater and BuildingsUpdater.
+
+A storage gives the cursors, the field catalog, the row count, the OBJECTID field and the edit session of its
+tables.  ArcPyStorage is the geodatabase through arcpy.da, the behaviour of the tools.  SQLiteStorage keeps the
+tables in a SQLite file with an index on the folio fields, to stage tables and diff them on a machine without
+ArcGIS, and to profile the updaters against a real database engine.
+
+    storage = SQLiteStorage("staging.sqlite")
+    storage.copy_table(ArcPyStorage(), sql_table)
+    storage.copy_table(ArcPyStorage(), gdb_table)
+    result = UpdateNoiseMitSDE.compare_tables(sql_table, gdb_table, storage=storage)
+
+The cursors take the same field names as arcpy.da, including "OID@" and "*", and the where clauses the tools
+build, "field in (...)" and "field = 'x'", are plain SQL.
+
+CSVStorage reads a csv export as a source table, so compare_tables can diff it against the gdb table without
+importing it first."""
+import os
+import re
+import sqlite3
+import datetime
+import fnmatch
+
+from utils.CleanCSV import open_text, read_csv
+
+# the fields that are indexed when a table is created in SQLite
+FOLIO_FIELDS = ["folionumber", "folioid"]
+
+# rows read by each query of an update cursor on a SQLite table
+PAGE_SIZE = 1000
+
+SQLITE_TYPES = {"String": "TEXT", "Date": "TEXT", "Double": "REAL", "Single": "REAL", "Integer": "INTEGER",
+                "SmallInteger": "INTEGER", "OID": "INTEGER", "GUID": "TEXT", "GlobalID": "TEXT"}
+
+
+class ArcPyStorage(object):
+    """the tables of a geodatabase through arcpy, arcpy is imported when the storage is created"""
+
+    def __init__(self):
+        import arcpy
+        self.arcpy = arcpy
+        self.da = arcpy.da
+
+    def exists(self, table):
+        """set the workspace to the folder of the table and check that the table exists in it"""
+        self.arcpy.env.workspace = "\\".join(table.split("\\")[:-1])
+        return self.arcpy.Exists(table.split("\\")[-1])
+
+    def list_fields(self, table, wild_card=None):
+        if wild_card is None:
+            return self.arcpy.ListFields(table)
+        return self.arcpy.ListFields(table, wild_card)
+
+    def count(self, table):
+        return int(self.arcpy.GetCount_management(table).getOutput(0))
+
+    def oid_field(self, table):
+        return self.arcpy.Describe(table).OIDFieldName
+
+    def date_literal(self, table, value):
+        """the datetime as a date in a where clause on the table, a file geodatabase needs the date keyword.  The
+        fraction of a second is dropped"""
+        text = value.replace(microsecond=0).isoformat(" ")
+        if ".gdb" in table.lower():
+            return u"date '{}'".format(text)
+        return u"'{}'".format(text)
+
+    def search_cursor(self, table, fields, where_clause=None):
+        return self.da.SearchCursor(table, fields, where_clause)
+
+    def update_cursor(self, table, fields, where_clause=None):
+        return self.da.UpdateCursor(table, fields, where_clause)
+
+    def insert_cursor(self, table, fields):
+        return self.da.InsertCursor(table, fields)
+
+    def bulk_insert(self, table, fields, rows, staging="in_memory"):
+        """Insert the rows into a staging table with the schema of the table, and append the staging table to
+        the table in one call.  Returns the number of rows.
+
+        The staging table is in the staging workspace, in_memory by default, and is deleted afterwards."""
+        name = "{}_staging".format(table.split("\\")[-1].split(".")[-1])
+        staged = self.arcpy.CreateTable_management(staging, name, table).getOutput(0)
+        try:
+            n = 0
+            with self.da.InsertCursor(staged, fields) as cursor:
+                for row in rows:
+                    cursor.insertRow(row)
+                    n += 1
+            if n:
+                self.arcpy.Append_management(staged, table, "NO_TEST")
+            return n
+        finally:
+            self.arcpy.Delete_management(staged)
+
+    def editor(self, workspace):
+        return self.da.Editor(workspace)
+
+
+class StorageField(object):
+    """the name, type and length of a field, with the attributes of an arcpy Field that the tools read"""
+
+    def __init__(self, name, type, length=None):
+        self.name = name
+        self.baseName = name
+        self.type = type
+        self.length = length
+
+
+def table_name(table):
+    """the name of the table in SQLite, the last part of a geodatabase path without the owner"""
+    return table.split("\\")[-1].split("/")[-1].split(".")[-1]
+
+
+def quote_name(name):
+    return u'"{}"'.format(name.replace(u'"', u'""'))
+
+
+def date_text(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def text_date(value):
+    """the datetime of a date stored as text, arcpy returns a datetime for the dates of a table"""
+    if not value:
+        return None
+    # the text is sliced rather than parsed with strptime, which is several times slower per value
+    try:
+        if len(value) == 10:
+            return datetime.datetime(int(value[:4]), int(value[5:7]), int(value[8:10]))
+        if len(value) in (19, 26):
+            return datetime.datetime(int(value[:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]),
+                                     int(value[14:16]), int(value[17:19]), int(value[20:26] or 0))
+    except ValueError:
+        pass
+    return value
+
+
+class SQLiteCursor(object):
+    """search cursor on a SQLite table, the rows are tuples as from arcpy.da.SearchCursor"""
+
+    def __init__(self, storage, table, fields, where_clause=None):
+        self.storage = storage
+        self.name = table_name(table)
+        self.fields = storage.cursor_fields(self.name, fields)
+        self.dates = [i for i, f in enumerate(self.fields) if f.type == "Date"]
+        self.where_clause = where_clause
+        self.object_id = None
+
+    def select(self, where=None, parameters=()):
+        clauses = [x for x in [self.where_clause, where] if x]
+        sql = u"SELECT {} FROM {}".format(u", ".join([quote_name(f.name) for f in self.fields]),
+                                          quote_name(self.name))
+        if clauses:
+            sql += u" WHERE " + u" AND ".join([u"({})".format(x) for x in clauses])
+        if where:
+            sql += u" ORDER BY OBJECTID LIMIT {}".format(PAGE_SIZE)
+        try:
+            return self.storage.connection.execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(u"{} :: {}".format(e, sql))
+
+    def convert(self, row):
+        if not self.dates:
+            return row
+        row = list(row)
+        for i in self.dates:
+            row[i] = text_date(row[i])
+        return row
+
+    def __iter__(self):
+        for row in self.select():
+            yield tuple(self.convert(row))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class SQLiteUpdateCursor(SQLiteCursor):
+    """Update cursor on a SQLite table, the rows are lists as from arcpy.da.UpdateCursor.
+
+    The rows are read a page at a time by OBJECTID, so updating a field in the where clause or deleting the
+    current row does not change the rows still to be read."""
+
+    def __init__(self, storage, table, fields, where_clause=None):
+        SQLiteCursor.__init__(self, storage, table, fields, where_clause)
+        # the OBJECTID is read after the fields of the cursor to address the current row
+        self.fields = self.fields + [StorageField("OBJECTID", "OID")]
+        self.names = [f.name for f in self.fields[:-1]]
+
+    def __iter__(self):
+        last = 0
+        while True:
+            rows = self.select(u"OBJECTID > ?", (last,)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                row = self.convert(row)
+                self.object_id = last = row[-1]
+                yield list(row[:-1])
+
+    def updateRow(self, row):
+        values = [date_text(x) for x in row]
+        assignments = []
+        for name, value in zip(self.names, values):
+            if name.upper() != u"OBJECTID":
+                assignments.append((name, value))
+        sql = u"UPDATE {} SET {} WHERE OBJECTID = ?".format(
+            quote_name(self.name), u", ".join([u"{} = ?".format(quote_name(x[0])) for x in assignments]))
+        self.storage.connection.execute(sql, [x[1] for x in assignments] + [self.object_id])
+
+    def deleteRow(self):
+        self.storage.connection.execute(u"DELETE FROM {} WHERE OBJECTID = ?".format(quote_name(self.name)),
+                                        (self.object_id,))
+
+
+class SQLiteInsertCursor(object):
+    def __init__(self, storage, table, fields):
+        self.storage = storage
+        self.name = table_name(table)
+        self.fields = storage.cursor_fields(self.name, fields)
+        self.sql = u"INSERT INTO {} ({}) VALUES ({})".format(
+            quote_name(self.name), u", ".join([quote_name(f.name) for f in self.fields]),
+            u", ".join([u"?"] * len(self.fields)))
+
+    def insertRow(self, row):
+        if len(row) != len(self.fields):
+            raise RuntimeError("sequence size must match size of the row")
+        return self.storage.connection.execute(self.sql, [date_text(x) for x in row]).lastrowid
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class SQLiteEditor(object):
+    """The edit session of a SQLite storage as a transaction.
+
+    Each edit operation is a savepoint, stopEditing commits the transaction or rolls it back."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.isEditing = False
+        self.operations = 0
+
+    def startEditing(self, with_undo=True, multiuser_mode=True):
+        if not self.isEditing:
+            self.storage.connection.execute("BEGIN")
+            self.isEditing = self.storage.editing = True
+
+    def stopEditing(self, save_changes=True):
+        if not self.isEditing:
+            return
+        while self.operations:
+            self.stopOperation()
+        if save_changes:
+            self.storage.connection.execute("COMMIT")
+        else:
+            self.storage.connection.execute("ROLLBACK")
+        self.isEditing = self.storage.editing = False
+
+    def startOperation(self):
+        self.storage.connection.execute("SAVEPOINT edit_operation")
+        self.operations += 1
+
+    def stopOperation(self):
+        # the updaters stop the operation again when an edit fails after it was stopped
+        if self.operations:
+            self.storage.connection.execute("RELEASE SAVEPOINT edit_operation")
+            self.operations -= 1
+
+    def abortOperation(self):
+        if self.operations:
+            self.storage.connection.execute("ROLLBACK TO SAVEPOINT edit_operation")
+            self.storage.connection.execute("RELEASE SAVEPOINT edit_operation")
+            self.operations -= 1
+
+
+class SQLiteStorage(object):
+    """Tables in a SQLite file, or in memory with ":memory:".
+
+    Each table has an OBJECTID primary key and the type and length of its fields are kept in the _fields
+    table.  A table is named by the last part of its path, so the paths of a geodatabase can be used."""
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL" if path != ":memory:" else "PRAGMA journal_mode = MEMORY")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.execute(u"CREATE TABLE IF NOT EXISTS _fields (table_name TEXT, position INTEGER, "
+                                u"name TEXT, type TEXT, length INTEGER)")
+        self.catalog = {}
+        # True while an editor holds the transaction
+        self.editing = False
+
+    def close(self):
+        self.connection.close()
+
+    def fields(self, table):
+        """the fields of the table, starting with the OBJECTID"""
+        name = table_name(table)
+        try:
+            return self.catalog[name.lower()]
+        except KeyError:
+            rows = self.connection.execute(u"SELECT name, type, length FROM _fields WHERE lower(table_name) = ? "
+                                           u"ORDER BY position", (name.lower(),)).fetchall()
+            if not rows:
+                raise RuntimeError(u"Cannot open '{}'".format(table))
+            fields = [StorageField(*x) for x in rows]
+            self.catalog[name.lower()] = fields
+            return fields
+
+    def cursor_fields(self, name, fields):
+        catalog = self.fields(name)
+        if fields == "*":
+            return list(catalog)
+        if not isinstance(fields, (list, tuple)):
+            fields = [fields]
+        lookup = dict([(f.name.lower(), f) for f in catalog])
+        result = []
+        for x in fields:
+            key = u"objectid" if x == "OID@" else x.lower()
+            try:
+                result.append(lookup[key])
+            except KeyError:
+                raise RuntimeError(u"Cannot find field '{}' in {}".format(x, name))
+        return result
+
+    def create_table(self, table, fields, index_fields=()):
+        """create the table with fields of (name, type, length), the folio fields and the index_fields are
+        indexed.  An existing table of the same name is dropped."""
+        name = table_name(table)
+        self.drop_table(name)
+        fields = [StorageField("OBJECTID", "OID", 4)] + [StorageField(*x) for x in fields
+                                                        if x[0].upper() != "OBJECTID"]
+        columns = [u"OBJECTID INTEGER PRIMARY KEY AUTOINCREMENT"]
+        for f in fields[1:]:
+            columns.append(u"{} {}".format(quote_name(f.name), SQLITE_TYPES.get(f.type, "")))
+        self.connection.execute(u"CREATE TABLE {} ({})".format(quote_name(name), u", ".join(columns)))
+        self.connection.executemany(u"INSERT INTO _fields VALUES (?, ?, ?, ?, ?)",
+                                    [(name, i, f.name, f.type, f.length) for i, f in enumerate(fields)])
+        indexed = [x.lower() for x in index_fields] + FOLIO_FIELDS
+        for f in fields[1:]:
+            if f.name.lower() in indexed:
+                self.connection.execute(u"CREATE INDEX {} ON {} ({})".format(
+                    quote_name(u"ix_{}_{}".format(name, f.name)), quote_name(name), quote_name(f.name)))
+        self.catalog[name.lower()] = fields
+        return name
+
+    def drop_table(self, table):
+        name = table_name(table)
+        self.connection.execute(u"DROP TABLE IF EXISTS {}".format(quote_name(name)))
+        self.connection.execute(u"DELETE FROM _fields WHERE lower(table_name) = ?", (name.lower(),))
+        self.catalog.pop(name.lower(), None)
+
+    def load_rows(self, table, field_names, rows):
+        """insert the rows in one transaction, or in the transaction of the editor, returns the number of rows"""
+        cursor = SQLiteInsertCursor(self, table, field_names)
+        n = 0
+        if self.editing:
+            for row in rows:
+                cursor.insertRow(row)
+                n += 1
+            return n
+        self.connection.execute("BEGIN")
+        try:
+            for row in rows:
+                cursor.insertRow(row)
+                n += 1
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return n
+
+    def copy_table(self, storage, table, name=None, index_fields=()):
+        """copy a table of another storage into this one, to stage it for a diff"""
+        fields = [x for x in storage.list_fields(table) if x.type not in ("OID", "Geometry", "Blob", "Raster")]
+        names = [x.name for x in fields]
+        self.create_table(name or table, [(x.name, x.type, x.length) for x in fields], index_fields)
+        with storage.search_cursor(table, names) as cursor:
+            return self.load_rows(name or table, names, cursor)
+
+    def exists(self, table):
+        try:
+            self.fields(table)
+            return True
+        except RuntimeError:
+            return False
+
+    def list_fields(self, table, wild_card=None):
+        fields = self.fields(table)
+        if wild_card:
+            pattern = re.compile(fnmatch.translate(wild_card.lower()))
+            fields = [f for f in fields if pattern.match(f.name.lower())]
+        return list(fields)
+
+    def count(self, table):
+        return self.connection.execute(u"SELECT count(*) FROM {}".format(quote_name(table_name(table)))).fetchone()[0]
+
+    def oid_field(self, table):
+        return "OBJECTID"
+
+    def date_literal(self, table, value):
+        """the datetime as a date in a where clause, the dates are compared as the text they are stored as"""
+        return u"'{}'".format(date_text(value))
+
+    def search_cursor(self, table, fields, where_clause=None):
+        return SQLiteCursor(self, table, fields, where_clause)
+
+    def update_cursor(self, table, fields, where_clause=None):
+        return SQLiteUpdateCursor(self, table, fields, where_clause)
+
+    def insert_cursor(self, table, fields):
+        return SQLiteInsertCursor(self, table, fields)
+
+    def bulk_insert(self, table, fields, rows, staging=None):
+        """insert the rows with one statement, in the transaction of the editor, returns the number of rows"""
+        cursor = SQLiteInsertCursor(self, table, fields)
+        rows = [[date_text(x) for x in row] for row in rows]
+        if self.editing:
+            self.connection.executemany(cursor.sql, rows)
+            return len(rows)
+        self.connection.execute("BEGIN")
+        try:
+            self.connection.executemany(cursor.sql, rows)
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def editor(self, workspace=None):
+        return SQLiteEditor(self)
+
+
+# formats tried, in turn, for the dates of a csv that are not ISO dates
+CSV_DATE_FORMATS = ["%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y", "%Y-%m-%dT%H:%M:%S",
+                    "%Y/%m/%d %H:%M:%S", "%Y/%m/%d"]
+
+
+def parse_date(text):
+    value = text_date(text)
+    if not isinstance(value, type(text)):
+        return value
+    for x in CSV_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, x)
+        except ValueError:
+            pass
+    raise ValueError(u"{} is not a date".format(text))
+
+
+def parse_integer(text):
+    try:
+        return int(text)
+    except ValueError:
+        value = float(text)
+        if value != int(value):
+            raise
+        return int(value)
+
+
+CSV_PARSERS = {"Double": float, "Single": float, "Integer": parse_integer, "SmallInteger": parse_integer,
+               "Date": parse_date}
+
+
+class CSVCursor(object):
+    """search cursor on a csv file, the rows are tuples of the values parsed to the types of the fields"""
+
+    def __init__(self, storage, table, fields, where_clause=None):
+        if where_clause:
+            raise RuntimeError(u"A csv file can not be queried :: {}".format(where_clause))
+        self.storage = storage
+        self.table = table
+        catalog = storage.fields(table)
+        lookup = dict([(f.name.lower(), i) for i, f in enumerate(catalog)])
+        if fields == "*":
+            fields = [f.name for f in catalog]
+        elif not isinstance(fields, (list, tuple)):
+            fields = [fields]
+        try:
+            self.positions = [lookup[x.lower()] for x in fields]
+        except KeyError as e:
+            raise RuntimeError(u"Cannot find field {} in {}".format(e, table))
+        self.width = len(catalog)
+        self.parsers = [CSV_PARSERS.get(catalog[i].type) for i in self.positions]
+
+    def __iter__(self):
+        storage = self.storage
+        with open_text(self.table, "r", storage.encoding) as f:
+            header, rows = read_csv(f, storage.encoding)
+            for row in rows:
+                if not row:
+                    continue
+                if len(row) < self.width:
+                    row = row + [u""] * (self.width - len(row))
+                values = []
+                for i, parse in zip(self.positions, self.parsers):
+                    value = row[i]
+                    if parse is not None:
+                        if value.strip():
+                            try:
+                                value = parse(value.strip())
+                            except ValueError:
+                                storage.unparsed += 1
+                                value = None
+                        else:
+                            value = None
+                    values.append(value)
+                yield tuple(values)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class CSVStorage(object):
+    """A csv file as a source table, the first row holds the field names.
+
+    The columns that are in target_fields, the field catalog of the gdb table, are parsed to the type of the
+    field so the rows are cleaned and compared as the rows of a table.  The other columns are read as text.
+    Numbers and dates that do not parse are read as null and counted in unparsed."""
+
+    def __init__(self, target_fields=None, encoding="utf-8-sig"):
+        self.target_fields = target_fields or {}
+        self.encoding = encoding
+        self.catalog = {}
+        self.unparsed = 0
+
+    def fields(self, table):
+        try:
+            return self.catalog[table]
+        except KeyError:
+            pass
+        if not os.path.isfile(table):
+            raise RuntimeError(u"Cannot open '{}'".format(table))
+        with open_text(table, "r", self.encoding) as f:
+            header, rows = read_csv(f, self.encoding)
+        fields = []
+        for name in header or []:
+            target = self.target_fields.get(name.lower())
+            if target is None:
+                fields.append(StorageField(name, "String"))
+            else:
+                fields.append(StorageField(name, target["type"], target["length"]))
+        self.catalog[table] = fields
+        return fields
+
+    def exists(self, table):
+        return os.path.isfile(table)
+
+    def list_fields(self, table, wild_card=None):
+        fields = self.fields(table)
+        if wild_card:
+            pattern = re.compile(fnmatch.translate(wild_card.lower()))
+            fields = [f for f in fields if pattern.match(f.name.lower())]
+        return list(fields)
+
+    def count(self, table):
+        n = 0
+        for row in self.search_cursor(table, []):
+            n += 1
+        return n
+
+    def search_cursor(self, table, fields, where_clause=None):
+        return CSVCursor(self, table, fields, where_clause)
@@ -0,0 +1,155 @@
+"""Run the update tools of run_task.py in parallel worker processes.
+
+Each tool reads, diffs and edits in its own named version, so the tools only contend on the parent version
+when they reconcile and post.  run_tasks() gives the workers one lock, and a tool holds it through posting()
+for the rec/post step alone.  A LockFile keeps a scheduled run from starting while the last one is still
+running."""
+import os
+import json
+import time
+import errno
+import logging
+import datetime
+import traceback
+import multiprocessing
+from contextlib import contextmanager
+
+logger = logging.getLogger(__package__)
+
+# set in each worker process by run_tasks, None when a tool runs on its own
+post_lock = None
+
+
+def set_post_lock(lock):
+    global post_lock
+    post_lock = lock
+
+
+@contextmanager
+def posting(metrics=None):
+    """hold the post lock of run_tasks, the time spent waiting for it is the "post wait" span of the metrics"""
+    if post_lock is None:
+        yield
+        return
+    if metrics:
+        with metrics.span("post wait"):
+            post_lock.acquire()
+    else:
+        post_lock.acquire()
+    try:
+        yield
+    finally:
+        post_lock.release()
+
+
+class LockFile(object):
+    """A file that is only created by one run at a time.
+
+    The file holds the pid and start time of the run that holds it.  A lock file older than max_age seconds is
+    taken to be left behind by a run that was killed, and is replaced."""
+
+    def __init__(self, path, max_age=12 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self.held = False
+
+    def owner(self):
+        """the pid and start time written by the run that holds the lock, None if they can not be read"""
+        try:
+            with open(self.path, 'r') as f:
+                return json.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+
+    def stale(self):
+        try:
+            return time.time() - os.path.getmtime(self.path) > self.max_age
+        except OSError:
+            return False
+
+    def acquire(self):
+        """True when the lock was taken, False when another run holds it"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for attempt in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                if attempt or not self.stale():
+                    return False
+                logger.warning("{} :: removed the stale lock file {} held by {}".format(
+                    datetime.datetime.now(), self.path, self.owner()))
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    return False
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps({"pid": os.getpid(), "started": datetime.datetime.now().isoformat()}))
+            self.held = True
+            return True
+        return False
+
+    def release(self):
+        if self.held:
+            self.held = False
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.warning("{} :: the lock file {} was not removed :: {}".format(
+                    datetime.datetime.now(), self.path, e))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+        return False
+
+
+def timed_call(worker, name):
+    """call worker(name) and return its result with the wall time, an exception is returned as the error"""
+    start = time.time()
+    result = None
+    error = None
+    try:
+        result = worker(name)
+    except Exception:
+        error = traceback.format_exc()
+    return {"name": name, "result": result, "error": error, "seconds": round(time.time() - start, 3)}
+
+
+def run_tasks(worker, names, processes=None):
+    """Call worker(name) for each name in a pool of processes and return the results of timed_call in the order
+    of the names, with the total wall time.
+
+    worker has to be a module level function so it can be passed to the processes.  Each name runs in a new
+    process, so the memory and arcpy state of one tool do not carry into the next."""
+    start = time.time()
+    processes = processes or len(names)
+    if processes <= 1:
+        results = [timed_call(worker, x) for x in names]
+    else:
+        lock = multiprocessing.Lock()
+        pool = multiprocessing.Pool(processes, set_post_lock, (lock,), maxtasksperchild=1)
+        try:
+            pending = [pool.apply_async(timed_call, (worker, x)) for x in names]
+            pool.close()
+            # a timeout lets KeyboardInterrupt reach the parent on Python 2
+            results = [x.get(timeout=7 * 24 * 3600) for x in pending]
+        finally:
+            pool.terminate()
+            pool.join()
+    return results, round(time.time() - start, 3)
+
+
+def format_results(results, seconds):
+    lines = ["{:<20} {:>10} {}".format("tool", "seconds", "result")]
+    for x in results:
+        status = "error" if x["error"] else ("succeeded" if x["result"] else "failed")
+        lines.append("{:<20} {:>10.1f} {}".format(x["name"], x["seconds"], status))
+    lines.append("{:<20} {:>10.1f}".format("total", seconds))
+    return "\n".join(lines)
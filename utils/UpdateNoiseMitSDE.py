@@ -8,19 +8,45 @@ import traceback
 import datetime
 from collections import Counter
 import json
+from utils.SortedMergeDiff import SortedMergeDiff, DiffStream
+from utils.RowSnapshot import RowSnapshot, fingerprint
+from utils.RunMetadata import RunMetadata, SourceDigest, FolioDigests, ChangeWatermark
+from utils.RowCleaner import compile_cleaner
+from utils.QueryPlanner import QueryPlanner
+from utils.Reporter import Reporter, configure_log, REPORT_LOG
+from utils.RunMetrics import RunMetrics
+from utils.TaskRunner import posting
+from utils.Storage import ArcPyStorage, CSVStorage, table_name
+from utils.BulkAppend import compile_validator, RejectFile
+from utils import KeyedUpsert
+from utils.BuildingPlan import OneToOnePlan, FolioMemo, KEEP, concat_list, contact_name, contact_string
+try:
+    from utils import ArrayDiff
+except ImportError:
+    # without NumPy compare_tables(vectorized=True) falls back to the cursor diff
+    ArrayDiff = None
 env.overwriteOutput = 1
 
 home_dir = os.path.dirname(os.path.abspath(__file__))
 
 logger = logging.getLogger(__package__)
 
+# number of cleaned string values memoized for each column by the row cleaner
+CLEAN_MEMO_SIZE = 4096
+
 domain_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domains.json")
 file = open(domain_file, 'r')
 domains = json.loads(file.read())
 file.close()
 
 
-def compare_tables(sql_table, gdb_table):
+def reporter(name):
+    """a Reporter for a loop over rows that passes its sampled events on to the geoprocessing messages"""
+    return Reporter(name, arcpy.AddMessage, arcpy.AddWarning)
+
+
+def compare_tables(sql_table, gdb_table, streaming=False, memory_mb=64, snapshot=None, digest=None,
+                   vectorized=False, metrics=None, storage=None, watermark=None, planner=None):
     arcpy.AddMessage("UpdateNoiseMitSDE.compare_tables()")
     """
     1. Compare the fields between the tables to catch a schema change.
@@ -29,40 +55,60 @@ def compare_tables(sql_table, gdb_table):
     The return value is a dictionary including the folio Ids for rows being updated,
     as well as the rows themselves.
 
+    With streaming, the rows of both tables are spilled to sorted files on disk once memory_mb is used and the
+    add_rows and exist_rows are returned as DiffStream objects that read the rows back from disk.
+
+    If a RowSnapshot is passed, the source rows are recorded in it and the source is diffed against the
+    snapshot taken after the last run.  The gdb table is only read in full if the snapshot fails to validate.
+
+    If a SourceDigest is passed, the cleaned source rows are added to it.  When the digest is unchanged from the
+    last successful run, the gdb table is not read and the result holds no rows to add or remove.
+
+    With vectorized, both tables are read into NumPy structured arrays and cleaned and diffed with array
+    operations, see array_diff.
+
+    The reads of the source and the target are timed as spans of the RunMetrics passed in metrics.
+
+    Both tables are read from the storage, the geodatabase through arcpy unless another storage is passed, see
+    utils.Storage.  The vectorized diff needs arcpy.
+
+    A sql_table that ends in .csv is a csv export read with CSVStorage, its values are parsed to the types of the
+    gdb table and the rows are cleaned and diffed as they are read, without importing the file to a table.
+
+    If a ChangeWatermark is passed and the source has its timestamp and key fields, only the rows that share a key
+    with the source rows edited since the watermark of the last run are read from both tables and diffed, see
+    changed_rows_diff.  Without a watermark from the last run the whole source is read, and the latest timestamp
+    is kept in the watermark for the next run.  A csv export is always read in full.
+
     If no changes need to be made, the 'compare_result' value in the result dict will be zero."""
+    if metrics is None:
+        metrics = RunMetrics()
+    if storage is None:
+        storage = ArcPyStorage()
+    source = storage
+    if sql_table.lower().endswith(".csv"):
+        source = CSVStorage()
     try:
         # verify that the necessary tables exist
-        for x in [sql_table, gdb_table]:
-            ingdb = "\\".join(x.split("\\")[:-1])
-            env.workspace = ingdb
-            table_name = x.split("\\")[-1]
-            if not arcpy.Exists(table_name):
+        for x, table_storage in [(sql_table, source), (gdb_table, storage)]:
+            if not table_storage.exists(x):
                 arcpy.AddError("the table {} was not found".format(x))
                 raise Exception()
             else:
                 pass
+        target_fields = field_catalog(gdb_table, storage)
+        if isinstance(source, CSVStorage):
+            # the columns of the csv are read as the types of the gdb table
+            source.target_fields = target_fields
+
         source_fields = {}
-        read_fields = arcpy.ListFields(sql_table)
+        read_fields = source.list_fields(sql_table)
         for x in read_fields:
             source_fields[x.name.lower()] = {
                 "type": x.type,
                 "name": x.name
             }
 
-        target_fields = {}
-        existing_fields = arcpy.ListFields(gdb_table)
-        for x in existing_fields:
-            if x.type == "String":
-                length = x.length
-            else:
-                length = None
-
-            target_fields[x.name.lower()] = {
-                "type": x.type,
-                "name": x.name,
-                "length": length
-            }
-
         # The only missing field should be ObjectID because the sql table is not registered with the geodatabase
         source_keys = list(source_fields.keys())
         target_keys = list(target_fields.keys())
@@ -104,89 +150,449 @@ def compare_tables(sql_table, gdb_table):
         if len(missing_fields):
             arcpy.AddMessage("These fields were not found in the source sql table :: {}".format(missing_fields))
 
+        if digest:
+            digest.fields = _match_fields
+
+        if watermark:
+            since = None
+            key_index = watermark.find_key(_match_fields)
+            if isinstance(source, CSVStorage) or key_index is None or watermark.find_field(source_fields) is None:
+                arcpy.AddMessage("The changed rows of {} can not be read without a timestamp field and a key field, "
+                                 "the whole table is compared".format(sql_table))
+                watermark = None
+            else:
+                since = watermark.since(_match_fields)
+            if since is not None:
+                source_names = [source_fields[y]["name"] for y in _match_fields]
+                target_names = [target_fields[y]["name"] for y in _match_fields]
+                changed = changed_rows_diff(source, storage, sql_table, gdb_table, source_names, target_names,
+                                            target_fields, key_index, watermark, since, metrics, planner)
+                if changed is not None:
+                    watermark.incremental = True
+                    add_rows, rem_rows = changed
+                    return compare_result_dict(_match_fields, folio_index, add_rows, rem_rows)
+                arcpy.AddMessage("A changed row of {} has no {}, the whole table is compared".format(
+                    sql_table, _match_fields[key_index]))
+
+        if vectorized:
+            source_names = [source_fields[y]["name"] for y in _match_fields]
+            target_names = [target_fields[y]["name"] for y in _match_fields]
+            if ArrayDiff is None or not isinstance(storage, ArcPyStorage) or source is not storage or \
+                    not ArrayDiff.supported(target_fields, target_names):
+                arcpy.AddMessage("The tables can not be compared as NumPy arrays, the cursor diff is used")
+            else:
+                if watermark:
+                    with metrics.span("compare.watermark"):
+                        latest_timestamp(source, sql_table, watermark)
+                with metrics.span("compare.array_diff") as span:
+                    add_rows, rem_rows = array_diff(sql_table, gdb_table, source_names, target_names,
+                                                    target_fields, digest, planner)
+                    span.rows = len(add_rows) + len(rem_rows)
+                return compare_result_dict(_match_fields, folio_index, add_rows, rem_rows)
+
         # Add all of the rows from the weaver sql table to a list
 
+        if snapshot and (streaming or not len(folio_index)):
+            arcpy.AddMessage("The row snapshot requires a folio number and is not used with the streaming diff")
+            snapshot = None
+
+        merge = None
+        if streaming:
+            if len(folio_index):
+                merge = SortedMergeDiff(folio_index[0], memory_mb * 1024 * 1024)
+            else:
+                merge = SortedMergeDiff(None, memory_mb * 1024 * 1024)
+
         field_names = [source_fields[y]["name"] for y in _match_fields]
+        read_names = field_names
+        if watermark:
+            # the timestamp is read after the match fields, the latest one is the watermark of the next run
+            read_names = field_names + [watermark.field]
         add_rows = []
-        with da.SearchCursor(sql_table, field_names) as cursor:
-            for row in cursor:
-                new_row = clean_row(target_fields, field_names, row)
-                i = 0
-                for x in new_row:
-                    # this removes empty rows from the source list
-                    if x:
-                        i += 1
+        add_prints = []
+        clean = compile_cleaner(target_fields, field_names, CLEAN_MEMO_SIZE)
+        with metrics.span("compare.source") as span:
+            span.rows = 0
+            with source.search_cursor(sql_table, read_names) as cursor:
+                for row in cursor:
+                    span.rows += 1
+                    if watermark:
+                        watermark.observe(row[-1])
+                        row = row[:-1]
+                    new_row = clean(row)
+                    i = 0
+                    for x in new_row:
+                        # this removes empty rows from the source list
+                        if x:
+                            i += 1
+                        if i:
+                            break
                     if i:
-                        break
-                if i:
-                    add_rows.append(new_row)
-                del new_row
-        del cursor
+                        if merge:
+                            merge.add_source(new_row)
+                        else:
+                            add_rows.append(new_row)
+                        if snapshot:
+                            x = fingerprint(new_row)
+                            add_prints.append(x)
+                            snapshot.record(new_row[folio_index[0]], x)
+                        if digest:
+                            digest.update(new_row)
+                    del new_row
+            del cursor
+
+        if isinstance(source, CSVStorage) and source.unparsed:
+            arcpy.AddWarning("{} numbers and dates of {} did not parse and were read as null".format(
+                source.unparsed, sql_table))
+
+        if digest and digest.unchanged():
+            arcpy.AddMessage("The source table {} has not changed since the last run".format(sql_table))
+            if merge:
+                merge.remove()
+            return compare_result_dict(_match_fields, folio_index, [], [])
 
         field_names = [target_fields[y]["name"] for y in _match_fields]
-        rem_rows = []
-        with da.SearchCursor(gdb_table, field_names) as cursor:
-            for row in cursor:
-                _row = clean_row(target_fields, field_names, row)
-                if _row in add_rows:
-                    add_rows.remove(_row)
-                    pass
-                # if the row is not in the add_rows, then add it to the rem_rows
-                else:
-                    rem_rows.append(list(row))
-        del cursor
+        clean = compile_cleaner(target_fields, field_names, CLEAN_MEMO_SIZE)
+        snapshot_result = None
+        if snapshot and snapshot.load(_match_fields):
+            with metrics.span("compare.snapshot_diff"):
+                snapshot_result = snapshot_diff(snapshot, gdb_table, field_names, clean, folio_index[0],
+                                                add_rows, add_prints, storage, planner)
+            if snapshot_result is None:
+                arcpy.AddMessage("The row snapshot did not validate, the whole gdb table is read")
+            else:
+                arcpy.AddMessage("The source rows were compared against the row snapshot {}".format(snapshot.path))
+
+        if snapshot_result is not None:
+            add_rows, rem_rows = snapshot_result
+        elif merge:
+            with metrics.span("compare.target") as span:
+                span.rows = 0
+                with storage.search_cursor(gdb_table, field_names) as cursor:
+                    for row in cursor:
+                        span.rows += 1
+                        merge.add_target(clean(row), row)
+                del cursor
+        else:
+            # the OBJECTID is read after the match fields so the rows can be deleted by OBJECTID
+            with metrics.span("compare.target_diff"):
+                with storage.search_cursor(gdb_table, field_names + ["OID@"]) as cursor:
+                    add_rows, rem_rows = diff_rows(add_rows, cursor, clean, object_ids=True)
+                del cursor
+        if merge:
+            with metrics.span("compare.merge_diff"):
+                add_rows, rem_rows = merge.run()
 
-        compare_result = 0
-        folioId_dict = {
-            "rem": [],
-            "add": []
-        }
-        if len(add_rows) or len(rem_rows):
-            compare_result += 1
-            for x in add_rows:
-                try:
-                    # If folioIds are used, or some other ID, then use that to index the rows, other wise use the entire row
-                    if len(folio_index):
-                        folioId_dict["add"].append(x[folio_index[0]])
-                    else:
-                        folioId_dict["add"].append(x)
-                except IndexError:
-                    pass
-            for x in rem_rows:
-                try:
-                    if len(folio_index):
-                        folioId_dict["rem"].append(x[folio_index[0]])
-                    else:
-                        folioId_dict["rem"].append(x)
-                except IndexError:
-                    pass
+        return compare_result_dict(_match_fields, folio_index, add_rows, rem_rows)
 
-        folioIds = []
-        if len(folio_index):
-            folioIds.extend(folioId_dict["rem"])
-            folioIds.extend(folioId_dict["add"])
-            folioIds = list(set(folioIds))
+    except Exception as e:
+        print(e)
 
-        if len(folioIds):
-            arcpy.AddMessage("{} folioIds will be updated in the table".format(len(folioIds)))
-            arcpy.AddMessage("{} folios are flagged for removal".format(len(set(folioId_dict["rem"]))))
-            arcpy.AddMessage("{} folios are flagged for insert".format(len(set(folioId_dict["add"]))))
 
+def field_catalog(table, storage=None):
+    """the type, name and string length of each field in the table, keyed by the lowercase field name"""
+    if storage is None:
+        storage = ArcPyStorage()
+    target_fields = {}
+    for x in storage.list_fields(table):
+        if x.type == "String":
+            length = x.length
         else:
-            # folioIds are not used to look up records, the entire row is added as an item
-            arcpy.AddMessage("{} rows will be removed from the table".format(len(folioId_dict["rem"])))
-            arcpy.AddMessage("{} rows will be added to the table".format(len(folioId_dict["add"])))
-
-        return {
-            "match_fields": _match_fields,
-            "folioIds": folioIds,
-            "compare_result": compare_result,
-            "add_rows": add_rows,
-            "exist_rows": rem_rows
+            length = None
+
+        target_fields[x.name.lower()] = {
+            "type": x.type,
+            "name": x.name,
+            "length": length
         }
+    return target_fields
+
+
+def compare_result_dict(_match_fields, folio_index, add_rows, rem_rows):
+    """collect the folioIds of the rows to add and remove and build the dictionary returned by compare_tables"""
+    compare_result = 0
+    folioId_dict = {
+        "rem": set(),
+        "add": set()
+    }
+    if len(add_rows) or len(rem_rows):
+        compare_result += 1
+        # If folioIds are used, or some other ID, then use that to index the rows
+        if len(folio_index):
+            for key, rows in [("add", add_rows), ("rem", rem_rows)]:
+                for x in rows:
+                    try:
+                        folioId_dict[key].add(x[folio_index[0]])
+                    except IndexError:
+                        pass
 
-    except Exception as e:
-        print(e)
+    folioIds = []
+    if len(folio_index):
+        folioIds = list(folioId_dict["rem"] | folioId_dict["add"])
+
+    if len(folioIds):
+        arcpy.AddMessage("{} folioIds will be updated in the table".format(len(folioIds)))
+        arcpy.AddMessage("{} folios are flagged for removal".format(len(folioId_dict["rem"])))
+        arcpy.AddMessage("{} folios are flagged for insert".format(len(folioId_dict["add"])))
+
+    else:
+        # folioIds are not used to look up records, the entire row is added as an item
+        arcpy.AddMessage("{} rows will be removed from the table".format(len(rem_rows)))
+        arcpy.AddMessage("{} rows will be added to the table".format(len(add_rows)))
+
+    return {
+        "match_fields": _match_fields,
+        "folioIds": folioIds,
+        "compare_result": compare_result,
+        "add_rows": add_rows,
+        "exist_rows": rem_rows
+    }
+
+
+def array_diff(sql_table, gdb_table, source_names, target_names, target_fields, digest=None, planner=None):
+    """diff the tables read as NumPy structured arrays
+
+    Both tables are cleaned and matched with array operations, see ArrayDiff.  The OBJECTIDs of the target rows
+    to remove are kept, and only those rows are read again by the chunked queries of the planner to return their
+    raw values.  Returns
+    the add_rows and the rem_rows as RemoveRows, both empty when the digest is unchanged."""
+    source = da.TableToNumPyArray(sql_table, source_names,
+                                  null_value=ArrayDiff.null_values(target_fields, source_names))
+    source = ArrayDiff.clean_array(source, target_fields, source_names)
+    source = source[ArrayDiff.nonempty(source)]
+    arcpy.AddMessage("{} rows were read from the source table into an array".format(len(source)))
+    if digest:
+        for row in ArrayDiff.to_rows(source, target_fields, target_names):
+            digest.update(row)
+        if digest.unchanged():
+            arcpy.AddMessage("The source table {} has not changed since the last run".format(sql_table))
+            return [], []
+
+    null_value = ArrayDiff.null_values(target_fields, target_names)
+    target = da.TableToNumPyArray(gdb_table, target_names + ["OID@"], null_value=null_value)
+    object_ids = target["OID@"]
+    target = ArrayDiff.clean_array(target, target_fields, target_names)
+    arcpy.AddMessage("{} rows were read from the gdb table into an array".format(len(target)))
+
+    add_mask, rem_mask = ArrayDiff.diff_arrays(source, target)
+    add_rows = ArrayDiff.to_rows(source[add_mask], target_fields, target_names)
+
+    if planner is None:
+        planner = QueryPlanner()
+    rem_rows = RemoveRows()
+    query = planner.query(arcpy.Describe(gdb_table).OIDFieldName, object_ids[rem_mask].tolist(), quoted=False)
+    for cursor, row in query.rows(da.SearchCursor, gdb_table, target_names + ["OID@"], len(target_names)):
+        rem_rows.add(list(row[:-1]), row[-1])
+    if len(query):
+        arcpy.AddMessage(query.report())
+    return add_rows, rem_rows
+
+
+def latest_timestamp(source, sql_table, watermark):
+    """read the timestamp field alone to find the latest edit of the source rows"""
+    with source.search_cursor(sql_table, [watermark.field]) as cursor:
+        for row in cursor:
+            watermark.observe(row[0])
+    del cursor
+    return watermark.latest
+
+
+def changed_rows_diff(source, storage, sql_table, gdb_table, source_names, target_names, target_fields,
+                      key_index, watermark, since, metrics, planner=None):
+    """diff the rows that share a key with the source rows edited since the watermark, rather than the whole tables
+
+    The keys of the source rows with a timestamp from since on are read first.  When the key reconcile of the
+    watermark is due, the key field alone is read from both tables and counted, and the keys with another count
+    of rows in each table, rows deleted from the source or missed by an earlier run, are added to the changed
+    keys.  All of the rows of the
+    changed keys are then read from both tables, by key, and diffed with diff_rows.
+
+    Returns the add_rows and the rem_rows as RemoveRows, or None when a changed row has no key and can not be
+    selected by it."""
+    if planner is None:
+        planner = QueryPlanner()
+    source_key = source_names[key_index]
+    target_key = target_names[key_index]
+    # the keys are cleaned as the rows are, to select them in the gdb table
+    clean_key = compile_cleaner(target_fields, [target_key])
+    source_keys = set()
+    with metrics.span("compare.changed_keys") as span:
+        sql_query = u"{} >= {}".format(watermark.field, source.date_literal(sql_table, since))
+        with source.search_cursor(sql_table, [source_key, watermark.field], sql_query) as cursor:
+            for row in cursor:
+                if not row[0]:
+                    return None
+                source_keys.add(row[0])
+                watermark.observe(row[1])
+        del cursor
+        span.rows = len(source_keys)
+    target_keys = set([clean_key([x])[0] for x in source_keys])
+    arcpy.AddMessage("{} {} values of {} were edited since {}".format(len(source_keys), source_key, sql_table,
+                                                                      since))
+
+    if watermark.reconcile_due():
+        with metrics.span("compare.key_reconcile") as span:
+            # the source keys are counted as cleaned, with the raw values to select them in the source
+            expected = Counter()
+            keys = {}
+            with source.search_cursor(sql_table, [source_key]) as cursor:
+                for row in cursor:
+                    if row[0]:
+                        key = clean_key([row[0]])[0]
+                        expected[key] += 1
+                        keys.setdefault(key, set()).add(row[0])
+            del cursor
+            found = Counter()
+            with storage.search_cursor(gdb_table, [target_key]) as cursor:
+                for row in cursor:
+                    found[row[0]] += 1
+            del cursor
+            differ = set([x for x in found if found[x] != expected[x]])
+            differ.update([x for x in expected if expected[x] != found[x]])
+            span.rows = sum(expected.values()) + sum(found.values())
+        for x in differ:
+            source_keys.update(keys.get(x, ()))
+        target_keys.update(differ)
+        watermark.reconciled = True
+        arcpy.AddMessage("The {} values of the tables were reconciled, {} have another count of rows in the gdb "
+                         "table".format(target_key, len(differ)))
+
+    quoted = target_fields[target_key.lower()]["type"] == "String"
+    with metrics.span("compare.changed_diff") as span:
+        clean = compile_cleaner(target_fields, source_names, CLEAN_MEMO_SIZE)
+        add_rows = []
+        query = planner.query(source_key, source_keys, quoted)
+        for cursor, row in query.rows(source.search_cursor, sql_table, source_names, key_index):
+            new_row = clean(row)
+            # this removes empty rows from the source list
+            if any(new_row):
+                add_rows.append(new_row)
+        clean = compile_cleaner(target_fields, target_names, CLEAN_MEMO_SIZE)
+        query = planner.query(target_key, target_keys, quoted)
+        rows = query.rows(storage.search_cursor, gdb_table, target_names + ["OID@"], key_index)
+        add_rows, rem_rows = diff_rows(add_rows, (row for cursor, row in rows), clean, object_ids=True)
+        span.rows = len(add_rows) + len(rem_rows)
+    return add_rows, rem_rows
+
+
+class RemoveRows(list):
+    """The rows to remove from the gdb table, as lists of their raw values.
+
+    object_ids holds the OBJECTID of each row in the same order, when the diff read them, so the rows can be
+    deleted by OBJECTID rather than by matching their values."""
+
+    def __init__(self, rows=(), object_ids=()):
+        list.__init__(self, rows)
+        self.object_ids = list(object_ids)
+
+    def add(self, row, object_id):
+        self.append(row)
+        self.object_ids.append(object_id)
+
+    def keyed(self):
+        """True when there is an OBJECTID for every row"""
+        return len(self.object_ids) == len(self) and None not in self.object_ids
+
+
+def diff_rows(add_rows, target_rows, clean, object_ids=False):
+    """match the cleaned source rows against the rows read from the gdb table
+
+    Rows are keyed by their tuple in a Counter so each target row is matched in constant time.  A duplicate
+    row in the source is consumed once for each identical row in the target, the same as list.remove, and the
+    remaining add_rows keep their source order.  The target rows that were not matched are returned as lists
+    of their raw values, because the update cursor compares them against the un-cleaned rows in the table.
+
+    With object_ids, the last value of each target row is its OBJECTID and the rows not matched are returned
+    as RemoveRows."""
+    available = Counter([tuple(x) for x in add_rows])
+    matched = Counter()
+    if object_ids:
+        rem_rows = RemoveRows()
+    else:
+        rem_rows = []
+    for row in target_rows:
+        if object_ids:
+            object_id = row[-1]
+            row = row[:-1]
+        key = tuple(clean(row))
+        if available[key]:
+            available[key] -= 1
+            matched[key] += 1
+        # if the row is not in the add_rows, then add it to the rem_rows
+        elif object_ids:
+            rem_rows.add(list(row), object_id)
+        else:
+            rem_rows.append(list(row))
+
+    new_rows = []
+    for x in add_rows:
+        key = tuple(x)
+        if matched[key]:
+            # list.remove dropped the first occurrence of a matched row
+            matched[key] -= 1
+        else:
+            new_rows.append(x)
+    return new_rows, rem_rows
+
+
+def snapshot_diff(snapshot, gdb_table, field_names, clean, folio_index, add_rows, add_prints, storage=None,
+                  planner=None):
+    """diff the cleaned source rows against the row snapshot rather than the whole gdb table
+
+    The snapshot is first validated, the row count of the gdb table must match and the rows of a sample of
+    folios must have the fingerprints held in the snapshot.  Returns None if the validation fails.  Only the
+    folios with rows to remove are read from the gdb table, to return the raw rows for the delete.  The folios
+    are selected by the chunked queries of the planner."""
+    if storage is None:
+        storage = ArcPyStorage()
+    if planner is None:
+        planner = QueryPlanner()
+    folio_field = field_names[folio_index]
+    count = storage.count(gdb_table)
+    if count != snapshot.count:
+        arcpy.AddMessage("The row snapshot holds {} rows, the gdb table holds {}".format(snapshot.count, count))
+        return None
+
+    sample = snapshot.sample()
+    if len(sample):
+        read = Counter()
+        query = planner.query(folio_field, sample)
+        for cursor, row in query.rows(storage.search_cursor, gdb_table, field_names, folio_index):
+            read[fingerprint(clean(row))] += 1
+        if read != snapshot.fingerprints(sample):
+            arcpy.AddMessage("The rows of the sampled folios do not match the row snapshot")
+            return None
+
+    available = snapshot.fingerprints()
+    new_rows = []
+    for row, x in zip(add_rows, add_prints):
+        if available[x]:
+            available[x] -= 1
+        else:
+            new_rows.append(row)
+
+    rem_prints = Counter()
+    rem_folios = set()
+    for folio, values in snapshot.folios.items():
+        for x in values:
+            if available[x]:
+                available[x] -= 1
+                rem_prints[x] += 1
+                rem_folios.add(folio)
+
+    rem_rows = RemoveRows()
+    if len(rem_folios):
+        if u"" in rem_folios:
+            # rows without a folio number can not be selected by folio
+            return None
+        query = planner.query(folio_field, rem_folios)
+        for cursor, row in query.rows(storage.search_cursor, gdb_table, field_names + ["OID@"], folio_index):
+            x = fingerprint(clean(row[:-1]))
+            if rem_prints[x]:
+                rem_prints[x] -= 1
+                rem_rows.add(list(row[:-1]), row[-1])
+        arcpy.AddMessage(query.report())
+    return new_rows, rem_rows
 
 
 def print_connection_info(workspace):
@@ -202,51 +608,11 @@ def clean_row(target_fields, field_names, _row):
     """take an input row from a cursor, clean it, compare against target schema, then return the cleaned row"""
     """
     Cleaning the rows should only happen once when the data is read from the source table,  when the buildings 
-    are updated from the related table it is assumed that the rows are already clean
-    """
-    cleaned_row = []
-    for i in range(len(_row)):
-        _x = _row[i]
-        field_name = field_names[i]
-        target_type = target_fields[field_name.lower()]["type"]
-        target_length = target_fields[field_name.lower()]["length"]
-
-        try:
-            if target_type == "String":
-                if type(_x) is str:
-                    _x = unicode(_x.strip(), encoding="utf8")
-                    for a in ["!", "@", "#", "$", "%", "^", "&", "*", ","]:
-                        _x = _x.replace(a, u"-")
-                        _x = _x.strip()
-                        if len(_x) > target_length:
-                            _x = u""
-                elif type(_x) is unicode:
-                    for a in ["!", "@", "#", "$", "%", "^", "&", "*", ","]:
-                        _x = _x.replace(a, u"-")
-                        _x = _x.strip()
-                        if len(_x) > target_length:
-                            _x = u""
-                elif type(_x) is datetime.datetime:
-                    _x = u"{}".format(_x.date())
-                if not _x:
-                    _x = u""
-
-            elif target_type == "Date":
-                if type(_x) is datetime.datetime:
-                    _x = _x.date()
-                if not _x:
-                    _x = None
-            elif target_type == "Double":
-                if not _x:
-                    _x = 0.0
-            else:
-                if not _x:
-                    _x = None
+    are updated from the related table it is assumed that the rows are already clean.
 
-        except AttributeError:
-            pass
-        cleaned_row.append(_x)
-    return cleaned_row
+    To clean many rows against the same schema, build the cleaner once with RowCleaner.compile_cleaner
+    """
+    return compile_cleaner(target_fields, field_names)(_row)
 
 
 class VersionException(Exception):
@@ -292,7 +658,16 @@ class SdeConnector:
 
 
 class VersionManager:
-    def __init__(self, opt, connection_folder, target_sde, new_version, new_connection, platform, instance):
+    """Creates the edit version and its connection file, and reconciles and posts the edits.
+
+    By default the version is created before and deleted after each run.  With a version_cache, a RunMetadata,
+    the version and its connection file are kept between runs: open_version() reconciles the version kept by the
+    last run with the parent version and rec_post() posts the edits without deleting it.  The full name of the
+    version and the path of the connection file are read from the cache, so the versions are only listed when
+    the connection file no longer works.  A version whose edits were not posted is deleted and created again."""
+
+    def __init__(self, opt, connection_folder, target_sde, new_version, new_connection, platform, instance,
+                 metrics=None, version_cache=None):
 
         self.opt = opt
         self.connection_folder = connection_folder
@@ -305,7 +680,9 @@ class VersionManager:
         self.platform = platform
         self.instance = instance
         self.edit_version = ""
-        pass
+        # the creation of the connection file is timed as a span of the RunMetrics
+        self.metrics = metrics or RunMetrics()
+        self.version_cache = version_cache
 
     def clean_previous(self):
         arcpy.AddMessage("UpdateNoiseMitSDE.VersionManager.clean_previous()")
@@ -328,6 +705,7 @@ class VersionManager:
                     arcpy.DeleteVersion_management(self.target_sde, d[new_vers])
                 except Exception as e:
                     arcpy.AddError(e)
+            self.forget_version()
 
         else:
             logging.info("no versions found")
@@ -366,9 +744,10 @@ class VersionManager:
 
                     # create SdeConnector object for the version
                     # out_folder, out_name, platform, instance, options
-                    version_connection = SdeConnector(self.connection_folder, self.new_connection, self.platform,
-                                                      self.instance, v_opt)
-                    self.version_sde = version_connection.create_sde_connection()
+                    with self.metrics.span("connection file"):
+                        version_connection = SdeConnector(self.connection_folder, self.new_connection,
+                                                          self.platform, self.instance, v_opt)
+                        self.version_sde = version_connection.create_sde_connection()
                     return self.version_sde
 
                 except Exception as e:
@@ -382,59 +761,253 @@ class VersionManager:
         try:
             # Block additional connections during rec/post
             env.workspace = self.version_sde
-            logfile = os.path.join(home_dir, "logs\\NoiseMit_logfile.txt")
-            if os.path.exists(logfile):
-                os.remove(logfile)
+            logfile = self.reconcile_log()
+            # the reused version is kept for the next run
+            with_delete = "KEEP_VERSION" if self.version_cache is not None else "DELETE_VERSION"
             try:
                 # putting the version in a list is required for OS Auth versions
                 arcpy.ReconcileVersions_management(self.version_sde, "ALL_VERSIONS", u"{}".format(self.parent_version),
                                                    [self.edit_version], "LOCK_ACQUIRED",
                                                    "NO_ABORT", "BY_OBJECT", "FAVOR_TARGET_VERSION",
-                                                   "POST", "DELETE_VERSION", logfile)
+                                                   "POST", with_delete, logfile)
             except:
                 arcpy.DeleteVersion_management(self.version_sde, self.new_version)
                 os.remove(self.version_sde)
+                self.forget_version()
                 raise Exception()
 
-            os.remove(self.version_sde)
+            if self.version_cache is not None:
+                self.version_cache.update(posted=True)
+            else:
+                os.remove(self.version_sde)
             return True
         except Exception as e:
             arcpy.AddError("Unable to rec/post edits :: {}".format(e.message))
 
+    def find_version(self):
+        """the full name of the edit version, None when it does not exist"""
+        for v in da.ListVersions(self.target_sde):
+            if v.name.split(".")[-1] == self.new_version:
+                return v.name
+        return None
+
+    def valid_connection(self, version_sde, edit_version):
+        """True when the connection file opens the edit version"""
+        if not os.path.exists(version_sde):
+            return False
+        try:
+            return arcpy.Describe(version_sde).connectionProperties.version == edit_version
+        except (IOError, RuntimeError, AttributeError) as e:
+            arcpy.AddMessage("The connection file {} is not valid :: {}".format(version_sde, e))
+            return False
+
+    def forget_version(self):
+        if self.version_cache is not None and self.version_cache.get("edit_version"):
+            self.version_cache.update(edit_version=None, version_sde=None, posted=None)
+
+    def open_version(self):
+        """the connection file of the edit version, the version is created unless the version_cache holds one
+        that was posted by the last run"""
+        cache = self.version_cache
+        if cache is None:
+            self.clean_previous()
+            return self.connect_version()
+
+        version_sde = cache.get("version_sde")
+        edit_version = cache.get("edit_version")
+        if not (version_sde and edit_version and cache.get("posted") and
+                self.valid_connection(version_sde, edit_version)):
+            # the edits of the last run were not posted, or the cached connection does not work
+            arcpy.AddMessage("The {} version and its connection file are created".format(self.new_version))
+            self.clean_previous()
+            version_sde = self.connect_version()
+            if not version_sde:
+                raise VersionException("The connection file of the {} version was not created".format(
+                    self.new_version))
+            cache.update(edit_version=self.edit_version, version_sde=version_sde, posted=False)
+            return version_sde
+
+        self.version_sde = version_sde
+        self.edit_version = edit_version
+        arcpy.AddMessage("The {} version is reused :: {}".format(edit_version, version_sde))
+        try:
+            # the tools run by run_task.py reconcile with the parent version one at a time, as they post
+            with posting(self.metrics):
+                self.reconcile()
+        except Exception as e:
+            arcpy.AddWarning("Unable to reconcile the {} version, it is created again :: {}".format(edit_version, e))
+            cache.update(posted=False)
+            return self.open_version()
+        cache.update(posted=False)
+        return version_sde
+
+    def reconcile(self):
+        """bring the kept version up to date with the parent version, without posting"""
+        arcpy.AddMessage("UpdateNoiseMitSDE.VersionManager.reconcile()")
+        logfile = self.reconcile_log()
+        with self.metrics.span("reconcile"):
+            arcpy.ReconcileVersions_management(self.version_sde, "ALL_VERSIONS", u"{}".format(self.parent_version),
+                                               [self.edit_version], "LOCK_ACQUIRED",
+                                               "NO_ABORT", "BY_OBJECT", "FAVOR_TARGET_VERSION",
+                                               "NO_POST", "KEEP_VERSION", logfile)
+
+    def reconcile_log(self):
+        """the log file of the reconcile, one for each version so the tools run in parallel do not share it"""
+        logfile = os.path.join(home_dir, "logs\\{}_reconcile.txt".format(self.new_version))
+        if os.path.exists(logfile):
+            os.remove(logfile)
+        return logfile
+
+    def close_version(self):
+        """remove the edit version after the run, unless it is kept for the next run"""
+        if self.version_cache is None:
+            return self.clean_previous()
+        return True
+
+
+class ScanStamp:
+    """The last scanned date of each gdb table, one row per table in a small run-metadata table.
+
+    The table is written through the default connection rather than the edit version, so it must not be
+    registered as versioned.  Stamping it once per run replaces rewriting LastScannedDate on every row of the
+    versioned table, which copied the whole table into the delta tables on each run."""
+
+    def __init__(self, workspace, table_name="NoiseMit_RunMetadata"):
+        self.workspace = workspace
+        self.table_name = table_name
+        self.table = os.path.join(workspace, table_name)
+        self.fields = ["TableName", "LastScannedDate"]
+
+    def create(self):
+        """create the run-metadata table if it does not exist"""
+        if not arcpy.Exists(self.table):
+            arcpy.AddMessage("Creating the run metadata table {}".format(self.table))
+            arcpy.CreateTable_management(self.workspace, self.table_name)
+            arcpy.AddField_management(self.table, "TableName", "TEXT", field_length=128)
+            arcpy.AddField_management(self.table, "LastScannedDate", "DATE")
+        return self.table
+
+    def stamp(self, gdb_table_name, scanned=None):
+        """record the scan time of the gdb table, in its single row of the run-metadata table"""
+        if scanned is None:
+            scanned = datetime.datetime.today()
+        self.create()
+        i = 0
+        sql_query = "TableName = '{}'".format(gdb_table_name)
+        with da.UpdateCursor(self.table, self.fields, sql_query) as cursor:
+            for row in cursor:
+                cursor.updateRow([gdb_table_name, scanned])
+                i += 1
+        del cursor
+        if not i:
+            with da.InsertCursor(self.table, self.fields) as cursor:
+                cursor.insertRow([gdb_table_name, scanned])
+            del cursor
+        arcpy.AddMessage("The last scanned date of {} was stamped in {}".format(gdb_table_name, self.table))
+        return scanned
+
+    def read(self, gdb_table_name):
+        """the last scanned date stamped for the gdb table, None if it has not been stamped"""
+        if not arcpy.Exists(self.table):
+            return None
+        sql_query = "TableName = '{}'".format(gdb_table_name)
+        with da.SearchCursor(self.table, self.fields, sql_query) as cursor:
+            for row in cursor:
+                return row[1]
+        return None
+
+
+def read_last_scanned(gdb_table, stamp=None, gdb_table_name=None):
+    """The last scanned date of a gdb table.
+
+    The date stamped in the run-metadata table is returned when there is one, otherwise the latest
+    LastScannedDate of the rows in the table, which is where the date is kept in the rows scan date mode."""
+    if stamp is not None:
+        if gdb_table_name is None:
+            gdb_table_name = os.path.basename(gdb_table).split(".")[-1]
+        scanned = stamp.read(gdb_table_name)
+        if scanned is not None:
+            return scanned
+    if "lastscanneddate" not in [f.name.lower() for f in arcpy.ListFields(gdb_table)]:
+        return None
+    scanned = None
+    with da.SearchCursor(gdb_table, ["LastScannedDate"]) as cursor:
+        for row in cursor:
+            if row[0] is not None and (scanned is None or row[0] > scanned):
+                scanned = row[0]
+    del cursor
+    return scanned
+
+
+def join_value(first, second):
+    """the value of a join field made of two fields, None when either of them is empty"""
+    if first and second:
+        return u"{}-{}".format(first, second)
+    return None
+
 
 class GDBTableUpdater:
     """match_fields, w_table, add_rows, rem_rows, version_sde_file, editor"""
     """weaver_attributes and folioIds are optional arguments, for some of the tools"""
     def __init__(self, match_fields, write_table, read_rows, remove_rows, version_sde,
-                 editor, weaver_attributes={}, folioIds=[]):
+                 editor, weaver_attributes={}, folioIds=[], planner=None, scan_stamp=None, upsert_key=None,
+                 metrics=None, storage=None, bulk_insert=None, reject_folder=None, join_fields=None):
         self.match_fields = match_fields
         self.write_table = write_table
         self.read_rows = read_rows
         self.remove_rows = remove_rows
         self.version_sde = version_sde
         self.editor = editor
+        self.insert_errors = 0
+        # splits the folio filters into chunks of IN clauses
+        self.planner = planner or QueryPlanner()
+        # with a ScanStamp the scan date is stamped once per run instead of on every row
+        self.scan_stamp = scan_stamp
+        # with the business key fields, changed rows are updated in place rather than deleted and inserted
+        self.upsert_key = upsert_key
+        # the insert, update and delete phases are timed as spans of the RunMetrics
+        self.metrics = metrics or RunMetrics()
+        # the cursors, fields and counts of the write table, see utils.Storage
+        self.storage = storage or ArcPyStorage()
+        # "empty" loads the rows of an empty table with one bulk append, "always" every insert, None inserts
+        # the rows one at a time.  The rows rejected by the bulk append are written to a csv in the reject_folder
+        self.bulk_insert = bulk_insert
+        self.reject_folder = reject_folder
+        # (join_field, first_field, second_field), the join field of the rows that are inserted or updated is
+        # set to first-second, see join_value
+        self.join_fields = join_fields
         if weaver_attributes:
             self.folio_field = weaver_attributes["Folio Number"]
         if folioIds:
             self.folioIds = folioIds
         pass
 
-    def insert_rows(self):
+    def insert_rows(self, rows=None, bulk=None):
         arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.insert_rows()")
+        if rows is None:
+            rows = self.read_rows
+        if bulk is None:
+            bulk = self.bulk_insert == "always"
+        if bulk:
+            return self.bulk_insert_rows(rows)
         try:
             self.editor.startOperation()
             fields = []
             fields.extend(self.match_fields)
-            insert = da.InsertCursor(self.write_table, fields)
+            fields, rows = self.with_join_field(fields, rows)
+            insert = self.storage.insert_cursor(self.write_table, fields)
+            report = reporter("insert_rows")
             i = 0
-            for _row in self.read_rows:
+            for _row in rows:
                 try:
                     insert.insertRow(_row)
                     i += 1
                 except Exception as e:
-                    arcpy.AddWarning("{} \n {} \n {}".format(e, _row, fields))
-
+                    self.insert_errors += 1
+                    report.warn("insert errors", "{} \n {} \n {}".format(e, _row, fields))
+                report.progress(i)
 
+            report.summary()
             del insert
             if not i:
                 arcpy.AddWarning("Rows were not added to the GDB Table")
@@ -448,28 +1021,197 @@ class GDBTableUpdater:
             self.editor.stopOperation()
             # raise Exception(h)
 
+    def bulk_insert_rows(self, rows):
+        """Validate the rows against the types and lengths of the gdb table and load the rows that fit with one
+        bulk append.  The rows that do not fit are written to the reject file of the table with the reason.
+
+        If the append fails the rows that fit are inserted one at a time, so rows that can only be read once are
+        held in a list first.  The rows the append did not reach are validated and rejected then."""
+        arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.bulk_insert_rows()")
+        if iter(rows) is rows:
+            rows = list(rows)
+        target_fields = field_catalog(self.write_table, self.storage)
+        fields, joined = self.with_join_field(list(self.match_fields), rows)
+        validate = compile_validator(target_fields, fields)
+        report = reporter("bulk_insert_rows")
+        rejects = None
+        if self.reject_folder:
+            rejects = RejectFile(self.reject_folder, table_name(self.write_table), fields)
+        # the positions of the rejected rows, and the number of rows validated
+        rejected = set()
+        checked = [0]
+
+        def check(i, _row):
+            reason = validate(_row)
+            if reason is None:
+                return True
+            rejected.add(i)
+            self.insert_errors += 1
+            if rejects is not None:
+                rejects.add(_row, reason)
+                report.count("rejected rows")
+            else:
+                report.warn("rejected rows", u"{} \n {} \n {}".format(reason, _row, fields))
+            return False
+
+        def valid_rows():
+            for i, _row in enumerate(joined):
+                checked[0] = i + 1
+                if check(i, _row):
+                    yield _row
+
+        def remaining_rows():
+            width = len(self.match_fields)
+            for i, _row in enumerate(self.with_join_field(list(self.match_fields), rows)[1]):
+                if i in rejected or (i >= checked[0] and not check(i, _row)):
+                    continue
+                yield _row[:width]
+
+        try:
+            try:
+                self.editor.startOperation()
+                i = self.storage.bulk_insert(self.write_table, fields, valid_rows())
+                self.editor.stopOperation()
+            except Exception as e:
+                self.editor.abortOperation()
+                arcpy.AddWarning("The bulk append failed, the rows are inserted one at a time :: {}".format(e))
+                i = self.insert_rows(remaining_rows(), bulk=False)
+                self.report_rejects(report, rejects)
+                return i
+            self.report_rejects(report, rejects)
+        finally:
+            if rejects is not None:
+                rejects.close()
+
+        if not i:
+            arcpy.AddWarning("Rows were not added to the GDB Table")
+        else:
+            arcpy.AddMessage("{} rows were appended to the GDB Table".format(i))
+        return i
+
+    def report_rejects(self, report, rejects):
+        """pass on the count of the rejected rows and close the reject file"""
+        report.summary()
+        if rejects is not None:
+            rejects.close()
+            if rejects.count:
+                arcpy.AddWarning("{} rows were rejected, the rows and the reasons are in {}".format(rejects.count,
+                                                                                                   rejects.path))
+
+    def join_positions(self, fields):
+        """the positions of the first and second field of the join field in the fields, None when the join
+        field is not derived from them"""
+        if not self.join_fields:
+            return None
+        join_field, first_field, second_field = [x.lower() for x in self.join_fields]
+        lower = [x.lower() for x in fields]
+        if join_field in lower or first_field not in lower or second_field not in lower:
+            return None
+        if join_field not in field_catalog(self.write_table, self.storage):
+            return None
+        return lower.index(first_field), lower.index(second_field)
+
+    def with_join_field(self, fields, rows):
+        """add the join field to the fields and its value to each of the rows"""
+        positions = self.join_positions(fields)
+        if positions is None:
+            return fields, rows
+        i, j = positions
+        return fields + [self.join_fields[0]], (list(x) + [join_value(x[i], x[j])] for x in rows)
+
     def delete_rows(self):
         arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.delete_rows()")
+        if isinstance(self.remove_rows, DiffStream):
+            return self.delete_stream()
+        if isinstance(self.remove_rows, RemoveRows) and self.remove_rows.keyed():
+            return self.delete_objects()
+
+        query = None
         if "folioIds" in dir(self):
-            folio_ids = self.folioIds
-            sql_query = "{} in ('{}')".format(self.folio_field, "','".join(folio_ids))
-        else:
-            sql_query = None
+            query = self.planner.query(self.folio_field, self.folioIds)
 
         try:
             self.editor.startOperation()
             i = 0
             rem_rows = self.remove_rows
-            with da.UpdateCursor(self.write_table, self.match_fields, sql_query) as _cursor:
-                for line in _cursor:
-                    # delete all rows that are identical to an item in the input list
-                    if line in rem_rows:
+            if query is not None:
+                rows = query.rows(self.storage.update_cursor, self.write_table, self.match_fields,
+                                  self.folio_position())
+            else:
+                rows = self.table_rows()
+            for _cursor, line in rows:
+                # delete all rows that are identical to an item in the input list
+                if line in rem_rows:
+                    i += 1
+                    _cursor.deleteRow()
+            if query is not None:
+                arcpy.AddMessage(query.report())
+            if not i:
+                arcpy.AddWarning("Rows were not removed from the GDB Table")
+            else:
+                arcpy.AddMessage("{} rows were removed from the GDB Table".format(i))
+            self.editor.stopOperation()
+            return i
+
+        except Exception as e:
+            print(e)
+            self.editor.stopOperation()
+            raise Exception(e)
+
+    def delete_objects(self, object_ids=None):
+        """delete the rows by the OBJECTIDs captured by compare_tables, with batches of OBJECTID IN clauses"""
+        arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.delete_objects()")
+        if object_ids is None:
+            object_ids = self.remove_rows.object_ids
+        oid_field = self.storage.oid_field(self.write_table)
+        query = self.planner.query(oid_field, object_ids, quoted=False)
+        try:
+            self.editor.startOperation()
+            i = 0
+            for _cursor, line in query.rows(self.storage.update_cursor, self.write_table, ["OID@"], 0):
+                i += 1
+                _cursor.deleteRow()
+            arcpy.AddMessage(query.report())
+            if i < len(query):
+                arcpy.AddWarning("{} of the {} rows flagged for removal were not found".format(len(query) - i,
+                                                                                             len(query)))
+            if not i:
+                arcpy.AddWarning("Rows were not removed from the GDB Table")
+            else:
+                arcpy.AddMessage("{} rows were removed from the GDB Table".format(i))
+            self.editor.stopOperation()
+            return i
+
+        except Exception as e:
+            print(e)
+            self.editor.stopOperation()
+            raise Exception(e)
+
+    def delete_stream(self, batch_size=5000):
+        """delete the rows of a DiffStream one batch at a time so only a batch of rows is held in memory"""
+        arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.delete_stream()")
+        folio_index = self.folio_position()
+
+        try:
+            self.editor.startOperation()
+            i = 0
+            for batch in self.remove_rows.batches(batch_size):
+                rem_rows = Counter([tuple(x) for x in batch])
+                rows = None
+                if folio_index is not None:
+                    folio_ids = set([x[folio_index] for x in batch])
+                    if None not in folio_ids:
+                        rows = self.planner.query(self.folio_field, folio_ids).rows(
+                            self.storage.update_cursor, self.write_table, self.match_fields, folio_index)
+                if rows is None:
+                    rows = self.table_rows()
+                for _cursor, line in rows:
+                    # each row in the stream deletes one identical row from the table
+                    key = tuple(line)
+                    if rem_rows[key]:
+                        rem_rows[key] -= 1
                         i += 1
                         _cursor.deleteRow()
-                        pass
-                    else:
-                        pass
-            del _cursor
             if not i:
                 arcpy.AddWarning("Rows were not removed from the GDB Table")
             else:
@@ -482,15 +1224,100 @@ class GDBTableUpdater:
             self.editor.stopOperation()
             raise Exception(e)
 
+    def folio_position(self):
+        """index of the folio field in the match_fields, None if the rows can not be filtered by folio"""
+        if "folio_field" in dir(self):
+            fields = [x.lower() for x in self.match_fields]
+            if self.folio_field.lower() in fields:
+                return fields.index(self.folio_field.lower())
+        return None
+
+    def table_rows(self):
+        """yield (cursor, row) for every row in the write table"""
+        with self.storage.update_cursor(self.write_table, self.match_fields) as _cursor:
+            for line in _cursor:
+                yield _cursor, line
+
+    def upsert_rows(self, key_index):
+        """Update the changed rows in place and only insert or delete the rows that are new or gone.
+
+        The rows to remove and to add are paired by the business key, see KeyedUpsert.plan_upsert.  Only the
+        columns that changed are written, and the OBJECTID of an updated row is kept."""
+        arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.upsert_rows()")
+        target_fields = field_catalog(self.write_table, self.storage)
+        field_names = [target_fields[x.lower()]["name"] for x in self.match_fields]
+        clean = compile_cleaner(target_fields, field_names)
+        plan = KeyedUpsert.plan_upsert(self.read_rows, self.remove_rows, self.remove_rows.object_ids, clean,
+                                       key_index)
+        arcpy.AddMessage("{} rows will be updated, {} inserted and {} deleted".format(
+            len(plan.updates), len(plan.inserts), len(plan.deletes)))
+
+        updated = 0
+        if len(plan.updates):
+            oid_field = self.storage.oid_field(self.write_table)
+            query = self.planner.query(oid_field, plan.updates.keys(), quoted=False)
+            width = len(self.match_fields)
+            fields = list(self.match_fields)
+            positions = self.join_positions(fields)
+            if positions is not None:
+                # the join field is set from the new values of its fields
+                fields.append(self.join_fields[0])
+            fields.append("OID@")
+            report = reporter("upsert_rows")
+            with self.metrics.span("update") as span:
+                try:
+                    self.editor.startOperation()
+                    rows = query.rows(self.storage.update_cursor, self.write_table, fields, len(fields) - 1)
+                    for _cursor, line in rows:
+                        object_id = line[-1]
+                        new_row = plan.apply(line[:width], object_id)
+                        if positions is not None:
+                            value = join_value(new_row[positions[0]], new_row[positions[1]])
+                            new_row.append(line[width] if value is None else value)
+                        if new_row != list(line[:-1]):
+                            try:
+                                _cursor.updateRow(new_row + [object_id])
+                                updated += 1
+                            except Exception as e:
+                                self.insert_errors += 1
+                                report.warn("update errors", "{} \n {} \n {}".format(e, new_row, fields))
+                        report.progress(updated)
+                    report.summary()
+                    arcpy.AddMessage(query.report())
+                    arcpy.AddMessage("{} rows were updated in the GDB Table".format(updated))
+                    span.rows = updated
+                    self.editor.stopOperation()
+                except Exception as e:
+                    print(e)
+                    self.editor.stopOperation()
+                    raise Exception(e)
+
+        deleted, added = 0, 0
+        if len(plan.deletes):
+            with self.metrics.span("delete") as span:
+                deleted = span.rows = self.delete_objects(plan.deletes)
+        if len(plan.inserts):
+            with self.metrics.span("insert") as span:
+                added = span.rows = self.insert_rows(plan.inserts)
+        return [deleted, added]
+
     def update_table(self):
         arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.update_table()")
         try:
+            if self.upsert_key and isinstance(self.remove_rows, RemoveRows) and self.remove_rows.keyed():
+                key_index = KeyedUpsert.key_indexes(self.match_fields, self.upsert_key)
+                if len(key_index):
+                    return self.upsert_rows(key_index)
+                arcpy.AddMessage("The upsert key {} is not in the match fields".format(self.upsert_key))
+
             # use the update cursor to remove the rem_rows
             deleted, added = 0, 0
             if len(self.remove_rows):
-                deleted = self.delete_rows()
+                with self.metrics.span("delete") as span:
+                    deleted = span.rows = self.delete_rows()
             if len(self.read_rows):
-                added = self.insert_rows()
+                with self.metrics.span("insert") as span:
+                    added = span.rows = self.insert_rows()
             return [deleted, added]
 
         except Exception as e:
@@ -500,30 +1327,43 @@ class GDBTableUpdater:
         arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.perform_update()")
         try:
             # if the table is empty add all read_rows
-            if not int(arcpy.GetCount_management(self.write_table).getOutput(0)):
-                self.insert_rows()
+            if not self.storage.count(self.write_table):
+                with self.metrics.span("insert") as span:
+                    span.rows = self.insert_rows(bulk=self.bulk_insert in ("empty", "always"))
             else:
                 # use the folioIds to filter before updating
                 self.update_table()
 
-            self.last_scanned_date()
+            with self.metrics.span("scan date"):
+                self.last_scanned_date()
             return True
         except Exception as e:
             raise Exception(e.message)
 
     def concatenate(self, join_field, first_field, second_field):
+        """Set the join field to first-second on the rows where it differs.
+
+        The inserted and updated rows already hold the join field when the updater has join_fields, so the table
+        is read with a search cursor and only the rows that are still out of date are edited, by OBJECTID."""
         arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.concatenate()")
         d = False
         try:
-            self.editor.startOperation()
-            with da.UpdateCursor(self.write_table, [join_field, first_field, second_field]) as cursor:
+            changed = {}
+            fields = [join_field, first_field, second_field, "OID@"]
+            with self.storage.search_cursor(self.write_table, fields) as cursor:
                 for row in cursor:
-                    if row[1] and row[2]:
-                        conc = "{}-{}".format(row[1], row[2])
-                        new_row = [conc, row[1], row[2]]
-                        cursor.updateRow(new_row)
+                    value = join_value(row[1], row[2])
+                    if value is not None and value != row[0]:
+                        changed[row[3]] = value
+            self.editor.startOperation()
+            if changed:
+                oid_field = self.storage.oid_field(self.write_table)
+                query = self.planner.query(oid_field, changed.keys(), quoted=False)
+                rows = query.rows(self.storage.update_cursor, self.write_table, [join_field, "OID@"], 1)
+                for _cursor, line in rows:
+                    _cursor.updateRow([changed[line[1]], line[1]])
+            arcpy.AddMessage("{} was set on {} rows".format(join_field, len(changed)))
             d = True
-            del cursor
             self.editor.stopOperation()
         except Exception as e:
             logging.error(e)
@@ -533,13 +1373,17 @@ class GDBTableUpdater:
 
     def last_scanned_date(self):
         arcpy.AddMessage("UpdateNoiseMitSDE.GDBTableUpdater.last_scanned_date()")
+        if self.scan_stamp is not None:
+            arcpy.AddMessage("The rows are not updated, the last scanned date is stamped in {}".format(
+                self.scan_stamp.table))
+            return
         try:
-            f_lower = [f.name.lower() for f in arcpy.ListFields(self.write_table)]
+            f_lower = [f.name.lower() for f in self.storage.list_fields(self.write_table)]
             if "lastscanneddate" in f_lower:
                 self.editor.startOperation()
                 # attribute the last scanned date
                 field = ["LastScannedDate"]
-                with da.UpdateCursor(self.write_table, field) as cursor:
+                with self.storage.update_cursor(self.write_table, field) as cursor:
                     for row in cursor:
                         newrow = [datetime.datetime.today()]
                         cursor.updateRow(newrow)
@@ -554,7 +1398,8 @@ class GDBTableUpdater:
 class BuildingsUpdater:
     """buildings, w_table, building_attributes, weaver_attributes, version_sde_file, editor"""
 
-    def __init__(self, domains, folioIds, bldgs, rel_table, bldg_atts, table_atts, combination_atts, version_sde, editor):
+    def __init__(self, domains, folioIds, bldgs, rel_table, bldg_atts, table_atts, combination_atts, version_sde, editor,
+                 planner=None, fused=False, folio_digests=None, storage=None):
         self.domains = domains
         self.folioIds = folioIds
         self.buildings = bldgs
@@ -567,6 +1412,14 @@ class BuildingsUpdater:
         self.version_sde = version_sde
         self.editor = editor
         self.folios = {}
+        # splits the folio filters into chunks of IN clauses
+        self.planner = planner or QueryPlanner()
+        # read the related table and update the buildings in one pass for both mappings
+        self.fused = fused
+        # with FolioDigests the fused update only opens the buildings of the folios whose values changed
+        self.folio_digests = folio_digests
+        # the cursors and fields of the buildings and the related table, see utils.Storage
+        self.storage = storage or ArcPyStorage()
 
     def build_folio_dict(self):
         arcpy.AddMessage("UpdateNoiseMitSDE.BuildingUpdater.build_folio_dict()")
@@ -581,17 +1434,9 @@ class BuildingsUpdater:
 
     def concat_list(self, _length, _input):
         """take the input multivalue list and output a string no longer than the max string length parameter"""
-        max_length = _length
-        _ph = _input
-        if type(_ph) == list:
-            _ph = list(set(_ph))
-            _ph = ", ".join(_ph)
-
-        if len(_ph) > max_length:
-            _ph = _ph[:(max_length-4)] + " ..."
-        return _ph
+        return concat_list(_length, _input)
 
-    def perform_combination(self, sql_exp1, sql_exp2):
+    def perform_combination(self, table_query, bldg_query):
         arcpy.AddMessage("UpdateNoiseMitSDE.BuildingUpdater.perform_combination()")
         # read the source fields and place the value into the target field
         try:
@@ -599,46 +1444,33 @@ class BuildingsUpdater:
                 source_fields = x["source"]
                 # source fields = [folio, lastname, firstname]
                 values = dict()
+                report = reporter("perform_combination")
                 n = 0
                 v = 0
-                with da.SearchCursor(self.rel_table, source_fields, sql_exp1) as cursor:
-                    for row in cursor:
-                        n += 1
+                for cursor, row in table_query.rows(self.storage.search_cursor, self.rel_table, source_fields, 0):
+                    n += 1
+                    try:
+                        folio = row[0]
+                        new_att = contact_name(row[1], row[2])
                         try:
-                            folio = row[0]
-                            f1 = row[1]
-                            f2 = row[2]
-                            if f1 and f2:
-                                f1 = f1.capitalize()
-                                f2 = f2.capitalize()
-                                if f1.upper() != f2.upper():
-                                    new_att = u"{}, {}".format(f1, f2)
-                                else:
-                                    new_att = u"{}".format(f1)
-                            else:
-                                if f1:
-                                    new_att = u"{}".format(f1)
-                                elif f2:
-                                    new_att = u"{}".format(f2)
-                                else:
-                                    new_att = u""
-                            try:
-                                values[folio].append(new_att)
-                            except KeyError:
-                                values[folio] = [new_att]
+                            values[folio].append(new_att)
+                        except KeyError:
+                            values[folio] = [new_att]
 
-                            v += 1
-                            del folio, f1, f2, new_att
-                        except Exception as e:
-                            arcpy.AddWarning(e)
+                        v += 1
+                        del folio, new_att
+                    except Exception as e:
+                        report.warn("related row errors", e)
 
+                arcpy.AddMessage(table_query.report())
                 arcpy.AddMessage("{} rows were scanned from the related table".format(n))
                 arcpy.AddMessage("{} names were added to the values dict".format(v))
                 arcpy.AddMessage("There are {} folioIds in the values dict".format(len(values.keys())))
 
                 target_fields = x["target"]
                 arcpy.AddMessage("target_fields :: {}".format(target_fields))
-                arcpy.AddMessage("Buildings = {} , Fields = {}".format(self.buildings, [f.name for f in arcpy.ListFields(self.buildings)]))
+                arcpy.AddMessage("Buildings = {} , Fields = {}".format(
+                    self.buildings, [f.name for f in self.storage.list_fields(self.buildings)]))
                 # target_fields = [folioId, contactName]
                 self.editor.startOperation()
 
@@ -646,45 +1478,42 @@ class BuildingsUpdater:
                 i = 0
                 n = 0
                 error = 0
-                keys = values.keys()
 
                 # get the length of each field and shorten text as needed
                 field_lengths = {}
                 for x in target_fields:
-                    fld = arcpy.ListFields(self.buildings, x)[0]
+                    fld = self.storage.list_fields(self.buildings, x)[0]
                     if fld.type == "String":
                         field_lengths[x] = fld.length
+                # the contact names are joined once for each folio, row[1] is the field length to test
+                contacts = FolioMemo(lambda folio: contact_string(values[folio], field_lengths[target_fields[1]]))
 
-                with da.UpdateCursor(self.buildings, target_fields, sql_exp2) as cursor:
-                    for row in cursor:
-                        folio = row[0]
-                        num += 1
-                        try:
-                            if folio in keys:
-                                # row[1] is the field length to test
-                                max_length = field_lengths[target_fields[1]]
-                                contacts = list(set([x for x in values[folio] if x]))
-                                contact_str = u"; ".join(contacts)
-                                if len(contact_str) > max_length:
-                                    contact_str = contact_str[:max_length]
-                                new_row = [folio, contact_str]
-                                if new_row != row:
-                                    try:
-                                        cursor.updateRow(new_row)
-                                        arcpy.AddMessage("Good Row :: {}".format(new_row))
-                                        i += 1
-                                    except Exception as e:
-                                        arcpy.AddWarning("{} :: {}".format(e, new_row))
-                                        error += 1
-                                else:
-                                    n += 1
+                for cursor, row in bldg_query.rows(self.storage.update_cursor, self.buildings, target_fields, 0):
+                    folio = row[0]
+                    num += 1
+                    try:
+                        if folio in values:
+                            new_row = [folio, contacts.get(folio)]
+                            if new_row != row:
+                                try:
+                                    cursor.updateRow(new_row)
+                                    report.info("buildings updated", "Good Row :: {}".format(new_row))
+                                    i += 1
+                                except Exception as e:
+                                    report.warn("update errors", "{} :: {}".format(e, new_row))
+                                    error += 1
                             else:
-                                arcpy.AddWarning("Folio {} not found in {}".format(folio, keys))
-                        except Exception as e:
-                            n += 1
-                            arcpy.AddWarning(e)
-                        del folio
+                                n += 1
+                        else:
+                            report.warn("folios not found", "Folio {} not found in the related table".format(folio))
+                    except Exception as e:
+                        n += 1
+                        report.warn("row errors", e)
+                    report.progress(num)
+                    del folio
 
+                report.summary()
+                arcpy.AddMessage(bldg_query.report())
                 arcpy.AddMessage("{} rows were scanned for updating with Contact Name".format(num))
                 arcpy.AddMessage("{} buildings were updated with values".format(i))
                 arcpy.AddMessage("{} buildings were not updated".format(n))
@@ -696,101 +1525,189 @@ class BuildingsUpdater:
             self.editor.stopOperation()
             raise Exception(e)
 
-    def perform_one2one(self, sql_exp2):
+    def perform_one2one(self, bldg_query):
         arcpy.AddMessage("UpdateNoiseMitSDE.BuildingUpdater.perform_one2one()")
         # The fields from the source are matched directly to fields in the target
         domain_set = self.domains
         try:
-            building_fields = [self.bldg_folio]
-            # this adds the actual fields names rather than their label
-            building_fields.extend([v for k, v in self.bldg_update_fields.iteritems() if k != "Folio Number"])
+            building_fields, length_lookup = self.one2one_fields()
             i = 0
             n = 0
             num = 0
-            length_lookup = dict()
-            for x in building_fields[1:]:
-                field = arcpy.ListFields(self.buildings, '*{}'.format(x))[0]
-                if field.type == "String":
-                    length_lookup[x] = field.length
 
+            # resolve the table field, length and domain of each building field once for the run
+            plan = OneToOnePlan(building_fields, self.bldg_update_fields, self.table_update_fields, length_lookup,
+                                domain_set)
+            # and the values of each folio once for all of the buildings that share it
+            resolved = FolioMemo(lambda folio: plan.resolve(self.folios[folio]))
+
+            report = reporter("perform_one2one")
             self.editor.startOperation()
-            with da.UpdateCursor(self.buildings, building_fields, sql_exp2) as _cursor:
-                for _row in _cursor:
-                    num += 1
-                    folio_id = _row[0]
-                    table_values = self.folios[folio_id]
-
-                    new_row = [folio_id]
-                    _index = 1
-                    for x in building_fields[1:]:
-                        label = []
-                        for k, v in self.bldg_update_fields.iteritems():
-                            if v == x:
-                                label.append(k)
-                                break
-                        t_field = []
-                        for k, v in self.table_update_fields.iteritems():
-                            if k == label[0]:
-                                t_field.append(v)
-                        try:
-                            max_length = length_lookup[x]
-                            # get the table values for this field
-                            values = table_values[t_field[0]]
-                            # create a Counter object on the list of values
-                            cnt = Counter(values)
-
-                            if label[0] in domain_set.keys():
-                                # retrieve the domain value list
-                                value_list = domain_set[label[0]]
-
-                                # get the three most common values from the table_values list
-                                most_common = cnt.most_common(3)
-                                # starting with the most common value
-                                for c in most_common:
-                                    item = c[0]
-                                    # if it is a string value
-                                    if type(item) is str:
-                                        # check if it exists in the pick list
-                                        if item.lower().strip() in value_list:
-                                            # set the final list of values to the single most common string
-                                            values = [item]
-                                            break
-                                        else:
-                                            # remove all occurrences of this item from the value list
-                                            values = [v for v in values if v != item]
-                                    else:
-                                        pass
-                            new_value = self.concat_list(max_length, values)
-                        except KeyError:
-                            new_value = _row[_index]
+            for _cursor, _row in bldg_query.rows(self.storage.update_cursor, self.buildings, building_fields, 0):
+                num += 1
+                new_row = plan.apply(_row, resolved.get(_row[0]))
+
+                if _row != new_row:
+                    try:
+                        report.info("buildings updated", "This row was updated {}".format(new_row))
+                        _cursor.updateRow(new_row)
+                        i += 1
+                    except Exception as e:
+                        report.warn("update errors", "{} :: {}".format(e, new_row))
+                else:
+                    # the row has not changed
+                    n += 1
+                report.progress(num)
+
+            self.editor.stopOperation()
+            report.summary()
+            arcpy.AddMessage(bldg_query.report())
+            arcpy.AddMessage("{} rows were scanned for one-to-one mapping".format(num))
+            arcpy.AddMessage("{} buildings were updated with values".format(i))
+            arcpy.AddMessage("{} buildings were not updated".format(n))
+            del i, n
+        except RuntimeError as e:
+            print(e.message)
+            self.editor.stopOperation()
+            raise Exception(e)
+
+    def one2one_fields(self):
+        """the building fields of the one-to-one mapping, starting with the folio, and the length of the string
+        fields"""
+        building_fields = [self.bldg_folio]
+        # this adds the actual fields names rather than their label
+        building_fields.extend([v for k, v in self.bldg_update_fields.iteritems() if k != "Folio Number"])
+        length_lookup = dict()
+        for x in building_fields[1:]:
+            field = self.storage.list_fields(self.buildings, '*{}'.format(x))[0]
+            if field.type == "String":
+                length_lookup[x] = field.length
+        return building_fields, length_lookup
+
+    def fusable(self):
+        """the fused update needs each combination to match on the folio fields and write its own string field"""
+        one2one = [v for k, v in self.bldg_update_fields.iteritems() if k != "Folio Number"]
+        for x in self.combination_fields or []:
+            if x["source"][0] != self.table_folio or x["target"][0] != self.bldg_folio:
+                return False
+            if x["target"][1] in one2one:
+                return False
+            field = self.storage.list_fields(self.buildings, x["target"][1])
+            if not len(field) or field[0].type != "String":
+                return False
+        return True
 
-                        new_row.append(new_value)
-                        _index += 1
+    def perform_fused(self, table_query, bldg_query):
+        """Fill the folio dict and the contact names with one read of the related table, then write the one-to-one
+        and the combination fields of each building with a single updateRow."""
+        arcpy.AddMessage("UpdateNoiseMitSDE.BuildingUpdater.perform_fused()")
+        combinations = self.combination_fields or []
+        table_fields = [self.table_folio]
+        table_fields.extend([v for k, v in self.table_update_fields.iteritems() if k != "Folio Number"])
+        for x in combinations:
+            table_fields.extend([f for f in x["source"][1:] if f not in table_fields])
+        value_index = [(x, table_fields.index(x)) for x in table_fields[1:] if x in self.table_update_fields.values()]
+        name_index = [(table_fields.index(x["source"][1]), table_fields.index(x["source"][2])) for x in combinations]
+        contact_names = [dict() for x in combinations]
 
-                    if _row != new_row:
+        try:
+            report = reporter("perform_fused")
+            n = 0
+            for _cursor, _row in table_query.rows(self.storage.search_cursor, self.rel_table, table_fields, 0):
+                n += 1
+                folio = _row[0]
+                try:
+                    table_values = self.folios[folio]
+                    for x, _index in value_index:
+                        table_values[x].append(_row[_index])
+                except Exception as e:
+                    report.warn("related row errors", e)
+                for names, (i1, i2) in zip(contact_names, name_index):
+                    try:
+                        new_att = contact_name(_row[i1], _row[i2])
                         try:
-                            arcpy.AddMessage("This row was updated {}".format(new_row))
-                            _cursor.updateRow(new_row)
-                            i += 1
-                        except Exception as e:
-                            print(e)
-                    else:
-                        # the row has not changed
-                        # arcpy.AddMessage("row {} has not changed".format(_row))
-                        n += 1
-                        pass
+                            names[folio].append(new_att)
+                        except KeyError:
+                            names[folio] = [new_att]
+                    except Exception as e:
+                        report.warn("contact name errors", e)
+                report.progress(n)
+            arcpy.AddMessage(table_query.report())
+            arcpy.AddMessage("{} rows were scanned from the related table".format(n))
+
+            building_fields, length_lookup = self.one2one_fields()
+            plan = OneToOnePlan(building_fields, self.bldg_update_fields, self.table_update_fields, length_lookup,
+                                self.domains)
+            resolved = FolioMemo(lambda folio: plan.resolve(self.folios[folio]))
+            contacts = []
+            for names, x in zip(contact_names, combinations):
+                length = self.storage.list_fields(self.buildings, x["target"][1])[0].length
+                contacts.append(FolioMemo(lambda folio, names=names, length=length:
+                                          contact_string(names[folio], length)))
+            fields = building_fields + [x["target"][1] for x in combinations]
+            split = len(building_fields)
+
+            if self.folio_digests is not None:
+                bldg_query = self.dirty_query(resolved, contact_names, contacts, fields)
 
-            del _cursor
+            i = 0
+            n = 0
+            num = 0
+            missing = 0
+            error = 0
+            self.editor.startOperation()
+            for _cursor, _row in bldg_query.rows(self.storage.update_cursor, self.buildings, fields, 0):
+                num += 1
+                folio = _row[0]
+                new_row = plan.apply(_row[:split], resolved.get(folio))
+                for j, names in enumerate(contact_names):
+                    if folio in names:
+                        new_row.append(contacts[j].get(folio))
+                    else:
+                        missing += 1
+                        new_row.append(_row[split + j])
+                if _row != new_row:
+                    try:
+                        _cursor.updateRow(new_row)
+                        i += 1
+                    except Exception as e:
+                        report.warn("update errors", "{} :: {}".format(e, new_row))
+                        error += 1
+                        if self.folio_digests is not None:
+                            self.folio_digests.failed(folio)
+                else:
+                    n += 1
+                report.progress(num)
             self.editor.stopOperation()
-            arcpy.AddMessage("{} rows were scanned for one-to-one mapping".format(num))
+            report.summary()
+            arcpy.AddMessage(bldg_query.report())
+            arcpy.AddMessage("{} rows were scanned for the one-to-one and combination mappings".format(num))
             arcpy.AddMessage("{} buildings were updated with values".format(i))
             arcpy.AddMessage("{} buildings were not updated".format(n))
-            del i, n
+            if missing:
+                arcpy.AddWarning("{} contact names were not found in the related table".format(missing))
+            arcpy.AddMessage("{} errors occured".format(error))
         except RuntimeError as e:
             print(e.message)
             self.editor.stopOperation()
             raise Exception(e)
 
+    def dirty_query(self, resolved, contact_names, contacts, fields):
+        """the query over the buildings of the folios whose resolved values differ from the last successful run"""
+        self.folio_digests.load(fields)
+        dirty = []
+        for folio in self.folios.keys():
+            values = [None if x is KEEP else x for x in resolved.get(folio)]
+            for names, memo in zip(contact_names, contacts):
+                if folio in names:
+                    values.append(memo.get(folio))
+                else:
+                    values.append(None)
+            if self.folio_digests.changed(folio, values):
+                dirty.append(folio)
+        arcpy.AddMessage("{} of the {} folios have changed building values".format(len(dirty), len(self.folios)))
+        return self.planner.query(self.bldg_folio, dirty)
+
     def update_buildings(self):
         arcpy.AddMessage("UpdateNoiseMitSDE.BuildingUpdater.update_buildings()")
         try:
@@ -800,43 +1717,45 @@ class BuildingsUpdater:
             # read the rows from the related table with an SQL filter for folioIds;
             # add the field attributes to their list in the _folios dict
             keys = self.folios.keys()
-            run = 0
-
-            if len(keys) == 1:
-                sql_expression = "{} = '{}'".format(self.table_folio, keys[0])
-                run += 1
-            elif len(keys) > 1:
-                sql_expression = "{} in ('{}')".format(self.table_folio, u"', '".join(keys))
-                run += 1
-            else:
-                arcpy.AddMessage("keys: {}".format(len(keys)))
+            if len(keys):
+                # the folio filters are run as chunks of IN clauses, see QueryPlanner
+                table_query = self.planner.query(self.table_folio, keys)
+                bldg_query = self.planner.query(self.bldg_folio, keys)
+
+                if self.fused and self.fusable():
+                    arcpy.AddMessage("The buildings are now being updated in a single pass")
+                    self.perform_fused(table_query, bldg_query)
+                    return True
+                if self.fused:
+                    arcpy.AddMessage("The combination fields can not be written in a single pass, the buildings are "
+                                     "updated one mapping at a time")
+                if self.folio_digests is not None:
+                    arcpy.AddWarning("The folio dirty tracking needs the fused building update, the buildings of "
+                                     "all {} folios are updated".format(len(keys)))
 
-            if run:
                 table_fields = [self.table_folio]
                 # this adds the actual fields names rather than their label
                 table_fields.extend([v for k, v in self.table_update_fields.iteritems() if k != "Folio Number"])
-                with da.SearchCursor(self.rel_table, table_fields, sql_expression) as _cursor:
-                    for _row in _cursor:
-                        try:
-                            for x in self.folios[_row[0]].keys():
-                                # these keys are the attribute field names
-                                _index = table_fields.index(x)
-                                self.folios[_row[0]][x].append(_row[_index])
-                        except Exception as e:
-                            arcpy.AddWarning(e)
-
-                if len(keys) == 1:
-                    sql_expression2 = "{} = '{}'".format(self.bldg_folio, keys[0])
-                elif len(keys) > 1:
-                    sql_expression2 = "{} in ('{}')".format(self.bldg_folio, "', '".join(keys))
+                report = reporter("update_buildings")
+                for _cursor, _row in table_query.rows(self.storage.search_cursor, self.rel_table, table_fields, 0):
+                    try:
+                        for x in self.folios[_row[0]].keys():
+                            # these keys are the attribute field names
+                            _index = table_fields.index(x)
+                            self.folios[_row[0]][x].append(_row[_index])
+                    except Exception as e:
+                        report.warn("related row errors", e)
+                report.summary()
+                arcpy.AddMessage(table_query.report())
 
                 arcpy.AddMessage("The buildings are now being updated")
 
-                self.perform_one2one(sql_expression2)
+                self.perform_one2one(bldg_query)
                 if self.combination_fields:
-                    self.perform_combination(sql_exp1=sql_expression, sql_exp2=sql_expression2)
+                    self.perform_combination(table_query=table_query, bldg_query=bldg_query)
 
             else:
+                arcpy.AddMessage("keys: {}".format(len(keys)))
                 arcpy.AddWarning("Buildings were not updated.")
 
             return True